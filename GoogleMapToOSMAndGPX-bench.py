@@ -0,0 +1,477 @@
+#!/usr/bin/python
+#========================================================================================
+# GoogleMapToOSMAndGPX-bench.py
+#
+# Benchmarks the GoogleMapToOSMAndGPX conversion without a live google map.
+#
+# A synthetic KML file in the style of a google my maps export is generated for each
+# scenario: layers (Folders) of waypoints and tracks using the same styleUrl patterns
+# GMap writes, e.g.
+#	<styleUrl>#icon-1577-DB4436-labelson</styleUrl>
+#	<styleUrl>#line-0F9D58-1000</styleUrl>
+# Each scenario is then run through these stages, the time of the fastest of --repeat
+# runs and the peak memory (tracemalloc) of each stage are reported:
+#	parse:    the KML data is fed through the streaming parser, placemarks are discarded
+#	convert:  the converter's processKMLStream with the GPX files kept in memory, the
+#	          way --archive collects them, so no files are written
+#	write:    processKMLStream writing the GPX files to disk
+#	total:    convertMap end to end from the KML file, as -k would run it
+# The convert and write stages include the parse.
+#
+# The startup scenario runs the converter as a new process and times the first line of
+# output, for --help and for a -k conversion of the small scenario's KML file.  This is
+# done for the python script and, when it is found, for the PyInstaller executable.
+#
+# Results are compared against the baselines file.  A stage more than --tolerance percent
+# slower than its baseline is reported as a regression and the return code is 1.
+# --save-baseline stores the results of this run as the new baselines.
+#
+# 10/17/2026: V1.0 Initial version
+# 10/17/2026: V1.1 Added the startup scenario, time to first output of the script and exe
+#                  The convert and write stages time the converter's own processKMLStream
+#========================================================================================
+import sys
+import argparse
+import os
+import io
+import json
+import time
+import random
+import tempfile
+import tracemalloc
+import contextlib
+import subprocess
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import GoogleMapToOSMAndGPX as gmap
+
+PROGRAM_NAME = Path(sys.argv[0]).stem
+PROGRAM_VERSION = "1.1"
+DEFAULT_BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "GoogleMapToOSMAndGPX-bench.json")
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 20	# percent slower than the baseline before a stage is a regression
+DEFAULT_SEED = 1
+STAGES = ("parse", "convert", "write", "total")
+STARTUP_SCENARIO = "startup"
+SCRIPT_PROGRAM = os.path.join(os.path.dirname(os.path.abspath(__file__)), "GoogleMapToOSMAndGPX.py")
+# where PyInstaller puts the executable built from GoogleMapToOSMAndGPX.spec
+DEFAULT_EXE_PROGRAM = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dist", "GoogleMapToOSMAndGPX.exe" if os.name == "nt" else "GoogleMapToOSMAndGPX")
+# layers, waypoints, tracks, points per track.  Waypoints and tracks are totals for the map
+SCENARIOS = {
+	"small":  (2,    50,  10,   200),
+	"medium": (5,   500, 100,  1000),
+	"large":  (10, 2000, 200, 10000),
+}
+# GMap line colors
+TRACK_COLORS = ("0F9D58", "DB4436", "F48FB1", "0288D1", "FFEA00", "795548", "000000")
+KML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2">\n  <Document>\n'
+KML_FOOTER = '  </Document>\n</kml>\n'
+
+#========================================================================================
+# setupParseCmdLine
+#========================================================================================
+def setupParseCmdLine():
+	parser = argparse.ArgumentParser(
+	prog=PROGRAM_NAME,
+	description="Benchmarks the GoogleMapToOSMAndGPX conversion on generated GMap style KML files.",
+	epilog="Benchmark Utility: " + PROGRAM_NAME + "  V" + PROGRAM_VERSION)
+	parser.add_argument("scenarios",
+		nargs="*",
+		metavar="scenario",
+		help="Scenarios to run: " + ", ".join(SCENARIOS) + ", " + STARTUP_SCENARIO + ".  Default is all of them.  Use custom with the --layers, --waypoints, --tracks and --points options.")
+	parser.add_argument("--layers",
+		type=int,
+		default=3,
+		help="custom scenario: number of layers, default 3")
+	parser.add_argument("--waypoints",
+		type=int,
+		default=100,
+		help="custom scenario: total number of waypoints, default 100")
+	parser.add_argument("--tracks",
+		type=int,
+		default=20,
+		help="custom scenario: total number of tracks, default 20")
+	parser.add_argument("--points",
+		type=int,
+		default=500,
+		help="custom scenario: number of points in each track, default 500")
+	parser.add_argument("--seed",
+		type=int,
+		default=DEFAULT_SEED,
+		help=f"random seed for the generated maps, default {DEFAULT_SEED}")
+	parser.add_argument("-g", "--generate",
+		metavar="KML_FILE",
+		help="Only write the KML file of the (single) scenario to KML_FILE, no benchmark is run.")
+	parser.add_argument("-r", "--repeat",
+		type=int,
+		default=DEFAULT_REPEAT,
+		help=f"runs of each stage, the fastest is reported.  Default {DEFAULT_REPEAT}")
+	parser.add_argument("--baseline",
+		default=DEFAULT_BASELINE_FILE,
+		help="baselines file.  Default is GoogleMapToOSMAndGPX-bench.json next to this program")
+	parser.add_argument("--save-baseline",
+		action="store_true",
+		help="save the results of this run as the baselines of the scenarios that were run")
+	parser.add_argument("--tolerance",
+		type=float,
+		default=DEFAULT_TOLERANCE,
+		help=f"percent a stage may be slower than its baseline before it is a regression.  Default {DEFAULT_TOLERANCE}")
+	parser.add_argument("--no-memory",
+		action="store_true",
+		help="skip the extra tracemalloc run that measures peak memory")
+	parser.add_argument("--exe",
+		default=DEFAULT_EXE_PROGRAM,
+		help="startup scenario: the PyInstaller executable to time.  Default is dist/GoogleMapToOSMAndGPX.exe next to this program, skipped if it does not exist")
+	args = parser.parse_args()
+	for scenario in args.scenarios:
+		if scenario not in SCENARIOS and scenario not in ("custom", STARTUP_SCENARIO):
+			parser.error(f"unknown scenario: {scenario}")
+	if not args.scenarios:
+		args.scenarios = list(SCENARIOS) + [STARTUP_SCENARIO]
+	if args.generate is not None and (len(args.scenarios) != 1 or args.scenarios[0] == STARTUP_SCENARIO):
+		parser.error("--generate needs a single KML scenario")
+	if args.repeat < 1:
+		parser.error("--repeat must be at least 1")
+	return(args)
+#========================================================================================
+# scenarioParameters
+#	Returns (layers, waypoints, tracks, points) for the scenario
+#========================================================================================
+def scenarioParameters(scenario,args):
+	if scenario == "custom":
+		return((args.layers, args.waypoints, args.tracks, args.points))
+	return(SCENARIOS[scenario])
+#========================================================================================
+# waypointStyleURL
+#	Returns one of the styleUrl patterns GMap uses for waypoint icons:
+#		#icon-1577-DB4436-labelson  #icon-1899-0288D1-nodesc  #icon-1899-0288D1
+#		#icon-1085-labelson  #icon-1369
+#	Icon numbers come from the icon translation table, plus the odd one that is not in it.
+#========================================================================================
+def waypointStyleURL(rand,iconIDs):
+	iconID = rand.choice(iconIDs) if rand.random() < 0.95 else str(rand.randint(5000, 9999))
+	color = rand.choice(TRACK_COLORS)
+	return(rand.choice((
+		f"#icon-{iconID}-{color}-labelson",
+		f"#icon-{iconID}-{color}-nodesc",
+		f"#icon-{iconID}-{color}",
+		f"#icon-{iconID}-labelson",
+		f"#icon-{iconID}",
+	)))
+#========================================================================================
+# formatCoordinate
+#	GMap KML coordinates are at most 7 decimals, written without trailing zeros
+#========================================================================================
+def formatCoordinate(value):
+	return(repr(round(value, 7)))
+#========================================================================================
+# generateKML
+#	Returns the KML data of a map with the given number of layers, waypoints and tracks.
+#	Waypoints and tracks are spread evenly over the layers.  Tracks are random walks of
+#	roughly 10m steps.
+#========================================================================================
+def generateKML(layers,waypoints,tracks,points,seed=DEFAULT_SEED):
+	rand = random.Random(seed)
+	iconIDs = [iconID for iconID in gmap.iconDictionary if iconID != "unknown"]
+	output = io.StringIO()
+	output.write(KML_HEADER)
+	output.write(f"    <name>Benchmark map {layers}x{waypoints}x{tracks}x{points}</name>\n")
+	output.write("    <description/>\n")
+	for color in TRACK_COLORS:
+		output.write(f'    <Style id="line-{color}-1000-normal"><LineStyle><color>ff{color}</color><width>1</width></LineStyle></Style>\n')
+	for layer in range(layers):
+		output.write("    <Folder>\n")
+		output.write(f"      <name>Layer {layer + 1}</name>\n")
+		for waypoint in range(layer, waypoints, layers):
+			longitude = rand.uniform(-123.0, -119.0)
+			latitude = rand.uniform(36.0, 40.0)
+			output.write("      <Placemark>\n")
+			output.write(f"        <name>Waypoint {waypoint + 1}</name>\n")
+			if rand.random() < 0.5:
+				output.write(f"        <description>{escape(f'Description of waypoint {waypoint + 1} & its <surroundings>')}</description>\n")
+			output.write(f"        <styleUrl>{waypointStyleURL(rand,iconIDs)}</styleUrl>\n")
+			output.write(f"        <Point>\n          <coordinates>{formatCoordinate(longitude)},{formatCoordinate(latitude)},0</coordinates>\n        </Point>\n")
+			output.write("      </Placemark>\n")
+		for track in range(layer, tracks, layers):
+			longitude = rand.uniform(-123.0, -119.0)
+			latitude = rand.uniform(36.0, 40.0)
+			output.write("      <Placemark>\n")
+			output.write(f"        <name>Track {track + 1}</name>\n")
+			if rand.random() < 0.5:
+				output.write(f"        <description>Description of track {track + 1}</description>\n")
+			width = rand.choice((1000, 1200, 2000, 5000, 8000, 12000, 32000))
+			suffix = rand.choice(("", "-nodesc"))
+			output.write(f"        <styleUrl>#line-{rand.choice(TRACK_COLORS)}-{width}{suffix}</styleUrl>\n")
+			output.write("        <LineString>\n          <tessellate>1</tessellate>\n          <coordinates>\n")
+			for point in range(points):
+				longitude += rand.uniform(-0.0001, 0.0001)
+				latitude += rand.uniform(-0.0001, 0.0001)
+				output.write(f"            {formatCoordinate(longitude)},{formatCoordinate(latitude)},0\n")
+			output.write("          </coordinates>\n        </LineString>\n")
+			output.write("      </Placemark>\n")
+		output.write("    </Folder>\n")
+	output.write(KML_FOOTER)
+	return(output.getvalue().encode("utf-8"))
+#========================================================================================
+# kmlChunks
+#	Splits the KML data into the chunk size the converter reads files and downloads in
+#========================================================================================
+def kmlChunks(KMLData):
+	for start in range(0, len(KMLData), gmap.KML_CHUNK_SIZE):
+		yield KMLData[start:start + gmap.KML_CHUNK_SIZE]
+#========================================================================================
+# iterPlacemarks
+#	Streams the KML data and yields each Placemark element once it is complete, then
+#	discards it the same way processKMLStream does.
+#========================================================================================
+def iterPlacemarks(KMLData):
+	elementStack = []
+	for event, element in gmap.iterKMLEvents(kmlChunks(KMLData)):
+		if event == "start":
+			elementStack.append(element)
+			continue
+		elementStack.pop()
+		if element.tag == gmap.KML_NAMESPACE+"Placemark":
+			yield element
+			element.clear()
+			if elementStack:
+				elementStack[-1].remove(element)
+#========================================================================================
+# cMemoryArchive
+#	Stands in for the converter's --archive output archive, the GPX files are only
+#	counted
+#========================================================================================
+class cMemoryArchive:
+	def __init__ (self):
+		self.countFiles = 0
+		self.size = 0
+
+	def add(self,fileName,data):
+		self.countFiles += 1
+		self.size += len(data)
+#========================================================================================
+# convertKML
+#	Runs the converter's processKMLStream over the KML data with the -l option and any
+#	extra options, its console output is discarded
+#========================================================================================
+def convertKML(KMLData,KMLFileName,GPXPath,options):
+	args = gmap.setupParseCmdLine(["BENCHMARK", GPXPath, "-l", "-k", KMLFileName] + options)
+	gmap.startConversion(args)
+	with contextlib.redirect_stdout(io.StringIO()):
+		returnCode = gmap.processKMLStream(kmlChunks(KMLData),args)
+	if returnCode != 0:
+		raise RuntimeError(f"processKMLStream return code {returnCode}")
+#========================================================================================
+# Stages.  Each stage function is passed the KML data, the KML file name, a scratch
+# folder and the benchmark state, a dict for the counts reported with the scenario.
+#========================================================================================
+def stageParse(KMLData,KMLFileName,folder,state):
+	count = 0
+	for placemark in iterPlacemarks(KMLData):
+		count += 1
+	state["placemarks"] = count
+
+def stageConvert(KMLData,KMLFileName,folder,state):
+	gmap.outputArchive = cMemoryArchive()
+	try:
+		# archive member names are relative to the archive, nothing is written to it
+		convertKML(KMLData,KMLFileName,"GPX",["--archive", os.path.join(folder, "benchmark.zip")])
+		state["gpxFiles"] = gmap.outputArchive.countFiles
+	finally:
+		gmap.outputArchive = None
+
+def stageWrite(KMLData,KMLFileName,folder,state):
+	convertKML(KMLData,KMLFileName,folder,[])
+
+def stageTotal(KMLData,KMLFileName,folder,state):
+	args = gmap.setupParseCmdLine(["BENCHMARK", folder, "-l", "-k", KMLFileName])
+	with contextlib.redirect_stdout(io.StringIO()):
+		returnCode = gmap.convertMap(args)
+	if returnCode != 0:
+		raise RuntimeError(f"convertMap return code {returnCode}")
+
+STAGE_FUNCTIONS = {
+	"parse": stageParse,
+	"convert": stageConvert,
+	"write": stageWrite,
+	"total": stageTotal,
+}
+#========================================================================================
+# runStage
+#	Returns (fastest time in seconds, peak memory in MB or None)
+#========================================================================================
+def runStage(stage,KMLData,KMLFileName,state,args):
+	function = STAGE_FUNCTIONS[stage]
+	times = []
+	for run in range(args.repeat):
+		with tempfile.TemporaryDirectory() as folder:
+			start = time.perf_counter()
+			function(KMLData,KMLFileName,folder,state)
+			times.append(time.perf_counter() - start)
+	peak = None
+	if not args.no_memory:
+		# tracemalloc slows everything down, so memory is measured in a run of its own
+		with tempfile.TemporaryDirectory() as folder:
+			tracemalloc.start()
+			try:
+				function(KMLData,KMLFileName,folder,state)
+				peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+			finally:
+				tracemalloc.stop()
+	return(min(times), peak)
+#========================================================================================
+# loadBaselines
+#========================================================================================
+def loadBaselines(fileName):
+	try:
+		with open(fileName, "r", encoding="utf-8") as f:
+			return(json.load(f))
+	except FileNotFoundError:
+		return({})
+	except (OSError, ValueError) as e:
+		print(f"  WARNING: Unable to read baselines file: {fileName} {str(e)}")
+		return({})
+#========================================================================================
+# reportStage
+#	Prints a stage result next to its baseline, returns 1 if it is a regression
+#========================================================================================
+def reportStage(stage,seconds,peak,baseline,args):
+	peakText = "-" if peak is None else f"{peak:.2f}"
+	baselineSeconds = baseline.get("stages", {}).get(stage, {}).get("seconds")
+	if not baselineSeconds:
+		print(f"    {stage:<11} {seconds:>9.4f} {peakText:>9} {'-':>9} {'-':>8}")
+		return(0)
+	change = (seconds - baselineSeconds) / baselineSeconds * 100
+	flag = ""
+	if change > args.tolerance:
+		flag = "  REGRESSION"
+	print(f"    {stage:<11} {seconds:>9.4f} {peakText:>9} {baselineSeconds:>9.4f} {change:>+7.1f}%{flag}")
+	return(1 if flag else 0)
+#========================================================================================
+# timeFirstOutput
+#	Starts the command as a new process and returns the fastest time from the start of
+#	the process to its first line of output.  The process is run to completion.
+#========================================================================================
+def timeFirstOutput(command,args):
+	times = []
+	for run in range(args.repeat):
+		with tempfile.TemporaryDirectory() as folder:
+			start = time.perf_counter()
+			process = subprocess.Popen(command, cwd=folder, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+			process.stdout.readline()
+			times.append(time.perf_counter() - start)
+			process.communicate()
+		if process.returncode != 0:
+			raise RuntimeError(f"{command[0]} return code {process.returncode}")
+	return(min(times))
+#========================================================================================
+# runStartup
+#	Times the first output of the script and the executable, for --help and for a -k
+#	conversion of the small scenario.  Returns (results, number of regressions)
+#========================================================================================
+def runStartup(args,baselines):
+	programs = [("script", [sys.executable, SCRIPT_PROGRAM])]
+	if os.path.isfile(args.exe):
+		programs.append(("exe", [args.exe]))
+	print(f"  Scenario: {STARTUP_SCENARIO}  time to first output of: {', '.join(name for name,command in programs)}")
+	if len(programs) == 1:
+		print(f"  Executable not found, not timed: {args.exe}")
+
+	baseline = baselines.get(STARTUP_SCENARIO, {})
+	results = {"parameters": list(SCENARIOS["small"]), "stages": dict(baseline.get("stages", {}))}
+	countRegressions = 0
+	print(f"    {'Stage':<11} {'Seconds':>9} {'Peak MB':>9} {'Baseline':>9} {'Change':>8}")
+	with tempfile.TemporaryDirectory() as KMLFolder:
+		KMLFileName = os.path.join(KMLFolder, "benchmark.kml")
+		with open(KMLFileName, "wb") as f:
+			f.write(generateKML(*SCENARIOS["small"], args.seed))
+		for name,command in programs:
+			for stage,options in (("help", ["--help"]), ("kml", ["BENCHMARK", "GPX", "-l", "-k", KMLFileName])):
+				stage = f"{name} {stage}"
+				seconds = timeFirstOutput(command + options, args)
+				results["stages"][stage] = {"seconds": round(seconds, 4), "peak_mb": None}
+				countRegressions += reportStage(stage,seconds,None,baseline,args)
+	print("")
+	return(results, countRegressions)
+#========================================================================================
+# runScenario
+#	Runs every stage of the scenario, prints the results next to the baselines and
+#	returns (results, number of regressions)
+#========================================================================================
+def runScenario(scenario,args,baselines):
+	layers, waypoints, tracks, points = scenarioParameters(scenario,args)
+	print(f"  Scenario: {scenario}  layers: {layers}  waypoints: {waypoints}  tracks: {tracks}  points per track: {points}")
+	KMLData = generateKML(layers,waypoints,tracks,points,args.seed)
+	print(f"  KML size: {len(KMLData) / (1024 * 1024):.1f} MB")
+
+	baseline = baselines.get(scenario, {})
+	if baseline and baseline.get("parameters") != [layers, waypoints, tracks, points]:
+		print("  Baseline was recorded with different scenario parameters, not compared")
+		baseline = {}
+	results = {"parameters": [layers, waypoints, tracks, points], "stages": {}}
+	countRegressions = 0
+	state = {}
+	print(f"    {'Stage':<11} {'Seconds':>9} {'Peak MB':>9} {'Baseline':>9} {'Change':>8}")
+	with tempfile.TemporaryDirectory() as KMLFolder:
+		KMLFileName = os.path.join(KMLFolder, "benchmark.kml")
+		with open(KMLFileName, "wb") as f:
+			f.write(KMLData)
+		for stage in STAGES:
+			seconds, peak = runStage(stage,KMLData,KMLFileName,state,args)
+			results["stages"][stage] = {"seconds": round(seconds, 4), "peak_mb": None if peak is None else round(peak, 2)}
+			countRegressions += reportStage(stage,seconds,peak,baseline,args)
+	print(f"  Placemarks: {state['placemarks']}  GPX files: {state['gpxFiles']}")
+	print("")
+	return(results, countRegressions)
+#========================================================================================
+# Main
+#========================================================================================
+def main():
+	args = setupParseCmdLine()
+	if args.generate is not None:
+		layers, waypoints, tracks, points = scenarioParameters(args.scenarios[0],args)
+		try:
+			with open(args.generate, "wb") as f:
+				f.write(generateKML(layers,waypoints,tracks,points,args.seed))
+		except OSError as e:
+			print(f"  ERROR: Unable to write KML file: {args.generate} {str(e)}")
+			return(10)
+		print(f"  KML file written: {args.generate}")
+		return(0)
+
+	print("")
+	print("GoogleMapToOSMAndGPX conversion benchmark.")
+	print("  Program:                ", PROGRAM_NAME)
+	print("  Version:                ", PROGRAM_VERSION)
+	print("  Converter version:      ", gmap.PROGRAM_VERSION)
+	print("  Python:                 ", sys.version.split()[0])
+	print("  Runs per stage:         ", args.repeat)
+	print("  Baselines file:         ", args.baseline)
+	print("  Regression tolerance:   ", f"{args.tolerance}%")
+	print("")
+	baselines = loadBaselines(args.baseline)
+	countRegressions = 0
+	for scenario in args.scenarios:
+		if scenario == STARTUP_SCENARIO:
+			results, count = runStartup(args,baselines)
+		else:
+			results, count = runScenario(scenario,args,baselines)
+		baselines[scenario] = results
+		countRegressions += count
+
+	if args.save_baseline:
+		try:
+			with open(args.baseline, "w", encoding="utf-8") as f:
+				json.dump(baselines, f, indent=2)
+		except OSError as e:
+			print(f"  ERROR: Unable to write baselines file: {args.baseline} {str(e)}")
+			return(10)
+		print(f"  Baselines saved: {args.baseline}")
+	print(f"  Regressions: {countRegressions}")
+	return(1 if countRegressions else 0)
+#========================================================================================
+#
+#========================================================================================
+if __name__ == "__main__":
+	sys.exit(main())
@@ -2,6 +2,12 @@
 #============================================================================================================
 # GoogleMapToOSMAndGPX-gui.py
 #
+# V1.3  10/17/2026
+#	Conversion output is streamed into the output window as it is printed, added a
+#	progress bar and a Cancel button
+# V1.2  10/17/2026
+#	Conversions are run in-process with GoogleMapToOSMAndGPX.convert() on a worker
+#	thread instead of starting GoogleMapToOSMAndGPX.exe for every run
 # V1.1  8/31/2024
 #	Added icons, version number and some comments
 #	When building with PyInstaller, make sure to include all icon sizes:
@@ -9,16 +15,18 @@
 # V1.0 Original
 #============================================================================================================
 import tkinter as tk
-from tkinter import filedialog, messagebox, PhotoImage
-import subprocess
+from tkinter import filedialog, messagebox, PhotoImage, ttk
+import threading
+import queue
+import multiprocessing
 import os
 import sys
 import re
 import string
+import GoogleMapToOSMAndGPX
 
-EXE_PROGRAM = "GoogleMapToOSMAndGPX.exe"
-PYTHON_PROGRAM = "GoogleMapToOSMAndGPX.py"
-VERSION ="V1.1"
+VERSION ="V1.3"
+OUTPUT_POLL_INTERVAL = 100	# ms between checks of the conversion output queue
 
 class Tooltip:
 	def __init__(self, widget, text):
@@ -73,94 +81,125 @@ def is_valid_hex(hex_str):
 	return False
 
 def show_help():
-	execute_program(EXE_PROGRAM, '--help')
-
-def execute_python_program():
-	execute_program('py',PYTHON_PROGRAM)
-
-def execute_exe_program():
-	execute_program(EXE_PROGRAM,"")
-
+	run_conversion(['--help'])
+
+def execute_program():
+	command = []
+	directory = directory_entry.get()
+	layers_checked = layers_var.get()
+	transparency_checked = transparency_var.get()
+	transparency_value = transparency_entry.get()
+	arrows_checked = arrows_var.get()
+	ends_checked = ends_var.get()
+	split_value = split_var.get()
+	interval_value = interval_entry.get()
+	width_checked = width_var.get()
+	width_value = width_entry.get()
+	map_url_value = map_url_entry.get()
+	map_id = extract_map_id(map_url_value)
+	
+	if not map_id:
+		messagebox.showerror("Error", "No Map ID string found in Map URL.")
+		return
+	command.append(map_id)
 
-def execute_program(exe_program,parm):
-	if parm == "--help":
-		command = [exe_program, parm]
-	else:
-		if parm == "":  # execute the exe program
-			command = [exe_program]
-		else:
-			command = [exe_program,parm]
-
-		directory = directory_entry.get()
-		layers_checked = layers_var.get()
-		transparency_checked = transparency_var.get()
-		transparency_value = transparency_entry.get()
-		arrows_checked = arrows_var.get()
-		ends_checked = ends_var.get()
-		split_value = split_var.get()
-		interval_value = interval_entry.get()
-		width_checked = width_var.get()
-		width_value = width_entry.get()
-		map_url_value = map_url_entry.get()
-		map_id = extract_map_id(map_url_value)
-		
-		if not map_id:
-			messagebox.showerror("Error", "No Map ID string found in Map URL.")
+	if not directory:
+		messagebox.showerror("Error", "No GPX file output directory specified.")
+		return
+	command.append(directory)
+
+	if layers_checked:
+		command.append('--layers')
+	if arrows_checked:
+		command.append('--arrows')
+	if ends_checked:
+		command.append('--ends')
+	if width_checked:
+		try:
+			width_value = int(width_value)
+			if not (width_value > 0 and width_value <= 9999):
+				messagebox.showerror("Error", "Width value must be a number [1-24].")
+				return
+		except ValueError:
+			messagebox.showerror("Error", "Invalid width value. Please enter a number [1-24].")
 			return
-		command.append(map_id)
-
-		if not directory:
-			messagebox.showerror("Error", "No GPX file output directory specified.")
+		command.extend(['--width', str(width_value)])
+	if transparency_checked:
+		if not is_valid_hex(transparency_value):
+			messagebox.showerror("Error", "Transparency value must be a 2 digit hex value [00-FF].")
 			return
-		command.append(directory)
-
-		if layers_checked:
-			command.append('--layers')
-		if arrows_checked:
-			command.append('--arrows')
-		if ends_checked:
-			command.append('--ends')
-		if width_checked:
+		command.extend(['--transparency', transparency_value])
+	if split_value != "no_split":
+		command.extend(['--split', split_value])
+		interval_value = interval_value.replace(" ","")
+		if interval_value != "":
 			try:
-				width_value = int(width_value)
-				if not (width_value > 0 and width_value <= 9999):
-					messagebox.showerror("Error", "Width value must be a number [1-24].")
+				interval_value = float(interval_value)
+				if interval_value < 0 or interval_value > 9999.0:
+					messagebox.showerror("Error", "Interval value must be a number [0.0-9999.0].")
 					return
 			except ValueError:
-				messagebox.showerror("Error", "Invalid width value. Please enter a number [1-24].")
+				messagebox.showerror("Error", "Invalid interval value. Please enter a number [0.0-9999.0].")
 				return
-			command.extend(['--width', str(width_value)])
-		if transparency_checked:
-			if not is_valid_hex(transparency_value):
-				messagebox.showerror("Error", "Transparency value must be a 2 digit hex value [00-FF].")
-				return
-			command.extend(['--transparency', transparency_value])
-		if split_value != "no_split":
-			command.extend(['--split', split_value])
-			interval_value = interval_value.replace(" ","")
-			if interval_value != "":
-				try:
-					interval_value = float(interval_value)
-					if interval_value < 0 or interval_value > 9999.0:
-						messagebox.showerror("Error", "Interval value must be a number [0.0-9999.0].")
-						return
-				except ValueError:
-					messagebox.showerror("Error", "Invalid interval value. Please enter a number [0.0-9999.0].")
-					return
-				command.extend(['--interval',str(interval_value)])
+			command.extend(['--interval',str(interval_value)])
 	#print("command:",command)
-	if not os.path.isfile(EXE_PROGRAM):
-		cwdir = os.getcwd()
-		messagebox.showerror("Error",EXE_PROGRAM+" utility program file missing from the current directory: "+cwdir)
-		return
-	process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-	stdout, stderr = process.communicate()
+	run_conversion(command)
+
+def run_conversion(command):
+	# The conversion runs on a worker thread so the window stays responsive.  Each line
+	# it prints is put on output_queue, which poll_output empties from the tkinter event
+	# loop, followed by the conversion result once it is done.
+	global cancel_event
+	cancel_event = threading.Event()
+	execute_exe_button.configure(state="disabled")
+	help_button.configure(state="disabled")
+	cancel_button.configure(state="normal")
+	progress_bar.start()
+	def worker():
+		result = GoogleMapToOSMAndGPX.convert(command, output_queue.put, cancel_event)
+		output_queue.put(result)
+	threading.Thread(target=worker, daemon=True).start()
+	root.after(OUTPUT_POLL_INTERVAL, poll_output)
+
+def poll_output():
+	lines = []
+	result = None
+	try:
+		while True:
+			item = output_queue.get_nowait()
+			if isinstance(item, str):
+				lines.append(item)
+			else:
+				result = item
+	except queue.Empty:
+		pass
+	if lines:
+		output_window.configure(state="normal")	 # Allow modifications to text
+		output_window.insert(tk.END, "".join(lines))
+		output_window.configure(state="disabled")  # Disable modifications to text
+		output_window.see(tk.END)  # Scroll to the end
+	if result is None:
+		progress_label.configure(text=f"Tracks: {GoogleMapToOSMAndGPX.countTotalTracks}  Waypoints: {GoogleMapToOSMAndGPX.countTotalWaypoints}")
+		root.after(OUTPUT_POLL_INTERVAL, poll_output)
+	else:
+		conversion_done(result)
+
+def conversion_done(result):
+	progress_bar.stop()
+	if result.returnCode == 16:
+		progress_label.configure(text="Cancelled")
+	elif result.returnCode == 0:
+		progress_label.configure(text=f"Done  Tracks: {result.countTracks}  Waypoints: {result.countWaypoints}")
+	else:
+		progress_label.configure(text=f"Failed, return code {result.returnCode}")
+	execute_exe_button.configure(state="normal")
+	help_button.configure(state="normal")
+	cancel_button.configure(state="disabled")
 
-	output_window.configure(state="normal")	 # Allow modifications to text
-	output_window.insert(tk.END, stdout)
-	output_window.insert(tk.END, stderr)
-	output_window.configure(state="disabled")  # Disable modifications to text
-	output_window.see(tk.END)  # Scroll to the end
+def cancel_conversion():
+	cancel_event.set()
+	cancel_button.configure(state="disabled")
+	progress_label.configure(text="Cancelling...")
 
 def clear_output():
 	output_window.configure(state="normal")	 # Allow modifications to text
@@ -174,6 +213,8 @@ def browse_directory():
 		directory_entry.insert(0, directory_name)
 
 def exit_program():
+	# stop a running conversion at the next KML element
+	cancel_event.set()
 	root.destroy()
 
 def resource_path(relative_path):
@@ -185,6 +226,10 @@ def resource_path(relative_path):
 		base_path = os.path.abspath(".")
 	return os.path.join(base_path, relative_path)
 #=====================================================================================
+# needed for the track worker processes of the frozen windows executable
+multiprocessing.freeze_support()
+output_queue = queue.Queue()
+cancel_event = threading.Event()
 root = tk.Tk()
 root.title("Google Map to OSMAnd style GPX file converter " + VERSION)
 root.geometry("800x660")
@@ -212,7 +257,7 @@ except tk.TclError as e:
 
 
 # Instruction text
-instruction_text = "Takes a custom google map and exports its KML data and directly converts it into a folder of OSMAnd style GPX files. Both tracks and waypoints and translated. Descriptions, icon symbol, icon color, track color, track width are all translated. Each track is put in it's own GPX file and all waypoints are put in a single GPX file.\n\nThis program is a GUI wrapper. The actual conversion is performed by the command line utility: "+EXE_PROGRAM+"\n\nNote: The google map must have sharing enabled."
+instruction_text = "Takes a custom google map and exports its KML data and directly converts it into a folder of OSMAnd style GPX files. Both tracks and waypoints and translated. Descriptions, icon symbol, icon color, track color, track width are all translated. Each track is put in it's own GPX file and all waypoints are put in a single GPX file.\n\nThis program is a GUI wrapper around the conversion performed by the command line utility: GoogleMapToOSMAndGPX\n\nNote: The google map must have sharing enabled."
 instruction_label = tk.Label(root, text=instruction_text, wraplength=700)
 instruction_label.grid(row=0, column=0, columnspan=5, padx=10, pady=5)
 instruction_label.config(justify="left")
@@ -299,21 +344,27 @@ interval_entry.config(justify="left")	# Align left
 Tooltip(interval_entry, "Distance in miles or time in seconds to display splits on a track.\nSplit type of distance or time must be selected from the split pulldown menu.")
 
 
-# Python Execute Button
-#execute_python_button = tk.Button(root, text="Convert - python", command=execute_python_program)
-#execute_python_button.grid(row=8, column=0, padx=10, pady=10, sticky="ew")
-#Tooltip(execute_python_button, "Execute the Python program with provided parameters")
-
 # Exe Execute Button
-execute_exe_button = tk.Button(root, text="Convert", command=execute_exe_program)
+execute_exe_button = tk.Button(root, text="Convert", command=execute_program)
 execute_exe_button.grid(row=8, column=0, padx=10, pady=10, sticky="ew")
 Tooltip(execute_exe_button, "Run the conversion utility with the specified parameters")
 
+# Cancel Button
+cancel_button = tk.Button(root, text="Cancel", command=cancel_conversion, state="disabled")
+cancel_button.grid(row=8, column=1, padx=10, pady=10, sticky="ew")
+Tooltip(cancel_button, "Stop the running conversion")
+
 # Clear Output Button
 clear_output_button = tk.Button(root, text="Clear Output", command=clear_output)
 clear_output_button.grid(row=8, column=2, padx=10, pady=10, sticky="ew")
 Tooltip(clear_output_button, "Clear the output window")
 
+# Progress Bar, shows the tracks and waypoints converted so far
+progress_bar = ttk.Progressbar(root, mode="indeterminate")
+progress_bar.grid(row=8, column=3, padx=10, pady=10, sticky="ew")
+progress_label = tk.Label(root, text="")
+progress_label.grid(row=8, column=4, padx=10, pady=10, sticky="w")
+
 # Redirected Output Window
 # output_window = tk.Text(root, height=10, wrap="none", width=80)
 # output_window.grid(row=6, column=0, columnspan=5, padx=10, pady=10, sticky="nsew")
@@ -14,18 +14,58 @@
 # 6/7/2024:  V1.2 Added -l option to write out files as layers
 # 6/16/2024: V1.2 Icon translation table change
 # 8/31/2024: V1.3 Added epolog
+# 10/17/2026: V1.4 Added -k option to stream a local KML file or stdin through an incremental parser
+#                  Downloaded KML data is streamed in chunks straight into the parser
+#                  Icon translation table is built once, added -c option for a user icon file
+#                  GPX files are written incrementally by cGPXWriter instead of a minidom round trip
+#                  Added -j option to convert and write tracks in a pool of worker processes
+#                  Downloaded KML data is cached, conditional GETs and --offline use the cache
+#                  Added --incremental option, only changed GPX files are rewritten
+#                  Added --batch option, maps are fetched concurrently over a shared session
+#                  Added --simplify option, Douglas-Peucker track simplification
+#                  Track coordinates are parsed and written in bulk instead of point by point
+#                  Placemarks are converted into slotted records that the GPX writer consumes
+#                  Added --profile option, per stage, layer and track timing report
+#                  Placemarks are read in one pass, Polygon and MultiGeometry placemarks are converted
+#                  Layers with the same name are written to separate folders
+#                  Added --archive option, all GPX files are written into one zip or tar file
+#                  Added --combine option, a layer's tracks and waypoints are written to one GPX file
+#                  Added convert(), an in-process conversion API used by the GUI
+#                  convert() streams its output line by line and can be cancelled
+#                  Faster startup, requests and the archive modules are only imported when used,
+#                  single maps are downloaded with urllib
+#                  Added --watch option, maps are polled and only converted when they change
+#                  Added --serve option, a local HTTP service for converted maps with an LRU cache
+#                  -s distance splits tracks into segments, added --split-files and --max-points
+#                  Added --stats option, track bounds and statistics and a layer index file
+#                  Added --bbox and --near area filters and --clip
 #========================================================================================
+# Modules only some runs need are imported where they are used so --help and local KML
+# conversions start quickly: requests (batch downloads), urllib.request, zlib (single map
+# downloads), zipfile and tarfile (--archive), csv (-c), tempfile (--batch) and
+# multiprocessing (-j, frozen executable).
 import sys
 import argparse
-import requests
 from xml.etree import ElementTree as ET
-from xml.dom import minidom
 import os
 import os.path
+import json
+import io
+import contextlib
+import collections
+import concurrent.futures
+import hashlib
+import threading
+import shlex
+import math
+from array import array
+import itertools
+import time
 from pathlib import Path
 
-PROGRAM_NAME = Path(sys.argv[0]).stem
-PROGRAM_VERSION = "1.3"
+# when imported, e.g. by the GUI, sys.argv[0] is the importing program
+PROGRAM_NAME = Path(sys.argv[0]).stem if __name__ == "__main__" else "GoogleMapToOSMAndGPX"
+PROGRAM_VERSION = "1.4"
 DEFAULT_TRACK_TRANSPARENCY = "80"
 DEFAULT_WAYPOINT_DESCRIPTION = ""
 DEFAULT_TRACK_DESCRIPTION = ""
@@ -41,31 +81,266 @@ SPLIT_TYPE_DISTANCE = "distance"
 SPLIT_TYPE_NONE = "no_split"
 DEFAULT_TRACK_SPLIT_TYPE = SPLIT_TYPE_NONE # no_split, distance, time
 KMLCOLOR = "KMLCOLOR"
+DEFAULT_TRACK_COLOR = DEFAULT_ICON_COLOR	# If no style found in KML
 # This is the magic URL that will initiate a get request to google and get the KML data
 # for the specified google map.
 GET_URL_PREFIX = "https://www.google.com/maps/d/u/0/kml?forcekml=1&mid="
 GET_URL_SUFFIX = ""
+KML_NAMESPACE = "{http://www.opengis.net/kml/2.2}"
+KML_CHUNK_SIZE = 64 * 1024	# bytes fed to the KML parser at a time
+ICON_INDEX_SUFFIX = ".idx"	# compiled user icon file, written next to the user icon file
+PENDING_TRACKS_PER_JOB = 4	# placemarks allowed in flight per worker process before waiting
+# KML cache folder, one .kml file and one .json file of HTTP validators per map id and KML URL
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.join(Path.home(), ".cache"), "GoogleMapToOSMAndGPX")
+DEFAULT_CACHE_SIZE = 200	# MB, least recently used maps are evicted beyond this size
+CACHE_TEMP_FILE_AGE = 3600	# seconds, older .tmp files in the KML cache are left from interrupted downloads
+MANIFEST_FILE_NAME = ".GoogleMapToOSMAndGPX-manifest.json"	# --incremental content hashes, in GPX_path
+DEFAULT_FETCH_JOBS = 4	# --batch maps downloaded at the same time
+DEFAULT_FETCH_TIMEOUT = 30	# seconds a KML download may wait for the server to connect or send data
+EARTH_RADIUS = 6371008.8	# meters, mean earth radius
+TRACKPOINTS_PER_WRITE = 10000	# trackpoints formatted into one string per file write
+PROFILE_FILE_NAME = "GoogleMapToOSMAndGPX-profile.json"	# --profile report, in GPX_path
+DEFAULT_PROFILE_TRACKS = 10	# slowest tracks listed in the --profile report
+PROFILE_STAGES = ("fetch", "parse", "convert", "write", "wait")	# report order of the --profile stages
+# --archive formats and the archive file name endings they are picked by
+ARCHIVE_FORMATS = {"zip": (".zip",), "tar": (".tar",), "tar.gz": (".tar.gz", ".tgz")}
+COMBINED_FILE_NAME = "Combined"	# --combine GPX files: Combined.gpx, Combined 2.gpx, ...
+DEFAULT_COMBINE_SIZE = 10	# MB, a --combine GPX file is rolled over to a new file beyond this size
+DEFAULT_SERVE_HOST = "127.0.0.1"	# --serve listens on this address only
+DEFAULT_SERVE_CACHE = 100	# MB of converted maps kept in memory by --serve
+LAYER_INDEX_FILE_NAME = "GoogleMapToOSMAndGPX-index.json"	# --stats summary of a layer's GPX files, in the layer folder
+STATS_NAMESPACE = "https://github.com/tmusolf/GoogleMapToOSMAndGPX/stats"	# --stats GPX extension elements
+AREA_GRID_CELLS = 64	# --near areas are looked up in a grid of AREA_GRID_CELLS x AREA_GRID_CELLS cells
+TRACK_OUTSIDE_AREA = -1	# processTrack return code of a track outside the --bbox or --near area, not an error
+SERVE_PATH_PREFIX = "/maps/"	# --serve URLs: /maps/<map id>.zip, /maps/<map id>.gpx, /maps/<map id>/<GPX file>
+# options a --serve request may give, by argparse dest.  Only options that shape the GPX
+# output, nothing that reaches other hosts, writes files or starts processes.
+SERVE_REQUEST_OPTIONS = ("transparency", "width", "arrows", "ends", "layers", "split", "interval", "simplify", "stats", "bbox", "near", "clip", "max_points")
 
 # globals to keep track of some counts
 countTotalWaypoints = 0
 countTotalTracks = 0
 countTotalLayers = 0
+countTotalOutside = 0
+# layer folders created in this run, normalized with os.path.normcase
+layerFolderNames = set()
+# user icon files already loaded by this process: file name -> (file stamp, icon table)
+userIconTables = {}
+# worker process pool for tracks when -j is greater than 1, otherwise None
+trackPool = None
+# placemarks converted but not yet reported, in KML order: (layer, counts, manifestEntry, future)
+pendingPlacemarks = collections.deque()
+# --incremental output manifests, GPX file name -> content hash.  outputManifest is from
+# the previous run, newManifest collects the files of this run.
+outputManifest = {}
+newManifest = {}
+# requests session shared by the batch downloads so connections are reused, see
+# getHTTPSession.  None when a single map is downloaded with urllib.
+httpSession = None
+# cRunProfile of the map being converted when --profile is used, otherwise None
+runProfile = None
+# cOutputArchive of the map being converted when --archive is used, otherwise None
+outputArchive = None
+# output a worker process leaves for the main process to store, (function, args) pairs
+# returned with the track's results.  None in the main process.  A forked worker
+# inherits outputArchive and combinedLayers, which it must never write to or release.
+deferredOutput = None
+# --combine layers being written, layer folder name -> cLayer
+combinedLayers = {}
+# --stats layers being written, layer folder name -> cLayer
+indexedLayers = {}
+# convert() calls are run one at a time, the converter state above is per process
+conversionLock = threading.Lock()
+# threading.Event of the running convert() call, the conversion stops when it is set
+cancelEvent = None
+# errors printed by the running convert() call, see printError, otherwise None
+conversionErrors = None
 #========================================================================================
+# Placemarks are converted into these records before they are written.  The records use
+# __slots__ and track coordinates are held in array('d') buffers, 8 bytes a value, so a
+# converted placemark takes a small fraction of the memory of an ElementTree.
+#========================================================================================
+# cWaypoint is the OSMAnd icon style of a waypoint
 class cWaypoint:
+	__slots__ = ("icon","color","background")
 	def __init__ (self,icon,color,background):
 		self.icon = icon
 		self.color = color
 		self.background = background
+
+# coordinateText holds the KML longitude and latitude strings when they are not the
+# shortest repr of the numbers, see parseCoordinates
+class cGPXWaypoint:
+	__slots__ = ("name","description","latitude","longitude","elevation","coordinateText","style")
+	def __init__ (self,name,description,latitude,longitude,elevation,coordinateText,style):
+		self.name = name
+		self.description = description
+		self.latitude = latitude
+		self.longitude = longitude
+		self.elevation = elevation
+		self.coordinateText = coordinateText
+		self.style = style
+
+# coordinateText holds lists of the KML longitude and latitude strings, only for the rare
+# track whose numbers would not be written back exactly as they appear in the KML file.
+# segmentStarts holds the index of the first point of each track segment.
+# extensions is a list of (tag, text) pairs for the track's OSMAnd extensions.
+# stats is the track's cTrackStats with --stats, otherwise None.
+class cGPXTrack:
+	__slots__ = ("name","description","longitudes","latitudes","altitudes","coordinateText","segmentStarts","extensions","stats")
+	def __init__ (self,name,description,longitudes,latitudes,altitudes,coordinateText):
+		self.name = name
+		self.description = description
+		self.longitudes = longitudes
+		self.latitudes = latitudes
+		self.altitudes = altitudes
+		self.coordinateText = coordinateText
+		self.segmentStarts = [0]
+		self.extensions = []
+		self.stats = None
+
+	# (start, end) point indexes of each segment
+	def segments(self):
+		return(zip(self.segmentStarts, self.segmentStarts[1:] + [len(self.longitudes)]))
+
+# cTrackStats is the bounding box, length in meters, point and segment counts and
+# elevation range of a track, see trackStatistics
+class cTrackStats:
+	__slots__ = ("minLatitude","minLongitude","maxLatitude","maxLongitude","length","countPoints","countSegments","minElevation","maxElevation")
+
+	def bounds(self):
+		return({"minlat":self.minLatitude, "minlon":self.minLongitude, "maxlat":self.maxLatitude, "maxlon":self.maxLongitude})
+
+# cAreaFilter is the --bbox or --near area.  A --near circle is looked up in a grid of
+# cells over its bounding box, each cell is inside, outside or on the edge of the
+# circle.  Only points in edge cells need their distance from the center worked out.
+CELL_OUTSIDE,CELL_EDGE,CELL_INSIDE = 0,1,2
+class cAreaFilter:
+	__slots__ = ("minLatitude","minLongitude","maxLatitude","maxLongitude","center","radius","cellLatitude","cellLongitude","cells")
+
+	def __init__ (self,bbox,near):
+		self.center = None
+		self.cells = None
+		if bbox is not None:
+			self.minLatitude,self.minLongitude,self.maxLatitude,self.maxLongitude = bbox
+			return
+		latitude,longitude,miles = near
+		self.center = (latitude,longitude)
+		self.radius = miles * 1609.34
+		angle = self.radius / EARTH_RADIUS
+		self.minLatitude = max(-90.0, latitude - math.degrees(angle))
+		self.maxLatitude = min(90.0, latitude + math.degrees(angle))
+		ratio = math.sin(angle) / math.cos(math.radians(latitude)) if abs(latitude) < 90.0 else 2.0
+		deltaLongitude = math.degrees(math.asin(ratio)) if ratio < 1.0 else 180.0
+		if self.minLatitude == -90.0 or self.maxLatitude == 90.0 or abs(longitude) + deltaLongitude > 180.0:
+			# the circle takes in a pole or crosses the 180th meridian
+			self.minLongitude,self.maxLongitude = -180.0,180.0
+		else:
+			self.minLongitude,self.maxLongitude = longitude - deltaLongitude, longitude + deltaLongitude
+		self.cellLatitude = (self.maxLatitude - self.minLatitude) / AREA_GRID_CELLS
+		self.cellLongitude = (self.maxLongitude - self.minLongitude) / AREA_GRID_CELLS
+		# a cell is inside when its farthest point is within the radius and outside when its
+		# nearest point is beyond it, its farthest point from its own middle bounds both
+		self.cells = bytearray(AREA_GRID_CELLS * AREA_GRID_CELLS)
+		for row in range(AREA_GRID_CELLS):
+			south = self.minLatitude + row * self.cellLatitude
+			north = south + self.cellLatitude
+			for column in range(AREA_GRID_CELLS):
+				west = self.minLongitude + column * self.cellLongitude
+				east = west + self.cellLongitude
+				middle = ((south + north) / 2, (west + east) / 2)
+				halfSize = max(pointDistance(middle, corner) for corner in ((south,west),(south,east),(north,west),(north,east),(south,middle[1]),(north,middle[1])))
+				distance = pointDistance(self.center, middle)
+				if distance + halfSize <= self.radius:
+					self.cells[row * AREA_GRID_CELLS + column] = CELL_INSIDE
+				elif distance - halfSize <= self.radius:
+					self.cells[row * AREA_GRID_CELLS + column] = CELL_EDGE
+
+	def contains(self,latitude,longitude):
+		if not (self.minLatitude <= latitude <= self.maxLatitude and self.minLongitude <= longitude <= self.maxLongitude):
+			return(False)
+		if self.cells is None:
+			return(True)
+		row = min(int((latitude - self.minLatitude) / self.cellLatitude), AREA_GRID_CELLS - 1)
+		column = min(int((longitude - self.minLongitude) / self.cellLongitude), AREA_GRID_CELLS - 1)
+		cell = self.cells[row * AREA_GRID_CELLS + column]
+		if cell == CELL_EDGE:
+			return(pointDistance(self.center, (latitude,longitude)) <= self.radius)
+		return(cell == CELL_INSIDE)
+
+	# True if any of the points is in the area.  Points whose extent misses the area's
+	# bounding box are rejected without looking at each point.
+	def containsAny(self,latitudes,longitudes):
+		if (min(latitudes) > self.maxLatitude or max(latitudes) < self.minLatitude
+				or min(longitudes) > self.maxLongitude or max(longitudes) < self.minLongitude):
+			return(False)
+		return(any(map(self.contains, latitudes, longitudes)))
+
+# cKMLPlacemark is a placemark as read from the KML file by readPlacemark.  points and
+# lines are the text of the coordinates elements of its point and line geometries.
+class cKMLPlacemark:
+	__slots__ = ("name","description","styleURL","points","lines")
+	def __init__ (self):
+		self.name = None
+		self.description = None
+		self.styleURL = None
+		self.points = []
+		self.lines = []
 #========================================================================================
+# cLayer holds the state of the layer currently being converted.  The layer's waypoint
+# GPX file is opened when the first waypoint arrives and each waypoint is written to it
+# as soon as it is converted.
 #========================================================================================
-def setupParseCmdLine():
+class cLayer:
+	def __init__ (self,name,folderName,args):
+		self.name = name
+		self.folderName = folderName
+		self.incremental = args.incremental
+		self.archive = args.archive is not None
+		self.waypointFileName = os.path.join(folderName, "WayPts.gpx")
+		self.waypointFile = None
+		self.waypointWriter = None
+		self.countWaypoints = 0
+		self.countTracks = 0
+		self.countOutside = 0
+		# --combine: trk elements not yet written and the files written so far
+		self.combine = args.combine
+		self.combineSize = args.combine_size * 1024 * 1024
+		self.combinedTracks = []
+		self.combinedTracksSize = 0
+		self.combinedFileNames = []
+		# --stats: index entries of the layer's tracks, previous run's entries by file
+		# name for the tracks -u leaves unchanged, and [minlat, minlon, maxlat, maxlon] of
+		# the layer's waypoints
+		self.trackIndex = [] if args.stats else None
+		self.previousTrackIndex = {}
+		self.waypointBounds = None
+#========================================================================================
+# coordinateList
+#	argparse type of --bbox and --near, count comma separated numbers
+#========================================================================================
+def coordinateList(count):
+	def parse(text):
+		try:
+			values = tuple(float(value) for value in text.split(","))
+		except ValueError:
+			raise argparse.ArgumentTypeError(f"not a list of numbers: {text}")
+		if len(values) != count:
+			raise argparse.ArgumentTypeError(f"{count} comma separated numbers expected: {text}")
+		return(values)
+	return(parse)
+#========================================================================================
+#========================================================================================
+def setupParseCmdLine(argv=None,defaults=None):
 	parser = argparse.ArgumentParser(
 	prog=PROGRAM_NAME,
 	description="Exports the KML data from a google my maps (GMap) and converts it to OSMAnd style GPX files, including icon conversion.",
 	epilog="Conversion Utility: " + PROGRAM_NAME + "  V" + PROGRAM_VERSION)
 	parser.add_argument("map_id",
-		help="The google map id - found between the mid= and & in the map url.  Map must have sharing enabled")
+		nargs="?",
+		help="The google map id - found between the mid= and & in the map url.  Map must have sharing enabled.  May be omitted when --kml-file is used.")
 	parser.add_argument("GPX_path",
+		nargs="?",
 		help="path name for the output GPX files")
 	parser.add_argument('-w', '--width',
 		action='store',
@@ -97,13 +372,258 @@ def setupParseCmdLine():
 		action='store',
 		required=False,
 		default=DEFAULT_TRACK_SPLIT_INTERVAL, 
-		help="Distance in miles or time in minutes to display splits on track.  Split type must also be defined. Default: "+str(DEFAULT_TRACK_SPLIT_INTERVAL)),
+		help="Distance in miles or time in minutes to display splits on track.  Split type must also be defined.  With -s distance each track is split into a track segment per interval. Default: "+str(DEFAULT_TRACK_SPLIT_INTERVAL)),
+	parser.add_argument('--split-files',
+		action='store_true',
+		required=False,
+		help="With -s distance, write each interval of a track to its own GPX file, <track> 1.gpx, <track> 2.gpx, ... instead of a track segment.")
+	parser.add_argument('--max-points',
+		action='store',
+		required=False,
+		type=int,
+		metavar="N",
+		help="Split tracks with more than N points into several GPX files, <track> 1.gpx, <track> 2.gpx, ... of at most N points.  Each file starts with the last point of the one before.")
+	parser.add_argument('--stats',
+		action='store_true',
+		required=False,
+		help="Write each track's bounds, length, point count and elevation range into its GPX file and a summary of every layer's GPX files, "+LAYER_INDEX_FILE_NAME+", into the layer folder.")
+	parser.add_argument('--bbox',
+		action='store',
+		required=False,
+		type=coordinateList(4),
+		metavar="MINLAT,MINLON,MAXLAT,MAXLON",
+		help="Only convert the waypoints in this area and the tracks with at least one point in it.")
+	parser.add_argument('--near',
+		action='store',
+		required=False,
+		type=coordinateList(3),
+		metavar="LAT,LON,MILES",
+		help="Only convert the waypoints within MILES miles of LAT,LON and the tracks with at least one point that close.")
+	parser.add_argument('--clip',
+		action='store_true',
+		required=False,
+		help="With --bbox or --near, cut tracks down to the parts inside the area.  Each part becomes a track segment.")
 	parser.add_argument('-l', '--layers', 
 		action='store_true',
 		required=False,
 		help="If present, under the GPX path name a nested folder will be created for each, non-empty, layer found in the KML file.  Each of these folders will contain a single GPX file containing all of the waypoints in the KML file and one GPX file for each track found in the layer.")
+	parser.add_argument('-k', '--kml-file',
+		action='store',
+		required=False,
+		metavar="KML_FILE",
+		help="Convert a local KML file instead of downloading the map.  Use - to read the KML data from stdin.  The file is parsed incrementally so memory use stays flat for very large maps.")
+	parser.add_argument('-c', '--icons',
+		action='store',
+		required=False,
+		metavar="ICON_FILE",
+		help="User icon translation file.  Each line is: KML icon number,OSMAnd icon name[,color[,shape]].  Entries add to or replace the built in translation table.")
+	parser.add_argument('-j', '--jobs',
+		action='store',
+		required=False,
+		type=int,
+		default=1,
+		metavar="N",
+		help="Number of worker processes used to convert and write track GPX files.  Default: 1")
+	parser.add_argument('--offline',
+		action='store_true',
+		required=False,
+		help="Convert the map from the KML cache without contacting google.")
+	parser.add_argument('--no-cache',
+		action='store_true',
+		required=False,
+		help="Always download the full map and do not save it in the KML cache.")
+	parser.add_argument('--cache-dir',
+		action='store',
+		required=False,
+		default=DEFAULT_CACHE_DIR,
+		help="Folder for the KML cache.  Default: "+DEFAULT_CACHE_DIR)
+	parser.add_argument('--cache-size',
+		action='store',
+		required=False,
+		type=int,
+		default=DEFAULT_CACHE_SIZE,
+		metavar="MB",
+		help="Maximum size of the KML cache in megabytes, least recently used maps are removed beyond this.  Default: "+str(DEFAULT_CACHE_SIZE))
+	parser.add_argument('-u', '--incremental',
+		action='store_true',
+		required=False,
+		help="Only rewrite GPX files whose content changed since the last run and delete GPX files of placemarks that no longer exist.  Uses a manifest file in the GPX path.")
+	parser.add_argument('--simplify',
+		action='store',
+		required=False,
+		type=float,
+		metavar="METERS",
+		help="Simplify tracks, removing points that are less than this many meters from the simplified line.")
+	parser.add_argument('-b', '--batch',
+		action='store',
+		required=False,
+		metavar="BATCH_FILE",
+		help="Convert every map listed in a batch file instead of map_id.  Each line is: GPX path,map id[,options].  The options on a line are added to the options on the command line.  Lines starting with # are ignored.")
+	parser.add_argument('--fetch-jobs',
+		action='store',
+		required=False,
+		type=int,
+		default=DEFAULT_FETCH_JOBS,
+		metavar="N",
+		help="Number of maps downloaded at the same time in batch mode.  Default: "+str(DEFAULT_FETCH_JOBS))
+	parser.add_argument('--timeout',
+		action='store',
+		required=False,
+		type=float,
+		default=DEFAULT_FETCH_TIMEOUT,
+		metavar="SECONDS",
+		help="Seconds to wait for google to connect or send more of the KML data before the download fails.  Default: "+str(DEFAULT_FETCH_TIMEOUT))
+	parser.add_argument('--archive',
+		action='store',
+		required=False,
+		metavar="ARCHIVE_FILE",
+		help="Write all GPX files into one zip, tar or tar.gz archive instead of GPX_path, keeping the layer folders.  The format is taken from the file name ending unless --archive-format is given.  Use - to write the archive to stdout, the console output then goes to stderr.  GPX_path may be omitted, if given it is a folder inside the archive.")
+	parser.add_argument('--archive-format',
+		action='store',
+		required=False,
+		choices=list(ARCHIVE_FORMATS),
+		help="Format of the --archive file.  Default: from the file name, zip for stdout.")
+	parser.add_argument('--combine',
+		action='store_true',
+		required=False,
+		help="Write all tracks and waypoints of a layer into one GPX file, "+COMBINED_FILE_NAME+".gpx, with a trk element for each track, instead of a file per track.")
+	parser.add_argument('--combine-size',
+		action='store',
+		required=False,
+		type=int,
+		default=DEFAULT_COMBINE_SIZE,
+		metavar="MB",
+		help="With --combine, tracks go to a new GPX file ("+COMBINED_FILE_NAME+" 2.gpx, ...) rather than take a file over this many megabytes of tracks.  0 for no limit.  Default: "+str(DEFAULT_COMBINE_SIZE))
+	parser.add_argument('--profile',
+		action='store_true',
+		required=False,
+		help="Time each stage of the conversion, each layer and each track.  A summary is printed and a JSON report, "+PROFILE_FILE_NAME+", is written to GPX_path.")
+	parser.add_argument('--profile-tracks',
+		action='store',
+		required=False,
+		type=int,
+		default=DEFAULT_PROFILE_TRACKS,
+		metavar="N",
+		help="Number of slowest tracks listed by --profile.  Default: "+str(DEFAULT_PROFILE_TRACKS))
+	parser.add_argument('--watch',
+		action='store',
+		required=False,
+		type=int,
+		metavar="SECONDS",
+		help="Keep running and poll the map, or the maps of the batch file, every SECONDS seconds.  A map is only converted when its KML data changed since the last conversion.  Stop with Ctrl+C.")
+	parser.add_argument('--serve',
+		action='store',
+		required=False,
+		type=int,
+		metavar="PORT",
+		help="Run a local HTTP service on PORT instead of converting a map.  GET "+SERVE_PATH_PREFIX+"<map id>.zip returns a zip of all the GPX files, "+SERVE_PATH_PREFIX+"<map id>.gpx the whole map in one GPX file and "+SERVE_PATH_PREFIX+"<map id>/<GPX file> one GPX file, e.g. WayPts.gpx.  Conversion options go in the options query parameter, e.g. ?options=-l -w 5, only -t, -w, -a, -e, -l, -s, -i, --simplify, --stats, --bbox, --near, --clip and --max-points are allowed.  Stop with Ctrl+C.")
+	parser.add_argument('--serve-host',
+		action='store',
+		required=False,
+		default=DEFAULT_SERVE_HOST,
+		metavar="HOST",
+		help="Address the --serve service listens on.  Default: "+DEFAULT_SERVE_HOST)
+	parser.add_argument('--serve-cache',
+		action='store',
+		required=False,
+		type=int,
+		default=DEFAULT_SERVE_CACHE,
+		metavar="MB",
+		help="Megabytes of converted maps the --serve service keeps in memory, least recently used maps are dropped first.  Default: "+str(DEFAULT_SERVE_CACHE))
+	parser.add_argument('--kml-url',
+		action='store',
+		required=False,
+		default=GET_URL_PREFIX,
+		metavar="URL",
+		help="URL the map id is appended to to download the KML data.  Default: "+GET_URL_PREFIX.replace("%","%%"))
 
-	return(parser.parse_args())
+	if defaults is not None:
+		parser.set_defaults(**defaults)
+	args = parser.parse_args(argv)
+	if args.fetch_jobs < 1:
+		parser.error("argument --fetch-jobs: must be 1 or more")
+	if args.timeout <= 0:
+		parser.error("argument --timeout: must be greater than 0")
+	if args.combine_size < 0:
+		parser.error("argument --combine-size: must be 0 or more")
+	if args.combine and args.incremental:
+		parser.error("argument --combine: not allowed with argument -u/--incremental")
+	if args.profile_tracks < 0:
+		parser.error("argument --profile-tracks: must be 0 or more")
+	if args.simplify is not None and args.simplify <= 0:
+		parser.error("argument --simplify: must be greater than 0")
+	if args.split == SPLIT_TYPE_DISTANCE:
+		try:
+			if float(args.interval) <= 0:
+				raise ValueError
+		except ValueError:
+			parser.error("argument -i/--interval: must be a number of miles greater than 0")
+	if args.split_files and args.split != SPLIT_TYPE_DISTANCE:
+		parser.error("argument --split-files: needs argument -s/--split distance")
+	if args.max_points is not None and args.max_points < 2:
+		parser.error("argument --max-points: must be 2 or more")
+	if (args.split_files or args.max_points is not None) and args.incremental:
+		parser.error("argument --split-files/--max-points: not allowed with argument -u/--incremental")
+	if args.bbox is not None and args.near is not None:
+		parser.error("argument --bbox: not allowed with argument --near")
+	if args.bbox is not None:
+		minLatitude,minLongitude,maxLatitude,maxLongitude = args.bbox
+		if not (-90 <= minLatitude < maxLatitude <= 90 and -180 <= minLongitude < maxLongitude <= 180):
+			parser.error("argument --bbox: latitudes must be -90 to 90 and longitudes -180 to 180, minimum first")
+	if args.near is not None:
+		latitude,longitude,miles = args.near
+		if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+			parser.error("argument --near: latitude must be -90 to 90 and longitude -180 to 180")
+		if miles <= 0:
+			parser.error("argument --near: miles must be greater than 0")
+	if args.clip and args.bbox is None and args.near is None:
+		parser.error("argument --clip: needs argument --bbox or --near")
+	if args.watch is not None:
+		if args.watch < 1:
+			parser.error("argument --watch: must be 1 or more")
+		if args.kml_file is not None or args.offline or args.no_cache:
+			parser.error("argument --watch: not allowed with --kml-file, --offline or --no-cache")
+		if args.archive == "-":
+			parser.error("argument --watch: not allowed with --archive -")
+	if args.serve is not None:
+		if args.map_id is not None or args.batch is not None or args.kml_file is not None or args.watch is not None or args.archive is not None:
+			parser.error("argument --serve: not allowed with map_id, GPX_path, -b, -k, --watch or --archive")
+		if args.serve_cache < 0:
+			parser.error("argument --serve-cache: must be 0 or more")
+		return(args)
+	if args.batch is not None:
+		if args.map_id is not None or args.kml_file is not None:
+			parser.error("argument -b/--batch: not allowed with map_id, GPX_path or --kml-file")
+		if args.archive is not None:
+			parser.error("argument -b/--batch: not allowed with --archive, put --archive on the batch file lines")
+		return(args)
+	if args.kml_file is not None and args.GPX_path is None:
+		# Only one positional was given, with a local KML file it is the GPX path
+		args.GPX_path = args.map_id
+		args.map_id = "stdin" if args.kml_file == "-" else Path(args.kml_file).stem
+	if args.archive is not None:
+		if args.GPX_path is None:
+			args.GPX_path = ""	# GPX files go at the top of the archive
+		if os.path.isabs(args.GPX_path) or ".." in Path(args.GPX_path).parts:
+			parser.error("argument --archive: GPX_path must be a relative folder inside the archive")
+		if args.incremental:
+			parser.error("argument --archive: not allowed with argument -u/--incremental")
+		if args.archive_format is None:
+			if args.archive == "-":
+				args.archive_format = "zip"
+			else:
+				for archiveFormat,endings in ARCHIVE_FORMATS.items():
+					if args.archive.lower().endswith(endings):
+						args.archive_format = archiveFormat
+				if args.archive_format is None:
+					parser.error("argument --archive: unknown archive type, use a .zip, .tar, .tar.gz or .tgz file name or --archive-format")
+	if args.map_id is None or args.GPX_path is None:
+		parser.error("the following arguments are required: map_id, GPX_path")
+	if args.jobs < 1:
+		parser.error("argument -j/--jobs: must be 1 or more")
+	if args.offline and args.no_cache:
+		parser.error("argument --offline: not allowed with argument --no-cache")
+	return(args)
 #========================================================================================
 # iconDictionary describes the mapping between a KML icon number and an OSMAnd icon name.
 # It also contains a default OSMAnd color and shape to use for each OSMAnd icon type.
@@ -155,601 +675,1691 @@ def setupParseCmdLine():
 #
 # There is a nice GMap->OSMAnd icon translation proposal here: https://github.com/mariush444/gmapIcons2osmand/blob/main/icons-gmap-osmand.pdf
 #
-# ???: would be nice to have a command line option to read in a user supplied dictionary from a file
+# A user supplied translation file can be given with the -c option, see loadIconFile.
 #========================================================================================
-def KMLToOSMAndIcon(KMLIconID):
-
-	iconDictionary ={
-		"unknown":[ICON_NOT_FOUND_ICON, ICON_NOT_FOUND_COLOR, ICON_NOT_FOUND_SHAPE],	#unknown KML icon code - this entry will be used if the KML icon is not found the iconDictionary.
+iconDictionary ={
+	"unknown":[ICON_NOT_FOUND_ICON, ICON_NOT_FOUND_COLOR, ICON_NOT_FOUND_SHAPE],	#unknown KML icon code - this entry will be used if the KML icon is not found the iconDictionary.
 # These are some of the original gmap icons - bigger, bolder colors, without surrounding circle
-		"503": ["special_marker",						KMLCOLOR,"circle"],			#OldGMap: school map point
-		"979": ["special_sail_boat",					"a71de1","circle"],			#OldGMap: Passenger ferry - purple
-		"993": ["special_photo_camera",					KMLCOLOR,"circle"],			#OldGMap: POI #1, camera "eecc22"
-		"1023":["shop_supermarket",						KMLCOLOR,"circle"],			#OldGMap: grocery store, supermarket #2
-		"1085":["restaurants",							KMLCOLOR,"circle"],			#OldGMap: retaurant, diner, dining
-		"1095":["shop_department_store",				"10c0f0","circle"],			#OldGMap: Store/shopping - blue
-		"1203":["tourism_information",					"1010a0","circle"],			#OldGMap: tourism information
-		"1289":["Museum",								"10c0f0","circle"],			#OldGMap: Museum - light blue
-		"1369":["special_trekking",						KMLCOLOR,"circle"],			#OldGMap: hiking trailhead 
-		"1371":["special_trekking",						KMLCOLOR,"circle"],			#OldGMap: hiking trailhead 
-		"1395":["sport_swimming",						"eecc22","circle"],			#OldGMap: Lake/swimmer - yellow
+	"503": ["special_marker",						KMLCOLOR,"circle"],			#OldGMap: school map point
+	"979": ["special_sail_boat",					"a71de1","circle"],			#OldGMap: Passenger ferry - purple
+	"993": ["special_photo_camera",					KMLCOLOR,"circle"],			#OldGMap: POI #1, camera "eecc22"
+	"1023":["shop_supermarket",						KMLCOLOR,"circle"],			#OldGMap: grocery store, supermarket #2
+	"1085":["restaurants",							KMLCOLOR,"circle"],			#OldGMap: retaurant, diner, dining
+	"1095":["shop_department_store",				"10c0f0","circle"],			#OldGMap: Store/shopping - blue
+	"1203":["tourism_information",					"1010a0","circle"],			#OldGMap: tourism information
+	"1289":["Museum",								"10c0f0","circle"],			#OldGMap: Museum - light blue
+	"1369":["special_trekking",						KMLCOLOR,"circle"],			#OldGMap: hiking trailhead 
+	"1371":["special_trekking",						KMLCOLOR,"circle"],			#OldGMap: hiking trailhead 
+	"1395":["sport_swimming",						"eecc22","circle"],			#OldGMap: Lake/swimmer - yellow
 # These are the new gmap style icons
 # This list and most of the suggested translations come from this document
 #    https://github.com/mariush444/gmapIcons2osmand/blob/main/icons-gmap-osmand.pdf
-		"1498":["product_brick",						KMLCOLOR,"circle"],			# gmap:shape_default	little square	OSMAnd Alts: military,natural_peak, product_brick
-		"1499":["skimap_white_black_round_shield",		KMLCOLOR,"circle"],			# gmap:shape_circle
-		"1500":["glaziery",								KMLCOLOR,"circle"],			# gmap:shape_square						OSMAnd Alts: chess, glaziery
-		"1501":["flooring",								KMLCOLOR,"circle"],			# gmap:shape_diamond					OSMAnd Alts: building_type_pyramid, flooring, natural_peak
-		"1502":["special_star",							KMLCOLOR,"circle"],			# gmap:shape_star						OSMAnd Alts:  shape_star, special_star, special_star_stroked (hollow), tourism_attraction,tourism_yes
-		"1503":["erotic",								KMLCOLOR,"circle"],			# gmap:adult-xxx
-		"1504":["air_transport",						KMLCOLOR,"circle"],			# gmap:airport-plane
-		"1505":["emergency",							KMLCOLOR,"circle"],			# gmap:ambulance
-		"1506":["shop_pet",								KMLCOLOR,"circle"],			# gmap:animal-head
-		"1507":["shop_pet",								KMLCOLOR,"circle"],			# gmap:animal-paw
-		"1508":["animal_shelter",						KMLCOLOR,"circle"],			# gmap:animal-shelter
-		"1509":["amenity_arts_centre",					KMLCOLOR,"circle"],			# gmap:art-palette
-		"1510":["amenity_atm",							KMLCOLOR,"circle"],			# gmap:atm
-		"1511":["attraction_carousel",					KMLCOLOR,"circle"],			# gmap:balloons
-		"1512":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-dollar
-		"1513":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-euro
-		"1514":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-pound
-		"1515":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-yen
-		"1516":["shop_hairdresser",						KMLCOLOR,"circle"],			# gmap:barber-scissors
-		"1517":["amenity_bar",							KMLCOLOR,"circle"],			# gmap:bar-cocktail
-		"1518":["amenity_pub",							KMLCOLOR,"circle"],			# gmap:bar-pub
-		"1519":["sport_baseball",						KMLCOLOR,"circle"],			# gmap:baseball
-		"1520":["sport_basketball",						KMLCOLOR,"circle"],			# gmap:basketball
-		"1521":["leisure_beach_resort",					KMLCOLOR,"circle"],			# gmap:beach						OSMAnd Alts: beach, leisure_beach_resort
-		"1522":["special_bicycle",						KMLCOLOR,"circle"],			# gmap:bicycle
-		"1523":["supervised_yes",						KMLCOLOR,"circle"],			# gmap:binoculars
-		"1524":["hazard",								KMLCOLOR,"circle"],			# gmap:biohazard
-		"1525":["leisure_slipway",						KMLCOLOR,"circle"],			# gmap:boat-launch
-		"1526":["shop_books",							KMLCOLOR,"circle"],			# gmap:book
-		"1527":["sport_9pin",							KMLCOLOR,"circle"],			# gmap:bowling
-		"1528":["bridge_structure_arch",				KMLCOLOR,"circle"],			# gmap:bridge
-		"1529":["communication_tower",					KMLCOLOR,"circle"],			# gmap:broadcast
-		"1530":["restaurants",							KMLCOLOR,"circle"],			# gmap:burger
-		"1531":["bag",									KMLCOLOR,"circle"],			# gmap:business-briefcase
-		"1532":["highway_bus_stop",						KMLCOLOR,"circle"],			# gmap:bus
-		"1533":["funicular",							KMLCOLOR,"circle"],			# gmap:cablecar-funicular
-		"1534":["amenity_cafe",							KMLCOLOR,"circle"],			# gmap:cafe-cup
-		"1535":["camera",								KMLCOLOR,"circle"],			# gmap:camera-photo
-		"1536":["sport_canoe",							KMLCOLOR,"circle"],			# gmap:canoe
-		"1537":["cargo_vehicle",						KMLCOLOR,"circle"],			# gmap:car-ferry
-		"1538":["shop_car",								KMLCOLOR,"circle"],			# gmap:car
-		"1539":["shop_car_repair",						KMLCOLOR,"circle"],			# gmap:car-repair
-		"1540":["amenity_casino",						KMLCOLOR,"circle"],			# gmap:casino-dice
-		"1541":["hazard",								KMLCOLOR,"circle"],			# gmap:caution
-		"1542":["cemetery",								KMLCOLOR,"circle"],			# gmap:cemetery
-		"1543":["drinking_water_yes",					KMLCOLOR,"circle"],			# gmap:chance-rain
-		"1544":["chemist",								KMLCOLOR,"circle"],			# gmap:chemical-beaker
-		"1545":["dovecote",								KMLCOLOR,"circle"],			# gmap:chicken
-		"1546":["place_city",							KMLCOLOR,"circle"],			# gmap:city-buildings
-		"1547":["suburb",								KMLCOLOR,"circle"],			# gmap:city-buildings-pointed
-		"1548":["building",								KMLCOLOR,"circle"],			# gmap:civic
-		"1549":["shop_clothes",							KMLCOLOR,"circle"],			# gmap:clothing-hanger
-		"1550":["cuisine",								KMLCOLOR,"circle"],			# gmap:cloudy
-		"1551":["service",								KMLCOLOR,"circle"],			# gmap:construction-hammer
-		"1552":["amenity_courthouse",					KMLCOLOR,"circle"],			# gmap:courthouse-gavel
-		"1553":["shop_pet",								KMLCOLOR,"circle"],			# gmap:cow
-		"1554":["sport_cricket",						KMLCOLOR,"circle"],			# gmap:cricket
-		"1555":["payment_centre",						KMLCOLOR,"circle"],			# gmap:currency-exchange
-		"1556":["hazard",								KMLCOLOR,"circle"],			# gmap:death-skull
-		"1557":["amenity_dentist",						KMLCOLOR,"circle"],			# gmap:dentist-tooth
-		"1558":["amenity_doctors",						KMLCOLOR,"circle"],			# gmap:doctor-bag
-		"1559":["tourism_hostel",						KMLCOLOR,"circle"],			# gmap:dormitory-bunk-bed
-		"1560":["hazard",								KMLCOLOR,"circle"],			# gmap:earthquake
-		"1561":["electrical",							KMLCOLOR,"circle"],			# gmap:electrical-plug
-		"1562":["shop_car",								KMLCOLOR,"circle"],			# gmap:enclosed-traffic
-		"1563":["military_range",						KMLCOLOR,"circle"],			# gmap:epicenter					OSMAnd Alts: craft_sawmill, motorcycle_parts_yes,military_range
-		"1564":["crater",								KMLCOLOR,"circle"],			# gmap:explosion					OSMAnd Alts: amenity_fire_station, crater
-		"1565":["industrial",							KMLCOLOR,"circle"],			# gmap:factory
-		"1566":["place_farm",							KMLCOLOR,"circle"],			# gmap:farm-barn
-		"1567":["amenity_fast_food",					KMLCOLOR,"circle"],			# gmap:fast-food
-		"1568":["attraction_big_wheel",					KMLCOLOR,"circle"],			# gmap:ferris-wheel
-		"1569":["amenity_ferry_terminal",				KMLCOLOR,"circle"],			# gmap:ferry
-		"1570":["finance",								KMLCOLOR,"circle"],			# gmap:finance
-		"1571":["amenity_fire_station",					KMLCOLOR,"circle"],			# gmap:fire
-		"1572":["shop_seafood",							KMLCOLOR,"circle"],			# gmap:fish-fins
-		"1573":["shop_seafood",							KMLCOLOR,"circle"],			# gmap:fish
-		"1574":["special_flag_start",					KMLCOLOR,"circle"],			# gmap:flag							OSMAnd Alts: locality,special_flag_finish,special_flag (triangle), special_flag_start (square), special_flag_stroke (hollow triangle), windsock (striped triangle)
-		"1575":["hazard_flood",							KMLCOLOR,"circle"],			# gmap:flood
-		"1576":["amenity_pharmacy",						KMLCOLOR,"circle"],			# gmap:fog
-		"1577":["restaurants",							KMLCOLOR,"circle"],			# gmap:food-fork-knife
-		"1578":["food_shop",							KMLCOLOR,"circle"],			# gmap:food-groceries
-		"1579":["american_football",					KMLCOLOR,"circle"],			# gmap:football
-		"1580":["amenity_fountain",						KMLCOLOR,"circle"],			# gmap:fountain
-		"1581":["amenity_fuel",							KMLCOLOR,"circle"],			# gmap:fuel-gasoline
-		"1582":["garden",								KMLCOLOR,"circle"],			# gmap:garden-flower
-		"1583":["barrier_lift_gate",					KMLCOLOR,"circle"],			# gmap:gated-community
-		"1584":["shop_gift",							KMLCOLOR,"circle"],			# gmap:gift
-		"1585":["sport_golf",							KMLCOLOR,"circle"],			# gmap:golf
-		"1586":["aerialway_gondola",					KMLCOLOR,"circle"],			# gmap:gondola
-		"1587":["agrarian",								KMLCOLOR,"circle"],			# gmap:grain
-		"1588":["weapons",								KMLCOLOR,"circle"],			# gmap:gun
-		"1589":["fitness_centre",						KMLCOLOR,"circle"],			# gmap:gym
-		"1590":["service",								KMLCOLOR,"circle"],			# gmap:hardware-wrench
-		"1591":["ranger_station",						KMLCOLOR,"circle"],			# gmap:headquarters
-		"1592":["special_heart",						KMLCOLOR,"circle"],			# gmap:heart
-		"1593":["special_helicopter",					KMLCOLOR,"circle"],			# gmap:helicopter
-		"1594":["special_symbol_question_mark",			KMLCOLOR,"circle"],			# gmap:help
-		"1595":["special_trekking",						KMLCOLOR,"circle"],			# gmap:hiking-duo
-		"1596":["special_trekking",						KMLCOLOR,"circle"],			# gmap:hiking-solo
-		"1597":["special_trekking",						KMLCOLOR,"circle"],			# gmap:hiking-trailhead
-		"1598":["historic_castle",						KMLCOLOR,"circle"],			# gmap:historic-building
-		"1599":["monument",								KMLCOLOR,"circle"],			# gmap:historic-monument
-		"1600":["memorial_plaque",						KMLCOLOR,"circle"],			# gmap:historic-plaque
-		"1601":["special_horse",						KMLCOLOR,"circle"],			# gmap:horse
-		"1602":["tourism_hotel",						KMLCOLOR,"circle"],			# gmap:hotel-bed
-		"1603":["special_house",						KMLCOLOR,"circle"],			# gmap:house
-		"1604":["construction",							KMLCOLOR,"circle"],			# gmap:housing-development
-		"1605":["hazard",								KMLCOLOR,"circle"],			# gmap:hurricane-strong
-		"1606":["hazard",								KMLCOLOR,"circle"],			# gmap:hurricane-weak
-		"1607":["ice_cream",							KMLCOLOR,"circle"],			# gmap:ice-cream
-		"1608":["special_information",					KMLCOLOR,"circle"],			# gmap:info
-		"1609":["special_symbol_at_sign",				KMLCOLOR,"circle"],			# gmap:internet
-		"1610":["cemetery",								KMLCOLOR,"circle"],			# gmap:japanese-cemetery
-		"1611":["special_marker",						KMLCOLOR,"circle"],			# gmap:japanese-poi
-		"1612":["amenity_post_box",						KMLCOLOR,"circle"],			# gmap:japanese-post-office
-		"1613":["shop_jewelry",							KMLCOLOR,"circle"],			# gmap:jewelry
-		"1614":["special_microphone",					KMLCOLOR,"circle"],			# gmap:karaoke
-		"1615":["special_kayak",						KMLCOLOR,"circle"],			# gmap:kayak
-		"1616":["hazard_erosion",						KMLCOLOR,"circle"],			# gmap:landslide
-		"1617":["shop_laundry",							KMLCOLOR,"circle"],			# gmap:laundry-iron
-		"1618":["man_made_lighthouse",					KMLCOLOR,"circle"],			# gmap:lighthouse
-		"1619":["power",								KMLCOLOR,"circle"],			# gmap:lightning???
-		"1620":["shop_pet",								KMLCOLOR,"circle"],			# gmap:lizard-gecko
-		"1621":["observation_tower",					KMLCOLOR,"circle"],			# gmap:lookout-tower
-		"1622":["special_sail_boat",					KMLCOLOR,"circle"],			# gmap:marina-yacht
-		"1623":["leisure_marina",						KMLCOLOR,"circle"],			# gmap:marine-anchor
-		"1624":["amenity_doctors",						KMLCOLOR,"circle"],			# gmap:medical 				OSMAnd Alts: healthcare
-		"1625":["siren",								KMLCOLOR,"circle"],			# gmap:megaphone
-		"1626":["subway_caracas",						KMLCOLOR,"circle"],			# gmap:metro 				OSMAnd Alts: special_subway
-		"1627":["man_made_mineshaft",					KMLCOLOR,"circle"],			# gmap:mine
-		"1628":["special_symbol_question_mark",			KMLCOLOR,"circle"],			# gmap:missing-person
-		"1629":["route_monorail_ref",					KMLCOLOR,"circle"],			# gmap:monorail
-		"1630":["shop_pet",								KMLCOLOR,"circle"],			# gmap:monster-friend
-		"1631":["backrest_yes",							KMLCOLOR,"circle"],			# gmap:moon
-		"1632":["special_motor_scooter",				KMLCOLOR,"circle"],			# gmap:moped
-		"1633":["shop_motorcycle",						KMLCOLOR,"circle"],			# gmap:motorcycle
-		"1634":["natural",								KMLCOLOR,"circle"],			# gmap:mountain
-		"1635":["amenity_cinema",						KMLCOLOR,"circle"],			# gmap:movies-cinema
-		"1636":["tourism_museum",						KMLCOLOR,"circle"],			# gmap:museum
-		"1637":["special_audio",						KMLCOLOR,"circle"],			# gmap:music-note			OSMAnd Alts: music, special_audio
-		"1638":["newspaper",							KMLCOLOR,"circle"],			# gmap:newspaper
-		"1639":["ngo",									KMLCOLOR,"circle"],			# gmap:ngo
-		"1640":["restaurants",							KMLCOLOR,"circle"],			# gmap:noodles
-		"1641":["generator_source_nuclear",				KMLCOLOR,"circle"],			# gmap:nuclear-atomic
-		"1642":["hazard_nuclear",						KMLCOLOR,"circle"],			# gmap:nuclear-radioactive
-		"1643":["shop_optician",						KMLCOLOR,"circle"],			# gmap:optometrist-eye
-		"1644":["parking",								KMLCOLOR,"circle"],			# gmap:parking
-		"1645":["cuisine",								KMLCOLOR,"circle"],			# gmap:partly-cloudy
-		"1646":["amenity_pharmacy",						KMLCOLOR,"circle"],			# gmap:pharmacy
-		"1647":["shop_mobile_phone",					KMLCOLOR,"circle"],			# gmap:phone-mobile
-		"1649":["barrier_cycle_barrier",				KMLCOLOR,"circle"],			# gmap:piano-music-hall
-		"1650":["tourism_picnic_site",					KMLCOLOR,"circle"],			# gmap:picnic-table
-		"1651":["restaurants",							KMLCOLOR,"circle"],			# gmap:pizza-slice
-		"1652":["leisure_playground",					KMLCOLOR,"circle"],			# gmap:playground-swing
-		"1653":["hazard",								KMLCOLOR,"circle"],			# gmap:poison-gas-mask
-		"1654":["geocache",								KMLCOLOR,"circle"],			# gmap:poi-you-are-here
-		"1655":["amenity_police",						KMLCOLOR,"circle"],			# gmap:police-badge
-		"1656":["amenity_police",						KMLCOLOR,"circle"],			# gmap:police-car
-		"1657":["amenity_police",						KMLCOLOR,"circle"],			# gmap:police-officer
-		"1658":["hazard",								KMLCOLOR,"circle"],			# gmap:pollution-spill
-		"1659":["amenity_post_box",						KMLCOLOR,"circle"],			# gmap:post-office-envelope
-		"1660":["power",								KMLCOLOR,"circle"],			# gmap:power-lightning
-		"1661":["special_flag_finish",					KMLCOLOR,"circle"],			# gmap:racetrack-flag
-		"1662":["railway_station",						KMLCOLOR,"circle"],			# gmap:railway-track
-		"1663":["drinking_water_yes",					KMLCOLOR,"circle"],			# gmap:rain
-		"1664":["amenity_library",						KMLCOLOR,"circle"],			# gmap:reading-library
-		"1665":["beach",								KMLCOLOR,"circle"],			# gmap:real-estate
-		"1666":["place_of_worship",						KMLCOLOR,"circle"],			# gmap:religious-bahai
-		"1667":["religion_buddhist",					KMLCOLOR,"circle"],			# gmap:religious-buddhist-hindu
-		"1668":["religion_buddhist",					KMLCOLOR,"circle"],			# gmap:religious-buddhist-wheel
-		"1669":["place_of_worship",						KMLCOLOR,"circle"],			# gmap:religious-buddhist-zen
-		"1670":["religion_christian",					KMLCOLOR,"circle"],			# gmap:religious-christian
-		"1671":["building_type_chapel",					KMLCOLOR,"circle"],			# gmap:religious-generic
-		"1672":["religion_hindu",						KMLCOLOR,"circle"],			# gmap:religious-hindu
-		"1673":["religion_muslim",						KMLCOLOR,"circle"],			# gmap:religious-islamic
-		"1674":["place_of_worship",						KMLCOLOR,"circle"],			# gmap:religious-jain
-		"1675":["religion_jewish",						KMLCOLOR,"circle"],			# gmap:religious-jewish
-		"1676":["place_of_worship",						KMLCOLOR,"circle"],			# gmap:religious-kneeling
-		"1677":["religion_shinto",						KMLCOLOR,"circle"],			# gmap:religious-shinto
-		"1678":["religion_sikh",						KMLCOLOR,"circle"],			# gmap:religious-sikh
-		"1679":["shop_pet",								KMLCOLOR,"circle"],			# gmap:rodent-rat
-		"1680":["special_walking",						KMLCOLOR,"circle"],			# gmap:running-pedestrian
-		"1681":["sport_sailing",						KMLCOLOR,"circle"],			# gmap:sailing-boat
-		"1682":["amenity_school",						KMLCOLOR,"circle"],			# gmap:school-crossing
-		"1683":["shop_shoes",							KMLCOLOR,"circle"],			# gmap:shoe
-		"1684":["shop",									KMLCOLOR,"circle"],			# gmap:shopping-bag
-		"1685":["shop_supermarket",						KMLCOLOR,"circle"],			# gmap:shopping-cart
-		"1686":["food_shop",							KMLCOLOR,"circle"],			# gmap:shop
-		"1687":["shower",								KMLCOLOR,"circle"],			# gmap:shower-bath
-		"1688":["sport_skiing",							KMLCOLOR,"circle"],			# gmap:ski-downhill
-		"1689":["aerialway_chair_lift",					KMLCOLOR,"circle"],			# gmap:ski-lift
-		"1690":["special_ski_touring",					KMLCOLOR,"circle"],			# gmap:ski-xc
-		"1691":["piste_sled",							KMLCOLOR,"circle"],			# gmap:sled
-		"1692":["seasonal_winter",						KMLCOLOR,"circle"],			# gmap:sleet
-		"1693":["man_made_chimney",						KMLCOLOR,"circle"],			# gmap:smokestack
-		"1694":["seasonal_winter",						KMLCOLOR,"circle"],			# gmap:snowflake
-		"1695":["seasonal_winter",						KMLCOLOR,"circle"],			# gmap:snow
-		"1696":["sport_soccer",							KMLCOLOR,"circle"],			# gmap:soccer
-		"1697":["tanning_salon",						KMLCOLOR,"circle"],			# gmap:spa
-		"1698":["sport_stadium",						KMLCOLOR,"circle"],			# gmap:stadium-arena
-		"1699":["bag",									KMLCOLOR,"circle"],			# gmap:suitcase-travel
-		"1700":["seasonal_summer",						KMLCOLOR,"circle"],			# gmap:sunny
-		"1701":["sport_swimming",						KMLCOLOR,"circle"],			# gmap:swimming
-		"1702":["water_tap",							KMLCOLOR,"circle"],			# gmap:tap-dry
-		"1703":["water_tap",							KMLCOLOR,"circle"],			# gmap:tap-flowing
-		"1704":["special_taxi",							KMLCOLOR,"circle"],			# gmap:taxi
-		"1705":["tea",									KMLCOLOR,"circle"],			# gmap:teapot
-		"1706":["historic_castle",						KMLCOLOR,"circle"],			# gmap:temple
-		"1707":["sport_tennis",							KMLCOLOR,"circle"],			# gmap:tennis
-		"1708":["amenity_theatre",						KMLCOLOR,"circle"],			# gmap:theater-lecture
-		"1709":["amenity_theatre",						KMLCOLOR,"circle"],			# gmap:theater
-		"1710":["temperature",							KMLCOLOR,"circle"],			# gmap:thermometer				OSMAnd Alts: height,skimap_arrow_2triangles_black_big,special_arrow_up_and_down,thermometer
-		"1711":["power",								KMLCOLOR,"circle"],			# gmap:thunder
-		"1712":["shop_ticket",							KMLCOLOR,"circle"],			# gmap:ticket
-		"1713":["shop_ticket",							KMLCOLOR,"circle"],			# gmap:ticket-star
-		"1714":["hazard",								KMLCOLOR,"circle"],			# gmap:tornado
-		"1715":["special_poi_eiffel_tower",				KMLCOLOR,"circle"],			# gmap:tower
-		"1716":["railway_station",						KMLCOLOR,"circle"],			# gmap:train
-		"1717":["locomotive",							KMLCOLOR,"circle"],			# gmap:train-steam
-		"1718":["railway_tram_stop",					KMLCOLOR,"circle"],			# gmap:tram-overhead
-		"1719":["railway_tram_stop",					KMLCOLOR,"circle"],			# gmap:tram
-		"1720":["forest",								KMLCOLOR,"circle"],			# gmap:tree
-		"1721":["forest",								KMLCOLOR,"circle"],			# gmap:tree-windy
-		"1722":["special_truck",						KMLCOLOR,"circle"],			# gmap:truck
-		"1723":["water",								KMLCOLOR,"circle"],			# gmap:tsunami					OSMAnd Alts: grass, water, hazard
-		"1724":["tunnel",								KMLCOLOR,"circle"],			# gmap:tunnel
-		"1725":["electronics",							KMLCOLOR,"circle"],			# gmap:tv
-		"1726":["amenity_university",					KMLCOLOR,"circle"],			# gmap:university
-		"1727":["special_video_camera",					KMLCOLOR,"circle"],			# gmap:video
-		"1728":["for_tourists",							KMLCOLOR,"circle"],			# gmap:vista-half
-		"1729":["tourism_viewpoint",					KMLCOLOR,"circle"],			# gmap:vista					OSMAnd Alts: for_tourists, motorcycle_parts_yes, shop_florist, tourism_viewpoint
-		"1730":["volcano",								KMLCOLOR,"circle"],			# gmap:volcano
-		"1731":["special_walking",						KMLCOLOR,"circle"],			# gmap:walking-pedestrian
-		"1732":["male_yes",								KMLCOLOR,"circle"],			# gmap:wc-men
-		"1733":["amenity_toilets",						KMLCOLOR,"circle"],			# gmap:wc-unisex
-		"1734":["female_yes",							KMLCOLOR,"circle"],			# gmap:wc-women
-		"1735":["wheelchair_designated",				KMLCOLOR,"circle"],			# gmap:wheelchair-handicapped
-		"1736":["windsock",								KMLCOLOR,"circle"],			# gmap:wind
-		"1737":["training_yoga",						KMLCOLOR,"circle"],			# gmap:yoga
-		"1739":["military",								KMLCOLOR,"circle"],			# gmap:blank-measle 			OSMAnd Alts: military,barrier_bus_trap, fire_hydrant_type_underground, 
-		"1740":["amenity_school",						KMLCOLOR,"circle"],			# gmap:academy
-		"1741":["amenity_car_rental",					KMLCOLOR,"circle"],			# gmap:car-rental
-		"1742":["baby_hatch",							KMLCOLOR,"circle"],			# gmap:baby-nursery
-		"1743":["tourism_zoo",							KMLCOLOR,"circle"],			# gmap:zoo-elephant
-		"1745":["1787",									KMLCOLOR,"circle"],			# gmap:charging_station_filter
-		"1746":["1787",									KMLCOLOR,"circle"],			# gmap:charging_station
-		"1747":["billiards",							KMLCOLOR,"circle"],			# gmap:8ball
-		"1748":["hazard",								KMLCOLOR,"circle"],			# gmap:accident
-		"1749":["defibrillator",						KMLCOLOR,"circle"],			# gmap:aed
-		"1750":["air_transport",						KMLCOLOR,"circle"],			# gmap:airstrip
-		"1751":["telescope",							KMLCOLOR,"circle"],			# gmap:alien
-		"1752":["sport_archery",						KMLCOLOR,"circle"],			# gmap:archery
-		"1753":["amenity_atm",							KMLCOLOR,"circle"],			# gmap:atm-intl
-		"1754":["special_utv",							KMLCOLOR,"circle"],			# gmap:atv
-		"1755":["badminton",							KMLCOLOR,"circle"],			# gmap:badminton
-		"1756":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-intl
-		"1757":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-jp
-		"1758":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-won
-		"1759":["shop_pet",								KMLCOLOR,"circle"],			# gmap:bear
-		"1760":["leisure_bird_hide",					KMLCOLOR,"circle"],			# gmap:birdwatching
-		"1761":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:boxing
-		"1762":["pastry",								KMLCOLOR,"circle"],			# gmap:cake-birthday
-		"1763":["special_camper",						KMLCOLOR,"circle"],			# gmap:camper
-		"1764":["firepit",								KMLCOLOR,"circle"],			# gmap:campfire
-		"1765":["tourism_camp_site",					KMLCOLOR,"circle"],			# gmap:camping_tent
-		"1766":["shop_pet",								KMLCOLOR,"circle"],			# gmap:cat
-		"1767":["natural_cave_entrance",				KMLCOLOR,"circle"],			# gmap:cave
-		"1768":["natural_cave_entrance",				KMLCOLOR,"circle"],			# gmap:caving
-		"1769":["special_symbol_check_mark",			KMLCOLOR,"circle"],			# gmap:checkmark
-		"1770":["craft_sawmill",						KMLCOLOR,"circle"],			# gmap:city-office-jp
-		"1771":["sport_climbing",						KMLCOLOR,"circle"],			# gmap:climbing-carabiner
-		"1772":["sport_climbing_adventure",				KMLCOLOR,"circle"],			# gmap:climbing-ropes
-		"1773":["dance_floor",							KMLCOLOR,"circle"],			# gmap:dancing
-		"1774":["conference_centre",					KMLCOLOR,"circle"],			# gmap:deer
-		"1776":["dovecote",								KMLCOLOR,"circle"],			# gmap:eagle
-		"1777":["sport_diving",							KMLCOLOR,"circle"],			# gmap:diving
-		"1778":["shop_pet",								KMLCOLOR,"circle"],			# gmap:dog
-		"1779":["shop_seafood",							KMLCOLOR,"circle"],			# gmap:dolphin
-		"1780":["dovecote",								KMLCOLOR,"circle"],			# gmap:duck
-		"1781":["sanitary_dump_station",				KMLCOLOR,"circle"],			# gmap:dump-station
-		"1782":["elevator",								KMLCOLOR,"circle"],			# gmap:elevator
-		"1783":["building_entrance",					KMLCOLOR,"circle"],			# gmap:entrance
-		"1784":["conveying_yes",						KMLCOLOR,"circle"],			# gmap:escalator-down
-		"1785":["conveying_yes",						KMLCOLOR,"circle"],			# gmap:escalator-up
-		"1786":["conveying_yes",						KMLCOLOR,"circle"],			# gmap:escalator
-		"1787":["charging_station",						KMLCOLOR,"circle"],			# gmap:ev-station
-		"1788":["historic_battlefield",					KMLCOLOR,"circle"],			# gmap:fencing
-		"1789":["dovecote",								KMLCOLOR,"circle"],			# gmap:finch
-		"1790":["fire_extinguisher",					KMLCOLOR,"circle"],			# gmap:fire-extinguisher
-		"1791":["amenity_fire_station",					KMLCOLOR,"circle"],			# gmap:fire-jp
-		"1792":["frozen_food",							KMLCOLOR,"circle"],			# gmap:food-storage
-		"1793":["shop_pet",								KMLCOLOR,"circle"],			# gmap:fox
-		"1794":["leisure_sports_centre",				KMLCOLOR,"circle"],			# gmap:frisbee
-		"1795":["attraction_animal",					KMLCOLOR,"circle"],			# gmap:gator
-		"1796":["dive",									KMLCOLOR,"circle"],			# gmap:ghost
-		"1797":["attraction_animal",					KMLCOLOR,"circle"],			# gmap:giraffe
-		"1798":["craft_winery",							KMLCOLOR,"circle"],			# gmap:glass 					OSMAnd Alts: amenity_bar, craft_winery, shop_alcohol
-		"1799":["golf_course",							KMLCOLOR,"circle"],			# gmap:golf-course
-		"1800":["barbecue",								KMLCOLOR,"circle"],			# gmap:grill
-		"1801":["club_music",							KMLCOLOR,"circle"],			# gmap:guitar
-		"1802":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:hatchet
-		"1803":["special_arrow_down_left",				KMLCOLOR,"circle"],			# gmap:here
-		"1804":["historic_manor",						KMLCOLOR,"circle"],			# gmap:historic-cn
-		"1805":["ice_hockey",							KMLCOLOR,"circle"],			# gmap:hockey
-		"1806":["clinic",								KMLCOLOR,"circle"],			# gmap:hospital-crescent
-		"1807":["clinic",								KMLCOLOR,"circle"],			# gmap:hospital-h
-		"1808":["clinic",								KMLCOLOR,"circle"],			# gmap:hospital-shield
-		"1809":["sauna",								KMLCOLOR,"circle"],			# gmap:hot-tub
-		"1810":["restaurants",							KMLCOLOR,"circle"],			# gmap:hotdog
-		"1811":["natural_hot_spring",					KMLCOLOR,"circle"],			# gmap:hotspring-onsen
-		"1812":["amenity_hunting_stand",				KMLCOLOR,"circle"],			# gmap:hunting
-		"1813":["reef",									KMLCOLOR,"circle"],			# gmap:jellyfish
-		"1814":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:jetski
-		"1815":["attraction_animal",					KMLCOLOR,"circle"],			# gmap:kangaroo
-		"1816":["kitchen",								KMLCOLOR,"circle"],			# gmap:kitchen
-		"1817":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:kitesurfing
-		"1818":["dovecote",								KMLCOLOR,"circle"],			# gmap:kiwi
-		"1819":["reef",									KMLCOLOR,"circle"],			# gmap:kraken
-		"1820":["shop_computer",						KMLCOLOR,"circle"],			# gmap:laptop
-		"1821":["shop_laundry",							KMLCOLOR,"circle"],			# gmap:laundry
-		"1822":["attraction_animal",					KMLCOLOR,"circle"],			# gmap:lion
-		"1823":["craft_locksmith",						KMLCOLOR,"circle"],			# gmap:locker
-		"1824":["special_symbol_question_mark",			KMLCOLOR,"circle"],			# gmap:lost-and-found
-		"1825":["judo",									KMLCOLOR,"circle"],			# gmap:martial-arts
-		"1826":["emergency_access_point",				KMLCOLOR,"circle"],			# gmap:meeting-point
-		"1827":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:message-in-a-bottle
-		"1828":["attraction_animal",					KMLCOLOR,"circle"],			# gmap:monkey
-		"1829":["customs",								KMLCOLOR,"circle"],			# gmap:moose
-		"1831":["dance_floor",							KMLCOLOR,"circle"],			# gmap:mosquito
-		"1832":["deadlock",								KMLCOLOR,"circle"],			# gmap:moustache
-		"1834":["tourism_museum",						KMLCOLOR,"circle"],			# gmap:museum-jp
-		"1835":["restaurants",							KMLCOLOR,"circle"],			# gmap:musubi-sushi
-		"1836":["smoking_no",							KMLCOLOR,"circle"],			# gmap:no-smoking
-		"1837":["piste_nordic",							KMLCOLOR,"circle"],			# gmap:nordic-walking
-		"1838":["sport_free_flying",					KMLCOLOR,"circle"],			# gmap:parachute
-		"1839":["dovecote",								KMLCOLOR,"circle"],			# gmap:parrot
-		"1840":["dovecote",								KMLCOLOR,"circle"],			# gmap:penguin
-		"1841":["amenity_pharmacy",						KMLCOLOR,"circle"],			# gmap:pharmacy-eu
-		"1842":["amenity_police",						KMLCOLOR,"circle"],			# gmap:police-jp
-		"1843":["equestrian",							KMLCOLOR,"circle"],			# gmap:polo
-		"1844":["shop_baby_goods",						KMLCOLOR,"circle"],			# gmap:pram-stroller
-		"1845":["shop_copyshop",						KMLCOLOR,"circle"],			# gmap:printer
-		"1846":["dovecote",								KMLCOLOR,"circle"],			# gmap:quotation
-		"1847":["hunting",								KMLCOLOR,"circle"],			# gmap:rabbit
-		"1848":["shop_pet",								KMLCOLOR,"circle"],			# gmap:raccoon
-		"1849":["sport_tennis",							KMLCOLOR,"circle"],			# gmap:racquetball
-		"1850":["recycling_centre",						KMLCOLOR,"circle"],			# gmap:recycling
-		"1851":["attraction_animal",					KMLCOLOR,"circle"],			# gmap:rhino
-		"1852":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:roach
-		"1853":["quarry",								KMLCOLOR,"circle"],			# gmap:road-work-construction
-		"1854":["educational_institution",				KMLCOLOR,"circle"],			# gmap:robot
-		"1856":["telescope",							KMLCOLOR,"circle"],			# gmap:rocket
-		"1857":["waste_basket",							KMLCOLOR,"circle"],			# gmap:rubbish-trash
-		"1858":["sport_rugby_union",					KMLCOLOR,"circle"],			# gmap:rugby
-		"1859":["special_campervan",					KMLCOLOR,"circle"],			# gmap:rv
-		"1860":["amenity_school",						KMLCOLOR,"circle"],			# gmap:school-cn
-		"1861":["sport_scuba_diving",					KMLCOLOR,"circle"],			# gmap:scuba
-		"1862":["email",								KMLCOLOR,"circle"],			# gmap:seal
-		"1863":["shop_seafood",							KMLCOLOR,"circle"],			# gmap:shark
-		"1864":["wreck",								KMLCOLOR,"circle"],			# gmap:shipwreck
-		"1865":["shower",								KMLCOLOR,"circle"],			# gmap:showers
-		"1866":["sport_skateboard",						KMLCOLOR,"circle"],			# gmap:skateboarding
-		"1867":["ice_skating",							KMLCOLOR,"circle"],			# gmap:skating-ice
-		"1868":["smoking_yes",							KMLCOLOR,"circle"],			# gmap:smoking
-		"1869":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:snake
-		"1870":["scuba_diving_shop",					KMLCOLOR,"circle"],			# gmap:snorkel
-		"1871":["entertainment",						KMLCOLOR,"circle"],			# gmap:snowboarding
-		"1872":["special_snowmobile",					KMLCOLOR,"circle"],			# gmap:snowmobile
-		"1873":["piste_hike",							KMLCOLOR,"circle"],			# gmap:snowshoeing
-		"1874":["dovecote",								KMLCOLOR,"circle"],			# gmap:songbird
-		"1875":["sport_tennis",							KMLCOLOR,"circle"],			# gmap:squash
-		"1876":["shop_pet",								KMLCOLOR,"circle"],			# gmap:squirrel
-		"1877":["highway_steps",						KMLCOLOR,"circle"],			# gmap:stairs
-		"1878":["telescope_type_optical",				KMLCOLOR,"circle"],			# gmap:stargazing-telescope
-		"1879":["amenity_biergarten",					KMLCOLOR,"circle"],			# gmap:stein-beer
-		"1880":["sport_surfing",						KMLCOLOR,"circle"],			# gmap:surfing
-		"1881":["sport_sailing",						KMLCOLOR,"circle"],			# gmap:tall-ship
-		"1882":["reef",									KMLCOLOR,"circle"],			# gmap:tidepool-starfish
-		"1883":["craft_agricultural_engines",			KMLCOLOR,"circle"],			# gmap:tractor
-		"1884":["highway_traffic_signals",				KMLCOLOR,"circle"],			# gmap:traffic-light
-		"1885":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:treasure-chest
-		"1886":["nature_reserve",						KMLCOLOR,"circle"],			# gmap:tree-deciduous
-		"1887":["female_no",							KMLCOLOR,"circle"],			# gmap:tree-palm
-		"1888":["reef",									KMLCOLOR,"circle"],			# gmap:turtle
-		"1889":["telescope",							KMLCOLOR,"circle"],			# gmap:ufo
-		"1890":["sport_volleyball",						KMLCOLOR,"circle"],			# gmap:volleyball
-		"1891":["backrest_yes",							KMLCOLOR,"circle"],			# gmap:waiting-room
-		"1892":["waterfall",							KMLCOLOR,"circle"],			# gmap:waterfall
-		"1893":["sports_hall",							KMLCOLOR,"circle"],			# gmap:weight-barbell
-		"1894":["shop_seafood",							KMLCOLOR,"circle"],			# gmap:whale					OSMAnd Alts: shop_seafood, leisure_fishing, reef
-		"1895":["internet_access_wlan",					KMLCOLOR,"circle"],			# gmap:wifi
-		"1896":["firepit",								KMLCOLOR,"circle"],			# gmap:windsurfing
-		"1897":["free_flying",							KMLCOLOR,"circle"],			# gmap:wingsuit
-		"1898":["special_symbol_remove",				KMLCOLOR,"circle"],			# gmap:x-cross					OSMAnd Alts: level_crossing, special_symbol_remove
-		"1899":["special_marker",						KMLCOLOR,"circle"],			# gmap:blank-shape_pin
-	}
-	
-	waypt = cWaypoint("unknown",KMLCOLOR,"circle")
-
-	if not KMLIconID in iconDictionary:
-		KMLIconID = "unknown"
-	waypt.icon = iconDictionary[KMLIconID][0]
-	if iconDictionary[KMLIconID][1] == KMLCOLOR:
-		#use the icon color from the KML file
-		waypt.color = KMLCOLOR
+	"1498":["product_brick",						KMLCOLOR,"circle"],			# gmap:shape_default	little square	OSMAnd Alts: military,natural_peak, product_brick
+	"1499":["skimap_white_black_round_shield",		KMLCOLOR,"circle"],			# gmap:shape_circle
+	"1500":["glaziery",								KMLCOLOR,"circle"],			# gmap:shape_square						OSMAnd Alts: chess, glaziery
+	"1501":["flooring",								KMLCOLOR,"circle"],			# gmap:shape_diamond					OSMAnd Alts: building_type_pyramid, flooring, natural_peak
+	"1502":["special_star",							KMLCOLOR,"circle"],			# gmap:shape_star						OSMAnd Alts:  shape_star, special_star, special_star_stroked (hollow), tourism_attraction,tourism_yes
+	"1503":["erotic",								KMLCOLOR,"circle"],			# gmap:adult-xxx
+	"1504":["air_transport",						KMLCOLOR,"circle"],			# gmap:airport-plane
+	"1505":["emergency",							KMLCOLOR,"circle"],			# gmap:ambulance
+	"1506":["shop_pet",								KMLCOLOR,"circle"],			# gmap:animal-head
+	"1507":["shop_pet",								KMLCOLOR,"circle"],			# gmap:animal-paw
+	"1508":["animal_shelter",						KMLCOLOR,"circle"],			# gmap:animal-shelter
+	"1509":["amenity_arts_centre",					KMLCOLOR,"circle"],			# gmap:art-palette
+	"1510":["amenity_atm",							KMLCOLOR,"circle"],			# gmap:atm
+	"1511":["attraction_carousel",					KMLCOLOR,"circle"],			# gmap:balloons
+	"1512":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-dollar
+	"1513":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-euro
+	"1514":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-pound
+	"1515":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-yen
+	"1516":["shop_hairdresser",						KMLCOLOR,"circle"],			# gmap:barber-scissors
+	"1517":["amenity_bar",							KMLCOLOR,"circle"],			# gmap:bar-cocktail
+	"1518":["amenity_pub",							KMLCOLOR,"circle"],			# gmap:bar-pub
+	"1519":["sport_baseball",						KMLCOLOR,"circle"],			# gmap:baseball
+	"1520":["sport_basketball",						KMLCOLOR,"circle"],			# gmap:basketball
+	"1521":["leisure_beach_resort",					KMLCOLOR,"circle"],			# gmap:beach						OSMAnd Alts: beach, leisure_beach_resort
+	"1522":["special_bicycle",						KMLCOLOR,"circle"],			# gmap:bicycle
+	"1523":["supervised_yes",						KMLCOLOR,"circle"],			# gmap:binoculars
+	"1524":["hazard",								KMLCOLOR,"circle"],			# gmap:biohazard
+	"1525":["leisure_slipway",						KMLCOLOR,"circle"],			# gmap:boat-launch
+	"1526":["shop_books",							KMLCOLOR,"circle"],			# gmap:book
+	"1527":["sport_9pin",							KMLCOLOR,"circle"],			# gmap:bowling
+	"1528":["bridge_structure_arch",				KMLCOLOR,"circle"],			# gmap:bridge
+	"1529":["communication_tower",					KMLCOLOR,"circle"],			# gmap:broadcast
+	"1530":["restaurants",							KMLCOLOR,"circle"],			# gmap:burger
+	"1531":["bag",									KMLCOLOR,"circle"],			# gmap:business-briefcase
+	"1532":["highway_bus_stop",						KMLCOLOR,"circle"],			# gmap:bus
+	"1533":["funicular",							KMLCOLOR,"circle"],			# gmap:cablecar-funicular
+	"1534":["amenity_cafe",							KMLCOLOR,"circle"],			# gmap:cafe-cup
+	"1535":["camera",								KMLCOLOR,"circle"],			# gmap:camera-photo
+	"1536":["sport_canoe",							KMLCOLOR,"circle"],			# gmap:canoe
+	"1537":["cargo_vehicle",						KMLCOLOR,"circle"],			# gmap:car-ferry
+	"1538":["shop_car",								KMLCOLOR,"circle"],			# gmap:car
+	"1539":["shop_car_repair",						KMLCOLOR,"circle"],			# gmap:car-repair
+	"1540":["amenity_casino",						KMLCOLOR,"circle"],			# gmap:casino-dice
+	"1541":["hazard",								KMLCOLOR,"circle"],			# gmap:caution
+	"1542":["cemetery",								KMLCOLOR,"circle"],			# gmap:cemetery
+	"1543":["drinking_water_yes",					KMLCOLOR,"circle"],			# gmap:chance-rain
+	"1544":["chemist",								KMLCOLOR,"circle"],			# gmap:chemical-beaker
+	"1545":["dovecote",								KMLCOLOR,"circle"],			# gmap:chicken
+	"1546":["place_city",							KMLCOLOR,"circle"],			# gmap:city-buildings
+	"1547":["suburb",								KMLCOLOR,"circle"],			# gmap:city-buildings-pointed
+	"1548":["building",								KMLCOLOR,"circle"],			# gmap:civic
+	"1549":["shop_clothes",							KMLCOLOR,"circle"],			# gmap:clothing-hanger
+	"1550":["cuisine",								KMLCOLOR,"circle"],			# gmap:cloudy
+	"1551":["service",								KMLCOLOR,"circle"],			# gmap:construction-hammer
+	"1552":["amenity_courthouse",					KMLCOLOR,"circle"],			# gmap:courthouse-gavel
+	"1553":["shop_pet",								KMLCOLOR,"circle"],			# gmap:cow
+	"1554":["sport_cricket",						KMLCOLOR,"circle"],			# gmap:cricket
+	"1555":["payment_centre",						KMLCOLOR,"circle"],			# gmap:currency-exchange
+	"1556":["hazard",								KMLCOLOR,"circle"],			# gmap:death-skull
+	"1557":["amenity_dentist",						KMLCOLOR,"circle"],			# gmap:dentist-tooth
+	"1558":["amenity_doctors",						KMLCOLOR,"circle"],			# gmap:doctor-bag
+	"1559":["tourism_hostel",						KMLCOLOR,"circle"],			# gmap:dormitory-bunk-bed
+	"1560":["hazard",								KMLCOLOR,"circle"],			# gmap:earthquake
+	"1561":["electrical",							KMLCOLOR,"circle"],			# gmap:electrical-plug
+	"1562":["shop_car",								KMLCOLOR,"circle"],			# gmap:enclosed-traffic
+	"1563":["military_range",						KMLCOLOR,"circle"],			# gmap:epicenter					OSMAnd Alts: craft_sawmill, motorcycle_parts_yes,military_range
+	"1564":["crater",								KMLCOLOR,"circle"],			# gmap:explosion					OSMAnd Alts: amenity_fire_station, crater
+	"1565":["industrial",							KMLCOLOR,"circle"],			# gmap:factory
+	"1566":["place_farm",							KMLCOLOR,"circle"],			# gmap:farm-barn
+	"1567":["amenity_fast_food",					KMLCOLOR,"circle"],			# gmap:fast-food
+	"1568":["attraction_big_wheel",					KMLCOLOR,"circle"],			# gmap:ferris-wheel
+	"1569":["amenity_ferry_terminal",				KMLCOLOR,"circle"],			# gmap:ferry
+	"1570":["finance",								KMLCOLOR,"circle"],			# gmap:finance
+	"1571":["amenity_fire_station",					KMLCOLOR,"circle"],			# gmap:fire
+	"1572":["shop_seafood",							KMLCOLOR,"circle"],			# gmap:fish-fins
+	"1573":["shop_seafood",							KMLCOLOR,"circle"],			# gmap:fish
+	"1574":["special_flag_start",					KMLCOLOR,"circle"],			# gmap:flag							OSMAnd Alts: locality,special_flag_finish,special_flag (triangle), special_flag_start (square), special_flag_stroke (hollow triangle), windsock (striped triangle)
+	"1575":["hazard_flood",							KMLCOLOR,"circle"],			# gmap:flood
+	"1576":["amenity_pharmacy",						KMLCOLOR,"circle"],			# gmap:fog
+	"1577":["restaurants",							KMLCOLOR,"circle"],			# gmap:food-fork-knife
+	"1578":["food_shop",							KMLCOLOR,"circle"],			# gmap:food-groceries
+	"1579":["american_football",					KMLCOLOR,"circle"],			# gmap:football
+	"1580":["amenity_fountain",						KMLCOLOR,"circle"],			# gmap:fountain
+	"1581":["amenity_fuel",							KMLCOLOR,"circle"],			# gmap:fuel-gasoline
+	"1582":["garden",								KMLCOLOR,"circle"],			# gmap:garden-flower
+	"1583":["barrier_lift_gate",					KMLCOLOR,"circle"],			# gmap:gated-community
+	"1584":["shop_gift",							KMLCOLOR,"circle"],			# gmap:gift
+	"1585":["sport_golf",							KMLCOLOR,"circle"],			# gmap:golf
+	"1586":["aerialway_gondola",					KMLCOLOR,"circle"],			# gmap:gondola
+	"1587":["agrarian",								KMLCOLOR,"circle"],			# gmap:grain
+	"1588":["weapons",								KMLCOLOR,"circle"],			# gmap:gun
+	"1589":["fitness_centre",						KMLCOLOR,"circle"],			# gmap:gym
+	"1590":["service",								KMLCOLOR,"circle"],			# gmap:hardware-wrench
+	"1591":["ranger_station",						KMLCOLOR,"circle"],			# gmap:headquarters
+	"1592":["special_heart",						KMLCOLOR,"circle"],			# gmap:heart
+	"1593":["special_helicopter",					KMLCOLOR,"circle"],			# gmap:helicopter
+	"1594":["special_symbol_question_mark",			KMLCOLOR,"circle"],			# gmap:help
+	"1595":["special_trekking",						KMLCOLOR,"circle"],			# gmap:hiking-duo
+	"1596":["special_trekking",						KMLCOLOR,"circle"],			# gmap:hiking-solo
+	"1597":["special_trekking",						KMLCOLOR,"circle"],			# gmap:hiking-trailhead
+	"1598":["historic_castle",						KMLCOLOR,"circle"],			# gmap:historic-building
+	"1599":["monument",								KMLCOLOR,"circle"],			# gmap:historic-monument
+	"1600":["memorial_plaque",						KMLCOLOR,"circle"],			# gmap:historic-plaque
+	"1601":["special_horse",						KMLCOLOR,"circle"],			# gmap:horse
+	"1602":["tourism_hotel",						KMLCOLOR,"circle"],			# gmap:hotel-bed
+	"1603":["special_house",						KMLCOLOR,"circle"],			# gmap:house
+	"1604":["construction",							KMLCOLOR,"circle"],			# gmap:housing-development
+	"1605":["hazard",								KMLCOLOR,"circle"],			# gmap:hurricane-strong
+	"1606":["hazard",								KMLCOLOR,"circle"],			# gmap:hurricane-weak
+	"1607":["ice_cream",							KMLCOLOR,"circle"],			# gmap:ice-cream
+	"1608":["special_information",					KMLCOLOR,"circle"],			# gmap:info
+	"1609":["special_symbol_at_sign",				KMLCOLOR,"circle"],			# gmap:internet
+	"1610":["cemetery",								KMLCOLOR,"circle"],			# gmap:japanese-cemetery
+	"1611":["special_marker",						KMLCOLOR,"circle"],			# gmap:japanese-poi
+	"1612":["amenity_post_box",						KMLCOLOR,"circle"],			# gmap:japanese-post-office
+	"1613":["shop_jewelry",							KMLCOLOR,"circle"],			# gmap:jewelry
+	"1614":["special_microphone",					KMLCOLOR,"circle"],			# gmap:karaoke
+	"1615":["special_kayak",						KMLCOLOR,"circle"],			# gmap:kayak
+	"1616":["hazard_erosion",						KMLCOLOR,"circle"],			# gmap:landslide
+	"1617":["shop_laundry",							KMLCOLOR,"circle"],			# gmap:laundry-iron
+	"1618":["man_made_lighthouse",					KMLCOLOR,"circle"],			# gmap:lighthouse
+	"1619":["power",								KMLCOLOR,"circle"],			# gmap:lightning???
+	"1620":["shop_pet",								KMLCOLOR,"circle"],			# gmap:lizard-gecko
+	"1621":["observation_tower",					KMLCOLOR,"circle"],			# gmap:lookout-tower
+	"1622":["special_sail_boat",					KMLCOLOR,"circle"],			# gmap:marina-yacht
+	"1623":["leisure_marina",						KMLCOLOR,"circle"],			# gmap:marine-anchor
+	"1624":["amenity_doctors",						KMLCOLOR,"circle"],			# gmap:medical 				OSMAnd Alts: healthcare
+	"1625":["siren",								KMLCOLOR,"circle"],			# gmap:megaphone
+	"1626":["subway_caracas",						KMLCOLOR,"circle"],			# gmap:metro 				OSMAnd Alts: special_subway
+	"1627":["man_made_mineshaft",					KMLCOLOR,"circle"],			# gmap:mine
+	"1628":["special_symbol_question_mark",			KMLCOLOR,"circle"],			# gmap:missing-person
+	"1629":["route_monorail_ref",					KMLCOLOR,"circle"],			# gmap:monorail
+	"1630":["shop_pet",								KMLCOLOR,"circle"],			# gmap:monster-friend
+	"1631":["backrest_yes",							KMLCOLOR,"circle"],			# gmap:moon
+	"1632":["special_motor_scooter",				KMLCOLOR,"circle"],			# gmap:moped
+	"1633":["shop_motorcycle",						KMLCOLOR,"circle"],			# gmap:motorcycle
+	"1634":["natural",								KMLCOLOR,"circle"],			# gmap:mountain
+	"1635":["amenity_cinema",						KMLCOLOR,"circle"],			# gmap:movies-cinema
+	"1636":["tourism_museum",						KMLCOLOR,"circle"],			# gmap:museum
+	"1637":["special_audio",						KMLCOLOR,"circle"],			# gmap:music-note			OSMAnd Alts: music, special_audio
+	"1638":["newspaper",							KMLCOLOR,"circle"],			# gmap:newspaper
+	"1639":["ngo",									KMLCOLOR,"circle"],			# gmap:ngo
+	"1640":["restaurants",							KMLCOLOR,"circle"],			# gmap:noodles
+	"1641":["generator_source_nuclear",				KMLCOLOR,"circle"],			# gmap:nuclear-atomic
+	"1642":["hazard_nuclear",						KMLCOLOR,"circle"],			# gmap:nuclear-radioactive
+	"1643":["shop_optician",						KMLCOLOR,"circle"],			# gmap:optometrist-eye
+	"1644":["parking",								KMLCOLOR,"circle"],			# gmap:parking
+	"1645":["cuisine",								KMLCOLOR,"circle"],			# gmap:partly-cloudy
+	"1646":["amenity_pharmacy",						KMLCOLOR,"circle"],			# gmap:pharmacy
+	"1647":["shop_mobile_phone",					KMLCOLOR,"circle"],			# gmap:phone-mobile
+	"1649":["barrier_cycle_barrier",				KMLCOLOR,"circle"],			# gmap:piano-music-hall
+	"1650":["tourism_picnic_site",					KMLCOLOR,"circle"],			# gmap:picnic-table
+	"1651":["restaurants",							KMLCOLOR,"circle"],			# gmap:pizza-slice
+	"1652":["leisure_playground",					KMLCOLOR,"circle"],			# gmap:playground-swing
+	"1653":["hazard",								KMLCOLOR,"circle"],			# gmap:poison-gas-mask
+	"1654":["geocache",								KMLCOLOR,"circle"],			# gmap:poi-you-are-here
+	"1655":["amenity_police",						KMLCOLOR,"circle"],			# gmap:police-badge
+	"1656":["amenity_police",						KMLCOLOR,"circle"],			# gmap:police-car
+	"1657":["amenity_police",						KMLCOLOR,"circle"],			# gmap:police-officer
+	"1658":["hazard",								KMLCOLOR,"circle"],			# gmap:pollution-spill
+	"1659":["amenity_post_box",						KMLCOLOR,"circle"],			# gmap:post-office-envelope
+	"1660":["power",								KMLCOLOR,"circle"],			# gmap:power-lightning
+	"1661":["special_flag_finish",					KMLCOLOR,"circle"],			# gmap:racetrack-flag
+	"1662":["railway_station",						KMLCOLOR,"circle"],			# gmap:railway-track
+	"1663":["drinking_water_yes",					KMLCOLOR,"circle"],			# gmap:rain
+	"1664":["amenity_library",						KMLCOLOR,"circle"],			# gmap:reading-library
+	"1665":["beach",								KMLCOLOR,"circle"],			# gmap:real-estate
+	"1666":["place_of_worship",						KMLCOLOR,"circle"],			# gmap:religious-bahai
+	"1667":["religion_buddhist",					KMLCOLOR,"circle"],			# gmap:religious-buddhist-hindu
+	"1668":["religion_buddhist",					KMLCOLOR,"circle"],			# gmap:religious-buddhist-wheel
+	"1669":["place_of_worship",						KMLCOLOR,"circle"],			# gmap:religious-buddhist-zen
+	"1670":["religion_christian",					KMLCOLOR,"circle"],			# gmap:religious-christian
+	"1671":["building_type_chapel",					KMLCOLOR,"circle"],			# gmap:religious-generic
+	"1672":["religion_hindu",						KMLCOLOR,"circle"],			# gmap:religious-hindu
+	"1673":["religion_muslim",						KMLCOLOR,"circle"],			# gmap:religious-islamic
+	"1674":["place_of_worship",						KMLCOLOR,"circle"],			# gmap:religious-jain
+	"1675":["religion_jewish",						KMLCOLOR,"circle"],			# gmap:religious-jewish
+	"1676":["place_of_worship",						KMLCOLOR,"circle"],			# gmap:religious-kneeling
+	"1677":["religion_shinto",						KMLCOLOR,"circle"],			# gmap:religious-shinto
+	"1678":["religion_sikh",						KMLCOLOR,"circle"],			# gmap:religious-sikh
+	"1679":["shop_pet",								KMLCOLOR,"circle"],			# gmap:rodent-rat
+	"1680":["special_walking",						KMLCOLOR,"circle"],			# gmap:running-pedestrian
+	"1681":["sport_sailing",						KMLCOLOR,"circle"],			# gmap:sailing-boat
+	"1682":["amenity_school",						KMLCOLOR,"circle"],			# gmap:school-crossing
+	"1683":["shop_shoes",							KMLCOLOR,"circle"],			# gmap:shoe
+	"1684":["shop",									KMLCOLOR,"circle"],			# gmap:shopping-bag
+	"1685":["shop_supermarket",						KMLCOLOR,"circle"],			# gmap:shopping-cart
+	"1686":["food_shop",							KMLCOLOR,"circle"],			# gmap:shop
+	"1687":["shower",								KMLCOLOR,"circle"],			# gmap:shower-bath
+	"1688":["sport_skiing",							KMLCOLOR,"circle"],			# gmap:ski-downhill
+	"1689":["aerialway_chair_lift",					KMLCOLOR,"circle"],			# gmap:ski-lift
+	"1690":["special_ski_touring",					KMLCOLOR,"circle"],			# gmap:ski-xc
+	"1691":["piste_sled",							KMLCOLOR,"circle"],			# gmap:sled
+	"1692":["seasonal_winter",						KMLCOLOR,"circle"],			# gmap:sleet
+	"1693":["man_made_chimney",						KMLCOLOR,"circle"],			# gmap:smokestack
+	"1694":["seasonal_winter",						KMLCOLOR,"circle"],			# gmap:snowflake
+	"1695":["seasonal_winter",						KMLCOLOR,"circle"],			# gmap:snow
+	"1696":["sport_soccer",							KMLCOLOR,"circle"],			# gmap:soccer
+	"1697":["tanning_salon",						KMLCOLOR,"circle"],			# gmap:spa
+	"1698":["sport_stadium",						KMLCOLOR,"circle"],			# gmap:stadium-arena
+	"1699":["bag",									KMLCOLOR,"circle"],			# gmap:suitcase-travel
+	"1700":["seasonal_summer",						KMLCOLOR,"circle"],			# gmap:sunny
+	"1701":["sport_swimming",						KMLCOLOR,"circle"],			# gmap:swimming
+	"1702":["water_tap",							KMLCOLOR,"circle"],			# gmap:tap-dry
+	"1703":["water_tap",							KMLCOLOR,"circle"],			# gmap:tap-flowing
+	"1704":["special_taxi",							KMLCOLOR,"circle"],			# gmap:taxi
+	"1705":["tea",									KMLCOLOR,"circle"],			# gmap:teapot
+	"1706":["historic_castle",						KMLCOLOR,"circle"],			# gmap:temple
+	"1707":["sport_tennis",							KMLCOLOR,"circle"],			# gmap:tennis
+	"1708":["amenity_theatre",						KMLCOLOR,"circle"],			# gmap:theater-lecture
+	"1709":["amenity_theatre",						KMLCOLOR,"circle"],			# gmap:theater
+	"1710":["temperature",							KMLCOLOR,"circle"],			# gmap:thermometer				OSMAnd Alts: height,skimap_arrow_2triangles_black_big,special_arrow_up_and_down,thermometer
+	"1711":["power",								KMLCOLOR,"circle"],			# gmap:thunder
+	"1712":["shop_ticket",							KMLCOLOR,"circle"],			# gmap:ticket
+	"1713":["shop_ticket",							KMLCOLOR,"circle"],			# gmap:ticket-star
+	"1714":["hazard",								KMLCOLOR,"circle"],			# gmap:tornado
+	"1715":["special_poi_eiffel_tower",				KMLCOLOR,"circle"],			# gmap:tower
+	"1716":["railway_station",						KMLCOLOR,"circle"],			# gmap:train
+	"1717":["locomotive",							KMLCOLOR,"circle"],			# gmap:train-steam
+	"1718":["railway_tram_stop",					KMLCOLOR,"circle"],			# gmap:tram-overhead
+	"1719":["railway_tram_stop",					KMLCOLOR,"circle"],			# gmap:tram
+	"1720":["forest",								KMLCOLOR,"circle"],			# gmap:tree
+	"1721":["forest",								KMLCOLOR,"circle"],			# gmap:tree-windy
+	"1722":["special_truck",						KMLCOLOR,"circle"],			# gmap:truck
+	"1723":["water",								KMLCOLOR,"circle"],			# gmap:tsunami					OSMAnd Alts: grass, water, hazard
+	"1724":["tunnel",								KMLCOLOR,"circle"],			# gmap:tunnel
+	"1725":["electronics",							KMLCOLOR,"circle"],			# gmap:tv
+	"1726":["amenity_university",					KMLCOLOR,"circle"],			# gmap:university
+	"1727":["special_video_camera",					KMLCOLOR,"circle"],			# gmap:video
+	"1728":["for_tourists",							KMLCOLOR,"circle"],			# gmap:vista-half
+	"1729":["tourism_viewpoint",					KMLCOLOR,"circle"],			# gmap:vista					OSMAnd Alts: for_tourists, motorcycle_parts_yes, shop_florist, tourism_viewpoint
+	"1730":["volcano",								KMLCOLOR,"circle"],			# gmap:volcano
+	"1731":["special_walking",						KMLCOLOR,"circle"],			# gmap:walking-pedestrian
+	"1732":["male_yes",								KMLCOLOR,"circle"],			# gmap:wc-men
+	"1733":["amenity_toilets",						KMLCOLOR,"circle"],			# gmap:wc-unisex
+	"1734":["female_yes",							KMLCOLOR,"circle"],			# gmap:wc-women
+	"1735":["wheelchair_designated",				KMLCOLOR,"circle"],			# gmap:wheelchair-handicapped
+	"1736":["windsock",								KMLCOLOR,"circle"],			# gmap:wind
+	"1737":["training_yoga",						KMLCOLOR,"circle"],			# gmap:yoga
+	"1739":["military",								KMLCOLOR,"circle"],			# gmap:blank-measle 			OSMAnd Alts: military,barrier_bus_trap, fire_hydrant_type_underground, 
+	"1740":["amenity_school",						KMLCOLOR,"circle"],			# gmap:academy
+	"1741":["amenity_car_rental",					KMLCOLOR,"circle"],			# gmap:car-rental
+	"1742":["baby_hatch",							KMLCOLOR,"circle"],			# gmap:baby-nursery
+	"1743":["tourism_zoo",							KMLCOLOR,"circle"],			# gmap:zoo-elephant
+	"1745":["1787",									KMLCOLOR,"circle"],			# gmap:charging_station_filter
+	"1746":["1787",									KMLCOLOR,"circle"],			# gmap:charging_station
+	"1747":["billiards",							KMLCOLOR,"circle"],			# gmap:8ball
+	"1748":["hazard",								KMLCOLOR,"circle"],			# gmap:accident
+	"1749":["defibrillator",						KMLCOLOR,"circle"],			# gmap:aed
+	"1750":["air_transport",						KMLCOLOR,"circle"],			# gmap:airstrip
+	"1751":["telescope",							KMLCOLOR,"circle"],			# gmap:alien
+	"1752":["sport_archery",						KMLCOLOR,"circle"],			# gmap:archery
+	"1753":["amenity_atm",							KMLCOLOR,"circle"],			# gmap:atm-intl
+	"1754":["special_utv",							KMLCOLOR,"circle"],			# gmap:atv
+	"1755":["badminton",							KMLCOLOR,"circle"],			# gmap:badminton
+	"1756":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-intl
+	"1757":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-jp
+	"1758":["amenity_bank",							KMLCOLOR,"circle"],			# gmap:bank-won
+	"1759":["shop_pet",								KMLCOLOR,"circle"],			# gmap:bear
+	"1760":["leisure_bird_hide",					KMLCOLOR,"circle"],			# gmap:birdwatching
+	"1761":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:boxing
+	"1762":["pastry",								KMLCOLOR,"circle"],			# gmap:cake-birthday
+	"1763":["special_camper",						KMLCOLOR,"circle"],			# gmap:camper
+	"1764":["firepit",								KMLCOLOR,"circle"],			# gmap:campfire
+	"1765":["tourism_camp_site",					KMLCOLOR,"circle"],			# gmap:camping_tent
+	"1766":["shop_pet",								KMLCOLOR,"circle"],			# gmap:cat
+	"1767":["natural_cave_entrance",				KMLCOLOR,"circle"],			# gmap:cave
+	"1768":["natural_cave_entrance",				KMLCOLOR,"circle"],			# gmap:caving
+	"1769":["special_symbol_check_mark",			KMLCOLOR,"circle"],			# gmap:checkmark
+	"1770":["craft_sawmill",						KMLCOLOR,"circle"],			# gmap:city-office-jp
+	"1771":["sport_climbing",						KMLCOLOR,"circle"],			# gmap:climbing-carabiner
+	"1772":["sport_climbing_adventure",				KMLCOLOR,"circle"],			# gmap:climbing-ropes
+	"1773":["dance_floor",							KMLCOLOR,"circle"],			# gmap:dancing
+	"1774":["conference_centre",					KMLCOLOR,"circle"],			# gmap:deer
+	"1776":["dovecote",								KMLCOLOR,"circle"],			# gmap:eagle
+	"1777":["sport_diving",							KMLCOLOR,"circle"],			# gmap:diving
+	"1778":["shop_pet",								KMLCOLOR,"circle"],			# gmap:dog
+	"1779":["shop_seafood",							KMLCOLOR,"circle"],			# gmap:dolphin
+	"1780":["dovecote",								KMLCOLOR,"circle"],			# gmap:duck
+	"1781":["sanitary_dump_station",				KMLCOLOR,"circle"],			# gmap:dump-station
+	"1782":["elevator",								KMLCOLOR,"circle"],			# gmap:elevator
+	"1783":["building_entrance",					KMLCOLOR,"circle"],			# gmap:entrance
+	"1784":["conveying_yes",						KMLCOLOR,"circle"],			# gmap:escalator-down
+	"1785":["conveying_yes",						KMLCOLOR,"circle"],			# gmap:escalator-up
+	"1786":["conveying_yes",						KMLCOLOR,"circle"],			# gmap:escalator
+	"1787":["charging_station",						KMLCOLOR,"circle"],			# gmap:ev-station
+	"1788":["historic_battlefield",					KMLCOLOR,"circle"],			# gmap:fencing
+	"1789":["dovecote",								KMLCOLOR,"circle"],			# gmap:finch
+	"1790":["fire_extinguisher",					KMLCOLOR,"circle"],			# gmap:fire-extinguisher
+	"1791":["amenity_fire_station",					KMLCOLOR,"circle"],			# gmap:fire-jp
+	"1792":["frozen_food",							KMLCOLOR,"circle"],			# gmap:food-storage
+	"1793":["shop_pet",								KMLCOLOR,"circle"],			# gmap:fox
+	"1794":["leisure_sports_centre",				KMLCOLOR,"circle"],			# gmap:frisbee
+	"1795":["attraction_animal",					KMLCOLOR,"circle"],			# gmap:gator
+	"1796":["dive",									KMLCOLOR,"circle"],			# gmap:ghost
+	"1797":["attraction_animal",					KMLCOLOR,"circle"],			# gmap:giraffe
+	"1798":["craft_winery",							KMLCOLOR,"circle"],			# gmap:glass 					OSMAnd Alts: amenity_bar, craft_winery, shop_alcohol
+	"1799":["golf_course",							KMLCOLOR,"circle"],			# gmap:golf-course
+	"1800":["barbecue",								KMLCOLOR,"circle"],			# gmap:grill
+	"1801":["club_music",							KMLCOLOR,"circle"],			# gmap:guitar
+	"1802":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:hatchet
+	"1803":["special_arrow_down_left",				KMLCOLOR,"circle"],			# gmap:here
+	"1804":["historic_manor",						KMLCOLOR,"circle"],			# gmap:historic-cn
+	"1805":["ice_hockey",							KMLCOLOR,"circle"],			# gmap:hockey
+	"1806":["clinic",								KMLCOLOR,"circle"],			# gmap:hospital-crescent
+	"1807":["clinic",								KMLCOLOR,"circle"],			# gmap:hospital-h
+	"1808":["clinic",								KMLCOLOR,"circle"],			# gmap:hospital-shield
+	"1809":["sauna",								KMLCOLOR,"circle"],			# gmap:hot-tub
+	"1810":["restaurants",							KMLCOLOR,"circle"],			# gmap:hotdog
+	"1811":["natural_hot_spring",					KMLCOLOR,"circle"],			# gmap:hotspring-onsen
+	"1812":["amenity_hunting_stand",				KMLCOLOR,"circle"],			# gmap:hunting
+	"1813":["reef",									KMLCOLOR,"circle"],			# gmap:jellyfish
+	"1814":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:jetski
+	"1815":["attraction_animal",					KMLCOLOR,"circle"],			# gmap:kangaroo
+	"1816":["kitchen",								KMLCOLOR,"circle"],			# gmap:kitchen
+	"1817":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:kitesurfing
+	"1818":["dovecote",								KMLCOLOR,"circle"],			# gmap:kiwi
+	"1819":["reef",									KMLCOLOR,"circle"],			# gmap:kraken
+	"1820":["shop_computer",						KMLCOLOR,"circle"],			# gmap:laptop
+	"1821":["shop_laundry",							KMLCOLOR,"circle"],			# gmap:laundry
+	"1822":["attraction_animal",					KMLCOLOR,"circle"],			# gmap:lion
+	"1823":["craft_locksmith",						KMLCOLOR,"circle"],			# gmap:locker
+	"1824":["special_symbol_question_mark",			KMLCOLOR,"circle"],			# gmap:lost-and-found
+	"1825":["judo",									KMLCOLOR,"circle"],			# gmap:martial-arts
+	"1826":["emergency_access_point",				KMLCOLOR,"circle"],			# gmap:meeting-point
+	"1827":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:message-in-a-bottle
+	"1828":["attraction_animal",					KMLCOLOR,"circle"],			# gmap:monkey
+	"1829":["customs",								KMLCOLOR,"circle"],			# gmap:moose
+	"1831":["dance_floor",							KMLCOLOR,"circle"],			# gmap:mosquito
+	"1832":["deadlock",								KMLCOLOR,"circle"],			# gmap:moustache
+	"1834":["tourism_museum",						KMLCOLOR,"circle"],			# gmap:museum-jp
+	"1835":["restaurants",							KMLCOLOR,"circle"],			# gmap:musubi-sushi
+	"1836":["smoking_no",							KMLCOLOR,"circle"],			# gmap:no-smoking
+	"1837":["piste_nordic",							KMLCOLOR,"circle"],			# gmap:nordic-walking
+	"1838":["sport_free_flying",					KMLCOLOR,"circle"],			# gmap:parachute
+	"1839":["dovecote",								KMLCOLOR,"circle"],			# gmap:parrot
+	"1840":["dovecote",								KMLCOLOR,"circle"],			# gmap:penguin
+	"1841":["amenity_pharmacy",						KMLCOLOR,"circle"],			# gmap:pharmacy-eu
+	"1842":["amenity_police",						KMLCOLOR,"circle"],			# gmap:police-jp
+	"1843":["equestrian",							KMLCOLOR,"circle"],			# gmap:polo
+	"1844":["shop_baby_goods",						KMLCOLOR,"circle"],			# gmap:pram-stroller
+	"1845":["shop_copyshop",						KMLCOLOR,"circle"],			# gmap:printer
+	"1846":["dovecote",								KMLCOLOR,"circle"],			# gmap:quotation
+	"1847":["hunting",								KMLCOLOR,"circle"],			# gmap:rabbit
+	"1848":["shop_pet",								KMLCOLOR,"circle"],			# gmap:raccoon
+	"1849":["sport_tennis",							KMLCOLOR,"circle"],			# gmap:racquetball
+	"1850":["recycling_centre",						KMLCOLOR,"circle"],			# gmap:recycling
+	"1851":["attraction_animal",					KMLCOLOR,"circle"],			# gmap:rhino
+	"1852":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:roach
+	"1853":["quarry",								KMLCOLOR,"circle"],			# gmap:road-work-construction
+	"1854":["educational_institution",				KMLCOLOR,"circle"],			# gmap:robot
+	"1856":["telescope",							KMLCOLOR,"circle"],			# gmap:rocket
+	"1857":["waste_basket",							KMLCOLOR,"circle"],			# gmap:rubbish-trash
+	"1858":["sport_rugby_union",					KMLCOLOR,"circle"],			# gmap:rugby
+	"1859":["special_campervan",					KMLCOLOR,"circle"],			# gmap:rv
+	"1860":["amenity_school",						KMLCOLOR,"circle"],			# gmap:school-cn
+	"1861":["sport_scuba_diving",					KMLCOLOR,"circle"],			# gmap:scuba
+	"1862":["email",								KMLCOLOR,"circle"],			# gmap:seal
+	"1863":["shop_seafood",							KMLCOLOR,"circle"],			# gmap:shark
+	"1864":["wreck",								KMLCOLOR,"circle"],			# gmap:shipwreck
+	"1865":["shower",								KMLCOLOR,"circle"],			# gmap:showers
+	"1866":["sport_skateboard",						KMLCOLOR,"circle"],			# gmap:skateboarding
+	"1867":["ice_skating",							KMLCOLOR,"circle"],			# gmap:skating-ice
+	"1868":["smoking_yes",							KMLCOLOR,"circle"],			# gmap:smoking
+	"1869":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:snake
+	"1870":["scuba_diving_shop",					KMLCOLOR,"circle"],			# gmap:snorkel
+	"1871":["entertainment",						KMLCOLOR,"circle"],			# gmap:snowboarding
+	"1872":["special_snowmobile",					KMLCOLOR,"circle"],			# gmap:snowmobile
+	"1873":["piste_hike",							KMLCOLOR,"circle"],			# gmap:snowshoeing
+	"1874":["dovecote",								KMLCOLOR,"circle"],			# gmap:songbird
+	"1875":["sport_tennis",							KMLCOLOR,"circle"],			# gmap:squash
+	"1876":["shop_pet",								KMLCOLOR,"circle"],			# gmap:squirrel
+	"1877":["highway_steps",						KMLCOLOR,"circle"],			# gmap:stairs
+	"1878":["telescope_type_optical",				KMLCOLOR,"circle"],			# gmap:stargazing-telescope
+	"1879":["amenity_biergarten",					KMLCOLOR,"circle"],			# gmap:stein-beer
+	"1880":["sport_surfing",						KMLCOLOR,"circle"],			# gmap:surfing
+	"1881":["sport_sailing",						KMLCOLOR,"circle"],			# gmap:tall-ship
+	"1882":["reef",									KMLCOLOR,"circle"],			# gmap:tidepool-starfish
+	"1883":["craft_agricultural_engines",			KMLCOLOR,"circle"],			# gmap:tractor
+	"1884":["highway_traffic_signals",				KMLCOLOR,"circle"],			# gmap:traffic-light
+	"1885":[ICON_NO_TRANSLATION,					KMLCOLOR,"circle"],			# gmap:treasure-chest
+	"1886":["nature_reserve",						KMLCOLOR,"circle"],			# gmap:tree-deciduous
+	"1887":["female_no",							KMLCOLOR,"circle"],			# gmap:tree-palm
+	"1888":["reef",									KMLCOLOR,"circle"],			# gmap:turtle
+	"1889":["telescope",							KMLCOLOR,"circle"],			# gmap:ufo
+	"1890":["sport_volleyball",						KMLCOLOR,"circle"],			# gmap:volleyball
+	"1891":["backrest_yes",							KMLCOLOR,"circle"],			# gmap:waiting-room
+	"1892":["waterfall",							KMLCOLOR,"circle"],			# gmap:waterfall
+	"1893":["sports_hall",							KMLCOLOR,"circle"],			# gmap:weight-barbell
+	"1894":["shop_seafood",							KMLCOLOR,"circle"],			# gmap:whale					OSMAnd Alts: shop_seafood, leisure_fishing, reef
+	"1895":["internet_access_wlan",					KMLCOLOR,"circle"],			# gmap:wifi
+	"1896":["firepit",								KMLCOLOR,"circle"],			# gmap:windsurfing
+	"1897":["free_flying",							KMLCOLOR,"circle"],			# gmap:wingsuit
+	"1898":["special_symbol_remove",				KMLCOLOR,"circle"],			# gmap:x-cross					OSMAnd Alts: level_crossing, special_symbol_remove
+	"1899":["special_marker",						KMLCOLOR,"circle"],			# gmap:blank-shape_pin
+}
+# icon translation table in use, iconDictionary merged with any user icon file
+iconTable = iconDictionary
+#========================================================================================
+# KMLToOSMAndIcon
+#	Looks up the KML icon number in the icon translation table currently in use
+#========================================================================================
+def KMLToOSMAndIcon(KMLIconID):
+	icon,color,background = iconTable.get(KMLIconID) or iconTable["unknown"]
+	# color is either a 6 digit hex value from the table or KMLCOLOR to use the KML file color
+	#print("icon:", icon, "color:", color, "background:",background)
+	return(cWaypoint(icon,color,background))
+#========================================================================================
+# loadIconFile
+#	Reads a user icon translation file and merges it over iconDictionary.  The file is
+#	a comma separated text file, # starts a comment line:
+#		KML icon number,OSMAnd icon name[,color[,shape]]
+#	color is a 6 digit hex value or KMLCOLOR (default), shape defaults to circle.
+#
+#	The parsed file is saved as a compiled index, ICON_INDEX_SUFFIX appended to the file
+#	name, and is only parsed again when the file's size or modification time changes.
+#	Within a single run a file is only ever read once.
+#========================================================================================
+def loadIconFile(iconFileName):
+	global iconTable
+	try:
+		fileStat = os.stat(iconFileName)
+	except OSError as e:
+		printError(f"  ERROR: Unable to read icon file: {iconFileName} {str(e)}")
+		return(13)
+	fileStamp = [fileStat.st_size, fileStat.st_mtime_ns]
+
+	if iconFileName in userIconTables and userIconTables[iconFileName][0] == fileStamp:
+		iconTable = userIconTables[iconFileName][1]
+		return(0)
+
+	userIcons = None
+	indexFileName = iconFileName + ICON_INDEX_SUFFIX
+	try:
+		with open(indexFileName,"r",encoding="utf-8") as f:
+			index = json.load(f)
+		if index["stamp"] == fileStamp:
+			userIcons = index["icons"]
+	except Exception:
+		pass	# missing or stale index, parse the icon file
+
+	if userIcons is None:
+		import csv
+		userIcons = {}
+		try:
+			with open(iconFileName,"r",encoding="utf-8",newline="") as f:
+				for lineNumber, fields in enumerate(csv.reader(f), start=1):
+					fields = [field.strip() for field in fields]
+					if not fields or not fields[0] or fields[0].startswith("#"):
+						continue
+					if len(fields) < 2 or not fields[1]:
+						printError(f"  ERROR: Icon file line {lineNumber}: expected KML icon number,OSMAnd icon name[,color[,shape]]")
+						return(13)
+					color = fields[2] if len(fields) > 2 and fields[2] else KMLCOLOR
+					shape = fields[3] if len(fields) > 3 and fields[3] else "circle"
+					userIcons[fields[0]] = [fields[1], color, shape]
+		except OSError as e:
+			printError(f"  ERROR: Unable to read icon file: {iconFileName} {str(e)}")
+			return(13)
+		try:
+			with open(indexFileName,"w",encoding="utf-8") as f:
+				json.dump({"stamp":fileStamp, "icons":userIcons}, f)
+		except OSError:
+			pass	# the index is only an optimization, e.g. the folder may be read only
+
+	iconTable = dict(iconDictionary)
+	iconTable.update(userIcons)
+	userIconTables[iconFileName] = (fileStamp, iconTable)
+	print(f"  Icon file translations:  {len(userIcons)}")
+	return(0)
+#========================================================================================
+# escapeXML
+#	Escapes text and attribute values the same way minidom does
+#========================================================================================
+def escapeXML(text):
+	return(text.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;"))
+#========================================================================================
+# cGPXWriter
+#	Writes indented GPX XML straight to an open text file as records are produced.
+#	Containers are opened with startElement and closed with endElement.  writeWaypoint
+#	and writeTrack write a cGPXWaypoint or cGPXTrack record.  The output is the same as
+#	pretty printing the whole tree with minidom, but only the record currently being
+#	written is held in memory.
+#========================================================================================
+GPX_ATTRIBUTES = {
+	"xmlns":				"http://www.topografix.com/GPX/1/1",
+	"xmlns:xsi":			"http://www.w3.org/2001/XMLSchema-instance",
+	"xmlns:osmand":			"https://osmand.net",
+	"xsi:schemaLocation":	"http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd",
+	"version":				"1.1",
+	"creator":				PROGRAM_NAME+ " V"+PROGRAM_VERSION,
+}
+# With fragment set only the elements inside the gpx element are written, to be put
+# together into a --combine file later
+class cGPXWriter:
+	def __init__ (self,outputFile,fragment=False):
+		self.outputFile = outputFile
+		if fragment:
+			self.openTags = ["gpx"]
+			return
+		self.openTags = []
+		outputFile.write('<?xml version="1.0" encoding="utf-8"?>\n')
+		self.startElement("gpx",GPX_ATTRIBUTES)
+
+	def startTag(self,tag,attrib):
+		attributes = "".join(f' {name}="{escapeXML(value)}"' for name, value in attrib.items())
+		return(f"{'  ' * len(self.openTags)}<{tag}{attributes}")
+
+	def startElement(self,tag,attrib={}):
+		self.outputFile.write(self.startTag(tag,attrib) + ">\n")
+		self.openTags.append(tag)
+
+	def endElement(self):
+		tag = self.openTags.pop()
+		self.outputFile.write(f"{'  ' * len(self.openTags)}</{tag}>\n")
+
+	def writeTextElement(self,tag,text,attrib={}):
+		startTag = self.startTag(tag,attrib)
+		if text:
+			self.outputFile.write(f"{startTag}>{escapeXML(text)}</{tag}>\n")
+		else:
+			self.outputFile.write(startTag + "/>\n")
+
+	def writeWaypoint(self,waypoint):
+		if waypoint.coordinateText is None:
+			self.startElement("wpt",{"lat":repr(waypoint.latitude), "lon":repr(waypoint.longitude)})
+		else:
+			self.startElement("wpt",{"lat":waypoint.coordinateText[1], "lon":waypoint.coordinateText[0]})
+		self.writeTextElement("ele",f"{waypoint.elevation:.1f}")
+		self.writeTextElement("name",waypoint.name)
+		self.writeTextElement("desc",waypoint.description)
+		self.startElement("extensions")
+		self.writeTextElement("osmand:icon",waypoint.style.icon)
+		self.writeTextElement("osmand:background",waypoint.style.background)
+		self.writeTextElement("osmand:color","#" + waypoint.style.color)
+		self.endElement()
+		self.endElement()
+
+	def writeTrack(self,track):
+		self.startElement("metadata")
+		self.writeTextElement("desc",track.description)
+		if track.stats is not None:
+			self.writeTextElement("bounds",None,{name:repr(value) for name,value in track.stats.bounds().items()})
+			self.startElement("extensions")
+			self.writeStats(track.stats)
+			self.endElement()
+		self.endElement()
+		self.startElement("trk")
+		self.writeTextElement("name",track.name)
+		self.writeTrackSegments(track)
+		self.endElement()
+		self.writeExtensions(track.extensions)
+
+	# One of the trk elements of a --combine file.  The track's description and OSMAnd
+	# extensions go in the trk element, ahead of the segments as GPX 1.1 requires.
+	def writeCombinedTrack(self,track):
+		self.startElement("trk")
+		self.writeTextElement("name",track.name)
+		if track.description:
+			self.writeTextElement("desc",track.description)
+		self.writeExtensions(track.extensions,track.stats)
+		self.writeTrackSegments(track)
+		self.endElement()
+
+	def writeTrackSegments(self,track):
+		if track.coordinateText is None:
+			longitudes,latitudes = track.longitudes,track.latitudes
+		else:
+			longitudes,latitudes = track.coordinateText
+		for start,end in track.segments():
+			self.startElement("trkseg")
+			self.writeTrackpoints(latitudes,longitudes,track.altitudes,start,end)
+			self.endElement()
+
+	def writeExtensions(self,extensions,stats=None):
+		self.startElement("extensions")
+		for tag, text in extensions:
+			self.writeTextElement(tag,text)
+		if stats is not None:
+			self.writeStats(stats,bounds=True)
+		self.endElement()
+
+	# --stats extension element.  A trk element has no bounds of its own in GPX, so the
+	# bounds of a --combine track are written inside it.
+	def writeStats(self,stats,bounds=False):
+		self.startElement("stats",{"xmlns":STATS_NAMESPACE})
+		if bounds:
+			self.writeTextElement("bounds",None,{name:repr(value) for name,value in stats.bounds().items()})
+		self.writeTextElement("length",f"{stats.length:.1f}")
+		self.writeTextElement("points",str(stats.countPoints))
+		self.writeTextElement("segments",str(stats.countSegments))
+		self.writeTextElement("minele",f"{stats.minElevation:.1f}")
+		self.writeTextElement("maxele",f"{stats.maxElevation:.1f}")
+		self.endElement()
+
+	# trackpoints first to last-1 are formatted TRACKPOINTS_PER_WRITE at a time with one template
+	def writeTrackpoints(self,latitudes,longitudes,altitudes,first,last):
+		indent = "  " * len(self.openTags)
+		template = f'{indent}<trkpt lat="{{}}" lon="{{}}">\n{indent}  <ele>{{:.1f}}</ele>\n{indent}</trkpt>\n'
+		for start in range(first, last, TRACKPOINTS_PER_WRITE):
+			end = min(start + TRACKPOINTS_PER_WRITE, last)
+			self.outputFile.write("".join(map(template.format, latitudes[start:end], longitudes[start:end], altitudes[start:end])))
+
+	def close(self):
+		while self.openTags:
+			self.endElement()
+#========================================================================================
+# writeLayerWaypoint
+#	Appends a waypoint to the layer's waypoint GPX file, opening it if needed
+#========================================================================================
+def writeLayerWaypoint(layer,waypoint):
+	try:
+		with profileStage("write"):
+			if layer.waypointWriter is None and layer.combine:
+				# kept for the layer's last combined GPX file, see writeCombinedFile
+				layer.waypointFile = io.StringIO()
+				layer.waypointWriter = cGPXWriter(layer.waypointFile,fragment=True)
+			elif layer.waypointWriter is None:
+				layer.waypointFile = openOutputFile(waypointOutputFileName(layer),layer.archive)
+				layer.waypointWriter = cGPXWriter(layer.waypointFile)
+			layer.waypointWriter.writeWaypoint(waypoint)
+	except OSError as e:
+		printError(f"  Error: An unexpected error occurred writing GPX file: {layer.waypointFileName} {str(e)}")
+		return(10)
+	return(0)
+#========================================================================================
+# trackFileName
+#	Track file names are taken from the track name which may contain illegal finename
+#	characters.  Strip out these illegal characters.  Allow all alpha numerics and
+#	characters from allowedChars
+#========================================================================================
+def trackFileName(name,layerFolderName):
+	allowedChars = " ._-"
+	fileName = "".join(i for i in name if (i.isalnum() or i in allowedChars))
+	return(os.path.join(layerFolderName, fileName+'.gpx'))
+#========================================================================================
+# Archive output
+#	With --archive every GPX file is written into a single zip or tar archive instead of
+#	its own file, one sequential write with no per file metadata on the output drive.
+#	The archive member names are the GPX file names, relative to the archive.
+#	An archive file is written under a temporary name and only renamed to the archive
+#	name when the conversion succeeds.
+#========================================================================================
+class cOutputArchive:
+	def __init__ (self,archiveName,archiveFormat):
+		import zipfile
+		import tarfile
+		self.archiveName = archiveName
+		self.archiveFormat = archiveFormat
+		if archiveName == "-":
+			self.tempFileName = None
+			self.stream = sys.__stdout__.buffer
+		else:
+			self.tempFileName = archiveName + ".tmp"
+			self.stream = open(self.tempFileName,"wb")
+		try:
+			if archiveFormat == "zip":
+				self.archive = zipfile.ZipFile(self.stream,"w",zipfile.ZIP_DEFLATED)
+			else:
+				self.archive = tarfile.open(fileobj=self.stream, mode="w|gz" if archiveFormat == "tar.gz" else "w|")
+		except Exception:
+			self.discardTempFile()
+			raise
+
+	def add(self,fileName,data):
+		import zipfile
+		import tarfile
+		memberName = Path(fileName).as_posix()
+		if self.archiveFormat == "zip":
+			info = zipfile.ZipInfo(memberName, time.localtime()[:6])
+			info.compress_type = zipfile.ZIP_DEFLATED
+			self.archive.writestr(info,data)
+		else:
+			info = tarfile.TarInfo(memberName)
+			info.size = len(data)
+			info.mtime = int(time.time())
+			info.mode = 0o644
+			self.archive.addfile(info,io.BytesIO(data))
+
+	# complete is False when the conversion failed, the archive file is then removed
+	def close(self,complete):
+		try:
+			self.archive.close()
+		finally:
+			if self.tempFileName is None:
+				self.stream.flush()
+			elif complete:
+				self.stream.close()
+				os.replace(self.tempFileName,self.archiveName)
+			else:
+				self.discardTempFile()
+
+	def discardTempFile(self):
+		if self.tempFileName is not None:
+			self.stream.close()
+			if os.path.exists(self.tempFileName):
+				os.remove(self.tempFileName)
+#========================================================================================
+# cArchiveMember
+#	Text file stand in for a GPX file with --archive.  The text is added to the archive
+#	when the file is closed.
+#========================================================================================
+class cArchiveMember(io.StringIO):
+	def __init__ (self,fileName):
+		super().__init__()
+		self.fileName = fileName
+		self.size = 0
+
+	def close(self):
+		if not self.closed:
+			data = self.getvalue().encode("utf-8")
+			self.size = len(data)
+			storeArchiveFile(self.fileName,data)
+		super().close()
+#========================================================================================
+# storeArchiveFile
+#	The main process adds the file straight to the archive.  A worker process keeps it
+#	in deferredOutput to be sent back to the main process with the track's results.
+#========================================================================================
+def storeArchiveFile(fileName,data):
+	if deferredOutput is None:
+		outputArchive.add(fileName,data)
 	else:
-		#use the icon color from the dictionary table
-		waypt.color = iconDictionary[KMLIconID][1]
-	waypt.background = iconDictionary[KMLIconID][2]
-	#print("icon:", waypt.icon, "color:", waypt.color, "background:",waypt.background)
-	return(waypt)
+		deferredOutput.append((storeArchiveFile,(fileName,data)))
 #========================================================================================
-# writeGPXFile
+# openOutputFile
+#	Opens a GPX file for writing, or an archive member with --archive
 #========================================================================================
-def writeGPXFile(gpx,outputFilename):
-	# Create the ElementTree object with pretty printing options
-	tree = ET.ElementTree(gpx)
-	tree_str = ET.tostring(gpx, encoding="utf-8", xml_declaration=True)
-	pretty_tree_str = minidom.parseString(tree_str).toprettyxml(indent="  ", encoding="utf-8").decode()
+def openOutputFile(fileName,archive):
+	if archive:
+		return(cArchiveMember(fileName))
+	return(open(fileName,"w",encoding="utf-8"))
+#========================================================================================
+# outputFileSize
+#	Bytes written to a closed output file, for --profile
+#========================================================================================
+def outputFileSize(outputFile):
+	if isinstance(outputFile,cArchiveMember):
+		return(outputFile.size)
+	return(os.path.getsize(outputFile.name))
+#========================================================================================
+# Combined output
+#	With --combine all of a layer's tracks and waypoints are written to one GPX file with
+#	a trk element for each track.  The trk elements are kept in memory until the next one
+#	would take them over --combine-size, then they are written out and the following trk
+#	elements go to a new file.  GPX puts waypoints ahead of tracks, so the waypoints go into the layer's last
+#	file.  Tracks reach storeCombinedTrack in KML order, with or without -j, so the
+#	files always split at the same tracks.
+#========================================================================================
+def combinedFileName(layer):
+	countFiles = len(layer.combinedFileNames) + 1
+	fileName = COMBINED_FILE_NAME if countFiles == 1 else f"{COMBINED_FILE_NAME} {countFiles}"
+	return(os.path.join(layer.folderName, fileName + ".gpx"))
 
-	# Write the pretty-printed GPX XML to a file
+def storeCombinedTrack(layerFolderName,text):
+	if deferredOutput is not None:
+		deferredOutput.append((storeCombinedTrack,(layerFolderName,text)))
+		return
+	layer = combinedLayers[layerFolderName]
+	if layer.combineSize and layer.combinedTracks and layer.combinedTracksSize + len(text) > layer.combineSize:
+		writeCombinedFile(layer)
+	layer.combinedTracks.append(text)
+	layer.combinedTracksSize += len(text)
+#========================================================================================
+# writeCombinedFile
+#	Writes the layer's trk elements, and its waypoints if this is the layer's last file
+#========================================================================================
+def writeCombinedFile(layer,lastFile=False):
+	fileName = combinedFileName(layer)
+	with openOutputFile(fileName,layer.archive) as f:
+		gpxWriter = cGPXWriter(f)
+		if lastFile and layer.waypointFile is not None:
+			f.write(layer.waypointFile.getvalue())
+		f.writelines(layer.combinedTracks)
+		gpxWriter.close()
+	if runProfile is not None:
+		runProfile.bytesWritten += outputFileSize(f) - sum(len(text.encode("utf-8")) for text in layer.combinedTracks)
+	layer.combinedFileNames.append(fileName)
+	layer.combinedTracks = []
+	layer.combinedTracksSize = 0
+#========================================================================================
+# Incremental export
+#	With --incremental a manifest of content hashes for every GPX file written is kept
+#	in GPX_path.  A track's hash is taken from its KML placemark and the conversion
+#	options, so an unchanged track is skipped before it is converted.  Waypoint files
+#	are written to a temporary file and their hash is taken from the result, so the
+#	real file is only replaced when it changed.  Files in the previous manifest that
+#	are not produced again are deleted at the end of a successful run.
+#========================================================================================
+def loadManifest(args):
+	global outputManifest
 	try:
-		with open(outputFilename, "w",encoding="utf-8") as f:
-			f.write(pretty_tree_str)
-		returnCode = 0
-	except Exception as e:
-		print(f"  Error: An unexpected error occurred writing GPX file: {outputFilename} {str(e)}")
-		returnCode = 10
-	return(returnCode)
+		with open(os.path.join(args.GPX_path, MANIFEST_FILE_NAME),"r",encoding="utf-8") as f:
+			outputManifest = json.load(f)
+	except Exception:
+		outputManifest = {}	# first incremental run or unreadable manifest, write everything
 #========================================================================================
-# addGPXElement
+# manifestKey
 #========================================================================================
-def addGPXElement():
-	namespaces = {
-			"xmlns":				"http://www.topografix.com/GPX/1/1",
-			"xmlns:xsi":			"http://www.w3.org/2001/XMLSchema-instance",
-			"xsi:schemaLocation":	"http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd",
-			"xmlns:osmand":			"https://osmand.net",
-	}
-	gpx = ET.Element("gpx", namespaces)
-	gpx.set("version", "1.1")
-	gpx.set("creator", PROGRAM_NAME+ " V"+PROGRAM_VERSION)
-	return(gpx)
+def manifestKey(fileName,args):
+	return(Path(os.path.relpath(fileName, args.GPX_path)).as_posix())
+#========================================================================================
+# trackManifestEntry
+#	Returns (manifest key, hash) for the track's GPX file, None if the track has no name
+#========================================================================================
+def trackManifestEntry(element,name,args,layerFolderName):
+	if name is None:
+		return(None)
+	# the area is hashed even without --clip so an unchanged track is known to be in it
+	options = repr((PROGRAM_VERSION, "segments", args.transparency, args.width, args.arrows, args.ends, args.split, args.interval, args.simplify, args.stats, args.bbox, args.near, args.clip))
+	trackHash = hashlib.sha1(options.encode("utf-8"))
+	trackHash.update(ET.tostring(element))
+	return(manifestKey(trackFileName(name,layerFolderName),args), trackHash.hexdigest())
+#========================================================================================
+# isOutputUnchanged
+#	A file written earlier in this run, e.g. a second track with the same name, is never
+#	treated as unchanged.
+#========================================================================================
+def isOutputUnchanged(manifestEntry,args):
+	key,contentHash = manifestEntry
+	return(outputManifest.get(key) == contentHash and key not in newManifest
+		and os.path.isfile(os.path.join(args.GPX_path, key)))
+#========================================================================================
+# reportUnchangedTrack
+#========================================================================================
+def reportUnchangedTrack(placemark):
+	print(f"      Track:    {placemark.name} (unchanged)")
+	return(0)
+#========================================================================================
+# waypointOutputFileName
+#	With --incremental waypoints are written to a temporary file, see finishLayer
+#========================================================================================
+def waypointOutputFileName(layer):
+	if layer.incremental:
+		return(layer.waypointFileName + ".tmp")
+	return(layer.waypointFileName)
+#========================================================================================
+# saveManifest
+#	Deletes GPX files that were not produced by this run and saves the new manifest
+#========================================================================================
+def saveManifest(args):
+	for key in outputManifest:
+		if key in newManifest:
+			continue
+		fileName = os.path.join(args.GPX_path, key)
+		print(f"  Deleting GPX file no longer in the map: {fileName}")
+		try:
+			if os.path.isfile(fileName):
+				os.remove(fileName)
+			folderName = os.path.dirname(fileName)
+			if os.path.normpath(folderName) != os.path.normpath(args.GPX_path) and not os.listdir(folderName):
+				os.rmdir(folderName)	# layer no longer exists
+		except OSError as e:
+			printError(f"  ERROR: Unable to delete GPX file: {fileName} {str(e)}")
+			return(10)
+	try:
+		with open(os.path.join(args.GPX_path, MANIFEST_FILE_NAME),"w",encoding="utf-8") as f:
+			json.dump(newManifest, f, indent=1, sort_keys=True)
+	except OSError as e:
+		printError(f"  ERROR: Unable to write manifest file: {str(e)}")
+		return(10)
+	return(0)
 #========================================================================================
 # getMapKMLData
+#	Starts the GET request for the map's KML data.  Only the headers are read here, the
+#	body is returned as an iterator of byte chunks so it can be parsed while it downloads.
+#
+#	If the map is in the KML cache the request is conditional, an unchanged map is
+#	answered with a 304 and the body is read from the cache instead.
+#	args.kmlSource is set to download or cache for the --profile report.
 #========================================================================================
 def getMapKMLData(args):
-	getURLRequest = GET_URL_PREFIX+str(args.map_id)+GET_URL_SUFFIX
+	if args.offline:
+		return(openCachedKML(args))
+
+	getURLRequest = mapKMLURL(args)
 	#print("  URLRequst:       ",getURLRequest)
-	response = requests.get(getURLRequest)
+	requestHeaders = {}
+	validators = None if args.no_cache else readCacheValidators(args)
+	if validators is not None:
+		if validators.get("etag"):
+			requestHeaders["If-None-Match"] = validators["etag"]
+		if validators.get("last_modified"):
+			requestHeaders["If-Modified-Since"] = validators["last_modified"]
+	if httpSession is not None:
+		returnCode,response = sessionGet(getURLRequest,requestHeaders,args.timeout)
+	else:
+		returnCode,response = urllibGet(getURLRequest,requestHeaders,args.timeout)
+	if returnCode != 0:
+		return(returnCode,None)
 	match response.status_code:
 		case 200:
 			# Successful GET request
 			returnCode = 0
+		case 304:
+			# Map has not changed since it was cached
+			response.close()
+			print("  Map unchanged, using cached KML data")
+			return(openCachedKML(args))
 		case 403:
-			print(f"  ERROR: 403 Share permision for map not set")
+			printError(f"  ERROR: 403 Share permision for map not set")
 			returnCode = 403
 		case 404:
-			print(f"  ERROR: 404 Bad map ID value")
+			printError(f"  ERROR: 404 Bad map ID value")
 			returnCode = 404
 		case _:
-			print(f"  ERROR: An unexpected error occurred: {str(response.status_code)}")
+			printError(f"  ERROR: An unexpected error occurred: {str(response.status_code)}")
 			returnCode = response.status_code
-	return(returnCode,response.text)
+	if returnCode != 0:
+		response.close()
+		return(returnCode,None)
+	args.kmlSource = "download"
+	if args.no_cache:
+		return(returnCode,readResponseChunks(response))
+	return(returnCode,cacheResponseChunks(response,args))
+#========================================================================================
+# mapKMLURL
+#========================================================================================
+def mapKMLURL(args):
+	return(args.kml_url+str(args.map_id)+GET_URL_SUFFIX)
+#========================================================================================
+# urllibGet
+#	Downloads a single map with the standard library, without the start up cost of the
+#	requests package.  Returns a cURLResponse, also for HTTP error statuses.
+#	The download fails when the server does not connect or send data for timeout
+#	seconds, so a stalled server can't hang --watch, --serve or a cancelled convert().
+#========================================================================================
+def urllibGet(url,requestHeaders,timeout):
+	import urllib.request
+	import urllib.error
+	request = urllib.request.Request(url, headers=dict(requestHeaders, **{"Accept-Encoding": "gzip"}))
+	try:
+		response = urllib.request.urlopen(request, timeout=timeout)
+	except urllib.error.HTTPError as e:
+		response = e
+	except (urllib.error.URLError, OSError) as e:
+		printError(f"  ERROR: Unable to connect to google: {str(e)}")
+		return(12,None)
+	return(0,cURLResponse(response))
+#========================================================================================
+# cURLResponse
+#	The parts of a requests response getMapKMLData uses, for a urllib response.  gzip
+#	content is decompressed as it is read.
+#========================================================================================
+class cURLResponse:
+	def __init__ (self,response):
+		self.response = response
+		self.status_code = response.getcode()
+		self.headers = response.headers
+
+	def iter_content(self,chunk_size):
+		decompressor = None
+		if self.headers.get("Content-Encoding","").lower() == "gzip":
+			import zlib
+			decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+		while True:
+			chunk = self.response.read(chunk_size)
+			if not chunk:
+				break
+			if decompressor is not None:
+				chunk = decompressor.decompress(chunk)
+			if chunk:
+				yield chunk
+		if decompressor is not None:
+			chunk = decompressor.flush()
+			if chunk:
+				yield chunk
+
+	def close(self):
+		self.response.close()
+
+	def __enter__(self):
+		return(self)
+
+	def __exit__(self,*exc):
+		self.close()
+#========================================================================================
+# sessionGet
+#	Downloads a map over the shared requests session of batch mode, with the same
+#	timeout as urllibGet
+#========================================================================================
+def sessionGet(url,requestHeaders,timeout):
+	import requests
+	try:
+		response = httpSession.get(url, headers=requestHeaders, stream=True, timeout=timeout)
+	except requests.exceptions.RequestException as e:
+		printError(f"  ERROR: Unable to connect to google: {str(e)}")
+		return(12,None)
+	return(0,response)
+#========================================================================================
+# getHTTPSession
+#	All batch downloads share one session so connections to google are kept open and
+#	reused.  The connection pool is sized for the number of concurrent batch downloads.
+#	Without the requests package the maps are downloaded with urllib.
+#========================================================================================
+def getHTTPSession(poolSize=DEFAULT_FETCH_JOBS):
+	global httpSession
+	if httpSession is None:
+		try:
+			import requests
+		except ImportError:
+			return(None)
+		httpSession = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+		httpSession.mount("https://", adapter)
+		httpSession.mount("http://", adapter)
+	return(httpSession)
+#========================================================================================
+# readResponseChunks
+#========================================================================================
+def readResponseChunks(response):
+	with response:
+		yield from response.iter_content(chunk_size=KML_CHUNK_SIZE)
+#========================================================================================
+# KML cache
+#	The cache folder holds <map id>-<URL hash>.kml with the map's KML data and
+#	<map id>-<URL hash>.json with the ETag and Last-Modified validators google sent with
+#	it.  The hash of the map's KML URL keeps maps from another --kml-url apart.  A cache
+#	file's modified time is its last use and is used for least recently used eviction.
+#========================================================================================
+def cacheFileNames(args):
+	cacheName = "".join(i for i in str(args.map_id) if (i.isalnum() or i in "_-"))
+	cacheName += "-" + hashlib.sha1(mapKMLURL(args).encode("utf-8")).hexdigest()[:12]
+	cacheFileName = os.path.join(args.cache_dir, cacheName)
+	return(cacheFileName+".kml", cacheFileName+".json")
+#========================================================================================
+# readCacheValidators
+#	Returns the validators of the cached copy of the map or None if it is not cached
+#========================================================================================
+def readCacheValidators(args):
+	KMLFileName,validatorFileName = cacheFileNames(args)
+	try:
+		with open(validatorFileName,"r",encoding="utf-8") as f:
+			validators = json.load(f)
+		if os.path.getsize(KMLFileName) != validators["size"]:
+			return(None)
+	except Exception:
+		return(None)
+	return(validators)
+#========================================================================================
+# openCachedKML
+#========================================================================================
+def openCachedKML(args):
+	KMLFileName,validatorFileName = cacheFileNames(args)
+	try:
+		KMLStream = open(KMLFileName,"rb")
+	except OSError:
+		printError(f"  ERROR: Map is not in the KML cache: {args.cache_dir}")
+		return(14,None)
+	try:
+		os.utime(KMLFileName)	# mark as recently used
+	except OSError:
+		pass
+	args.kmlSource = "cache"
+	return(0,readKMLChunks(KMLStream))
+#========================================================================================
+# cacheResponseChunks
+#	Passes the downloaded chunks on to the parser while saving them to a temporary cache
+#	file.  The cache entry is only replaced once the whole body has been received.
+#========================================================================================
+def cacheResponseChunks(response,args):
+	import tempfile
+	KMLFileName,validatorFileName = cacheFileNames(args)
+	try:
+		os.makedirs(args.cache_dir, exist_ok=True)
+		# a temporary file of its own, the same map may be downloaded by several batch
+		# threads at once
+		handle,tempFileName = tempfile.mkstemp(dir=args.cache_dir, prefix=os.path.basename(KMLFileName), suffix=".tmp")
+		cacheFile = os.fdopen(handle,"wb")
+	except OSError as e:
+		print(f"  WARNING: Unable to write KML cache: {str(e)}")
+		yield from readResponseChunks(response)
+		return
+
+	complete = False
+	tempValidatorFileName = None
+	try:
+		with response, cacheFile:
+			for chunk in response.iter_content(chunk_size=KML_CHUNK_SIZE):
+				cacheFile.write(chunk)
+				yield chunk
+		validators = {
+			"etag":				response.headers.get("ETag"),
+			"last_modified":	response.headers.get("Last-Modified"),
+			"size":				os.path.getsize(tempFileName),
+		}
+		handle,tempValidatorFileName = tempfile.mkstemp(dir=args.cache_dir, prefix=os.path.basename(validatorFileName), suffix=".tmp")
+		with os.fdopen(handle,"w",encoding="utf-8") as f:
+			json.dump(validators,f)
+		os.replace(tempFileName,KMLFileName)
+		os.replace(tempValidatorFileName,validatorFileName)
+		complete = True
+	finally:
+		if not complete:
+			for fileName in (tempFileName, tempValidatorFileName):
+				if fileName is not None and os.path.exists(fileName):
+					os.remove(fileName)
+	evictCache(args,KMLFileName)
+#========================================================================================
+# evictCache
+#	Removes the least recently used maps until the cache fits in args.cache_size MB.
+#	The map just downloaded is never removed.  Temporary files of interrupted downloads
+#	are removed once they are CACHE_TEMP_FILE_AGE old, the ones of downloads that may
+#	still be running count towards the size.
+#========================================================================================
+def evictCache(args,keepFileName):
+	try:
+		cacheFiles = []
+		tempSize = 0
+		for entry in os.scandir(args.cache_dir):
+			if entry.name.endswith(".tmp"):
+				entryStat = entry.stat()
+				if time.time() - entryStat.st_mtime > CACHE_TEMP_FILE_AGE:
+					os.remove(entry.path)
+				else:
+					tempSize += entryStat.st_size
+			elif entry.name.endswith(".kml") and entry.path != keepFileName:
+				entryStat = entry.stat()
+				cacheFiles.append((entryStat.st_mtime, entryStat.st_size, entry.path))
+		cacheSize = sum(size for mtime,size,path in cacheFiles) + os.path.getsize(keepFileName) + tempSize
+		for mtime,size,path in sorted(cacheFiles):
+			if cacheSize <= args.cache_size * 1024 * 1024:
+				break
+			os.remove(path)
+			validatorFileName = path[:-len(".kml")] + ".json"
+			if os.path.exists(validatorFileName):
+				os.remove(validatorFileName)
+			cacheSize -= size
+	except OSError as e:
+		print(f"  WARNING: Unable to clean up KML cache: {str(e)}")
+#========================================================================================
+# readKMLChunks
+#========================================================================================
+def readKMLChunks(KMLStream):
+	try:
+		chunk = KMLStream.read(KML_CHUNK_SIZE)
+		while chunk:
+			yield chunk
+			chunk = KMLStream.read(KML_CHUNK_SIZE)
+	finally:
+		if KMLStream is not sys.stdin.buffer:
+			KMLStream.close()
+#========================================================================================
+# Profiling
+#	With --profile the wall clock and CPU time of each stage of the conversion is kept
+#	in a cRunProfile:
+#		fetch:   waiting for KML data, from the download, the cache or a file
+#		parse:   feeding the KML data through the parser
+#		convert: converting placemarks, without the time spent writing
+#		write:   writing GPX files
+#		wait:    waiting for tracks from the worker processes (-j)
+#	Stage times do not include the time of stages nested in them.  Layer times are the
+#	time spent on the layer's placemarks and its waypoint file.  With -j each worker
+#	process profiles its own tracks and the results are added to the main profile, so
+#	stage and layer times are summed over all processes.
+#========================================================================================
+class cRunProfile:
+	def __init__ (self):
+		self.stages = {}		# stage: [wall, cpu]
+		self.layers = {}		# layer folder name: [layer name, wall, cpu]
+		self.tracks = []		# (wall, cpu, name, layer folder name, points, bytes written)
+		self.openStages = []	# [stage, wall start, cpu start, nested wall, nested cpu]
+		self.KMLSource = None
+		self.KMLBytes = 0
+		self.bytesWritten = 0
+
+	def startStage(self,stage):
+		self.openStages.append([stage, time.perf_counter(), time.process_time(), 0.0, 0.0])
+
+	def endStage(self,layer=None):
+		stage,wallStart,cpuStart,nestedWall,nestedCPU = self.openStages.pop()
+		wall = time.perf_counter() - wallStart
+		cpu = time.process_time() - cpuStart
+		stageTimes = self.stages.setdefault(stage, [0.0, 0.0])
+		stageTimes[0] += wall - nestedWall
+		stageTimes[1] += cpu - nestedCPU
+		if self.openStages:
+			self.openStages[-1][3] += wall
+			self.openStages[-1][4] += cpu
+		if layer is not None:
+			self.addLayerTime(layer.folderName, layer.name, wall, cpu)
+
+	def addLayerTime(self,layerFolderName,layerName,wall,cpu):
+		layerTimes = self.layers.setdefault(layerFolderName, [layerName, 0.0, 0.0])
+		layerTimes[1] += wall
+		layerTimes[2] += cpu
+
+	def addTrack(self,name,layerFolderName,points,size,wallStart,cpuStart):
+		self.bytesWritten += size
+		self.tracks.append((time.perf_counter() - wallStart, time.process_time() - cpuStart, name, layerFolderName, points, size))
+
+	def merge(self,workerProfile):
+		for stage,(wall,cpu) in workerProfile.stages.items():
+			stageTimes = self.stages.setdefault(stage, [0.0, 0.0])
+			stageTimes[0] += wall
+			stageTimes[1] += cpu
+		for track in workerProfile.tracks:
+			wall,cpu,name,layerFolderName = track[:4]
+			self.addLayerTime(layerFolderName, None, wall, cpu)
+		self.tracks += workerProfile.tracks
+		self.bytesWritten += workerProfile.bytesWritten
+#========================================================================================
+# profileStage
+#	Times the body of a with statement as a stage, and as time spent on the layer if
+#	one is given.  Does nothing unless --profile is used.
+#========================================================================================
+@contextlib.contextmanager
+def profileStage(stage,layer=None):
+	if runProfile is None:
+		yield
+		return
+	profile = runProfile
+	profile.startStage(stage)
+	try:
+		yield
+	finally:
+		profile.endStage(layer)
+#========================================================================================
+# writeProfile
+#	Prints the profile summary and writes the JSON report to GPX_path
+#========================================================================================
+def writeProfile(args,wallStart,cpuStart):
+	profile = runProfile
+	wall = time.perf_counter() - wallStart
+	cpu = time.process_time() - cpuStart
+	stages = {stage: profile.stages[stage] for stage in PROFILE_STAGES if stage in profile.stages}
+	slowestTracks = sorted(profile.tracks, key=lambda track: track[0], reverse=True)[:args.profile_tracks]
+	layerNames = {layerFolderName: layerTimes[0] for layerFolderName,layerTimes in profile.layers.items()}
+	report = {
+		"program":			PROGRAM_NAME,
+		"version":			PROGRAM_VERSION,
+		"map_id":			args.map_id,
+		"GPX_path":			args.GPX_path,
+		"jobs":				args.jobs,
+		"kml_source":		profile.KMLSource,
+		"kml_bytes":		profile.KMLBytes,
+		"bytes_downloaded":	profile.KMLBytes if profile.KMLSource == "download" else 0,
+		"bytes_written":	profile.bytesWritten,
+		"total":			{"wall": round(wall, 6), "cpu": round(cpu, 6)},
+		"stages":			{stage: {"wall": round(stageWall, 6), "cpu": round(stageCPU, 6)} for stage,(stageWall,stageCPU) in stages.items()},
+		"layers":			[{"name": layerName, "folder": layerFolderName, "wall": round(layerWall, 6), "cpu": round(layerCPU, 6)}
+								for layerFolderName,(layerName,layerWall,layerCPU) in profile.layers.items()],
+		"slowest_tracks":	[{"name": name, "layer": layerNames.get(layerFolderName), "points": points, "bytes": size, "wall": round(trackWall, 6), "cpu": round(trackCPU, 6)}
+								for trackWall,trackCPU,name,layerFolderName,points,size in slowestTracks],
+	}
+
+	print("")
+	print("  Profile                 wall s     cpu s")
+	print(f"    {'total':<18} {wall:>9.3f} {cpu:>9.3f}")
+	for stage,(stageWall,stageCPU) in stages.items():
+		print(f"    {stage:<18} {stageWall:>9.3f} {stageCPU:>9.3f}")
+	print(f"  KML data:     {profile.KMLBytes:>12,} bytes ({profile.KMLSource})")
+	print(f"  GPX written:  {profile.bytesWritten:>12,} bytes")
+	if args.layers:
+		print("  Layers")
+		for layerFolderName,(layerName,layerWall,layerCPU) in profile.layers.items():
+			print(f"    {str(layerName)[:18]:<18} {layerWall:>9.3f} {layerCPU:>9.3f}")
+	if slowestTracks:
+		print("  Slowest tracks                           points")
+		for trackWall,trackCPU,name,layerFolderName,points,size in slowestTracks:
+			print(f"    {name[:18]:<18} {trackWall:>9.3f} {trackCPU:>9.3f} {points:>9}")
+
+	reportFileName = os.path.join(args.GPX_path, PROFILE_FILE_NAME)
+	try:
+		with openOutputFile(reportFileName,args.archive is not None) as f:
+			json.dump(report,f,indent=2,ensure_ascii=False)
+	except OSError as e:
+		printError(f"  Error: An unexpected error occurred writing profile report: {reportFileName} {str(e)}")
+		return(10)
+	print(f"  Profile report:       {reportFileName}")
+	return(0)
+#========================================================================================
+# readPlacemark
+#	Reads a KML Placemark element into a cKMLPlacemark in one pass over its children,
+#	instead of a descendant search for every value.
+#	Points are waypoints.  LineStrings and the outer boundary of Polygons, OSMAnd tracks
+#	have no filled areas, are tracks.  The geometries in a MultiGeometry are read the
+#	same way, its lines become the segments of a single track.
+#========================================================================================
+def readPlacemark(element):
+	placemark = cKMLPlacemark()
+	geometries = []
+	for child in element:
+		if child.tag == KML_NAMESPACE+"name":
+			placemark.name = (child.text or "").strip()
+		elif child.tag == KML_NAMESPACE+"description":
+			placemark.description = (child.text or "").strip()
+		elif child.tag == KML_NAMESPACE+"styleUrl":
+			placemark.styleURL = child.text
+		else:
+			geometries.append(child)
+	# geometries found in a MultiGeometry are appended and picked up by this same loop
+	for geometry in geometries:
+		if geometry.tag == KML_NAMESPACE+"Point":
+			coordinates = geometry.findtext(KML_NAMESPACE+"coordinates")
+			if coordinates and coordinates.strip():
+				placemark.points.append(coordinates)
+		elif geometry.tag == KML_NAMESPACE+"LineString":
+			coordinates = geometry.findtext(KML_NAMESPACE+"coordinates")
+			if coordinates and coordinates.strip():
+				placemark.lines.append(coordinates)
+		elif geometry.tag == KML_NAMESPACE+"Polygon":
+			coordinates = geometry.findtext(KML_NAMESPACE+"outerBoundaryIs/"+KML_NAMESPACE+"LinearRing/"+KML_NAMESPACE+"coordinates")
+			if coordinates and coordinates.strip():
+				placemark.lines.append(coordinates)
+		elif geometry.tag == KML_NAMESPACE+"MultiGeometry":
+			geometries.extend(geometry)
+	return(placemark)
+#========================================================================================
+# reportSkippedPlacemark
+#	A placemark with no point or line geometry, e.g. a 3D Model, has nothing to convert
+#========================================================================================
+def reportSkippedPlacemark(placemark):
+	print(f"      Placemark: {placemark.name} no point or line found, skipping placemark")
+	return(0)
 #========================================================================================
 # processWaypoint
+#	Writes a waypoint for each point of the placemark, a MultiGeometry may have several
 #========================================================================================
-def processWaypoint(placemark,waypointGPX):
+def processWaypoint(placemark,layer):
 	print(f"      Waypoint: ", end="")
-	coordinates = placemark.find(".//{http://www.opengis.net/kml/2.2}coordinates")
-	name        = placemark.find(".//{http://www.opengis.net/kml/2.2}name")
-	description = placemark.find(".//{http://www.opengis.net/kml/2.2}description")
-	style_url   = placemark.findtext(".//{http://www.opengis.net/kml/2.2}styleUrl")
+	name        = placemark.name
+	description = placemark.description
+	style_url   = placemark.styleURL
 
 	if name is None:
 		print(f"No name found, skipping waypoint",end="")
 	else:
-		name = name.text.strip()
 		print(f"{name} ", end="")
 
-		if coordinates is None:
-			print(f" No coordinates found, skipping waypoint",end="")
+		# If it exists, add the description from the KML Placemark element
+		if description is None:
+			description = DEFAULT_WAYPOINT_DESCRIPTION
+		# add extensions elements
+		# Use styleURL tag value to extract color and icon ID
+		# New icons appear to be of this style with an icon ID and a color
+		#	<styleUrl>#icon-1577-DB4436-labelson</styleUrl>
+		# Old style icons come in two flavors, neither of which has color info
+		#	<styleUrl>#icon-1369</styleUrl>
+		#	<styleUrl>#icon-1085-labelson</styleUrl>
+		#
+		# if there is no color field (get an exception on trying to access the field)
+		# then we will use the DEFAULT_ICON_COLOR value.  If the second field contains
+		# the string "labelson" we'll also use the DEFAULT_ICON_COLOR value.
+		# print("     style URL: ",style_url)
+		if style_url:
+			style = style_url.split("-")
+			waypt = KMLToOSMAndIcon(style[1])
 		else:
-			coordinates = coordinates.text.strip().split(",")
-			longitude   = coordinates[0]
-			latitude    = coordinates[1]
-			elevation   = f"{float(coordinates[2]):.1f}"
+			waypt = KMLToOSMAndIcon("unknown")
+		if waypt.color == KMLCOLOR: # we use value from KML file
+			try:
+				if style[2] == "labelson":  # there is no color value in styleURL string
+					waypt.color = DEFAULT_ICON_COLOR
+				else:
+					waypt.color=style[2]
+			except IndexError:
+				waypt.color=DEFAULT_ICON_COLOR
+		#print(" ["+waypt.icon+","+waypt.color+","+waypt.background+"]",end="")
+
+		for coordinates in placemark.points:
+			coordinates = coordinates.strip().split(",")
+			longitude   = float(coordinates[0])
+			latitude    = float(coordinates[1])
+			elevation   = float(coordinates[2])
+			coordinateText = None
+			if repr(longitude) != coordinates[0] or repr(latitude) != coordinates[1]:
+				coordinateText = (coordinates[0], coordinates[1])
 			#print("["+latitude+","+longitude+","+elevation+"]",end="")
-			# If it exists, add the description from the KML Placemark element
-			if description is None:
-				description = DEFAULT_WAYPOINT_DESCRIPTION
-			else:
-				description = description.text.strip()
-			# add extensions elements
-			# Use styleURL tag value to extract color and icon ID
-			# New icons appear to be of this style with an icon ID and a color
-			#	<styleUrl>#icon-1577-DB4436-labelson</styleUrl>
-			# Old style icons come in two flavors, neither of which has color info
-			#	<styleUrl>#icon-1369</styleUrl>
-			#	<styleUrl>#icon-1085-labelson</styleUrl>
-			#
-			# if there is no color field (get an exception on trying to access the field)
-			# then we will use the DEFAULT_ICON_COLOR value.  If the second field contains
-			# the string "labelson" we'll also use the DEFAULT_ICON_COLOR value.
-			# print("     style URL: ",style_url)
-			if style_url:
-				style = style_url.split("-")
-				waypt = KMLToOSMAndIcon(style[1])
-			else:
-				waypt = KMLToOSMAndIcon("unknown")
-			if waypt.color == KMLCOLOR: # we use value from KML file
-				try:
-					if style[2] == "labelson":  # there is no color value in styleURL string
-						waypt.color = DEFAULT_ICON_COLOR
-					else:
-						waypt.color=style[2]
-				except IndexError:
-					waypt.color=DEFAULT_ICON_COLOR
-			#print(" ["+waypt.icon+","+waypt.color+","+waypt.background+"]",end="")
-			
 			# Add the data into the waypoint GPX file
-			waypointElement = ET.SubElement(waypointGPX, "wpt", lat=latitude, lon=longitude)
-			ET.SubElement(waypointElement,"ele").text = elevation
-			ET.SubElement(waypointElement, "name").text = name
-			ET.SubElement(waypointElement, "desc").text = description
-			extensionsElement = ET.SubElement(waypointElement,"extensions")
-			ET.SubElement(extensionsElement,"osmand:icon").text = waypt.icon
-			ET.SubElement(extensionsElement,"osmand:background").text = waypt.background
-			ET.SubElement(extensionsElement, "osmand:color").text = "#" + waypt.color
+			waypoint = cGPXWaypoint(name,description,latitude,longitude,elevation,coordinateText,waypt)
+			if layer.trackIndex is not None:
+				if layer.waypointBounds is None:
+					layer.waypointBounds = [latitude,longitude,latitude,longitude]
+				bounds = layer.waypointBounds
+				bounds[:] = [min(bounds[0],latitude),min(bounds[1],longitude),max(bounds[2],latitude),max(bounds[3],longitude)]
+			returnCode = writeLayerWaypoint(layer,waypoint)
+			if returnCode != 0:
+				return(returnCode)
 	print("")
 	return(0)
 #========================================================================================
+# parseCoordinates
+#	Parses the text of a KML coordinates element into array buffers of longitudes,
+#	latitudes and altitudes in a few passes over the whole text instead of one split
+#	per point.
+#	If any point is not a longitude,latitude,altitude triplet the points are split one
+#	at a time, which reports the bad point the same way the point by point code did.
+#
+#	GPX files get the longitudes and latitudes exactly as written in the KML file.  That
+#	is the shortest repr of the numbers for GMap KML, so the strings are only kept, as
+#	the returned coordinateText, when some of them are not (e.g. 37.50 or -122).
+#========================================================================================
+def parseCoordinates(coordinateText):
+	points = coordinateText.split()
+	if set(map(str.count, points, itertools.repeat(","))) <= {2}:
+		values = ",".join(points).split(",")
+	else:
+		values = []
+		for point in points:
+			longitude, latitude, altitude = point.split(",")
+			values += (longitude, latitude, altitude)
+	longitudes = array("d", map(float, values[0::3]))
+	latitudes = array("d", map(float, values[1::3]))
+	altitudes = array("d", map(float, values[2::3]))
+	coordinateText = None
+	if list(map(repr, longitudes)) != values[0::3] or list(map(repr, latitudes)) != values[1::3]:
+		coordinateText = (values[0::3], values[1::3])
+	return(longitudes, latitudes, altitudes, coordinateText)
+#========================================================================================
+# keepTrackPoints
+#	Reduces the track to the points with the given indexes
+#========================================================================================
+def keepTrackPoints(track,keep):
+	track.longitudes = array("d", [track.longitudes[i] for i in keep])
+	track.latitudes = array("d", [track.latitudes[i] for i in keep])
+	track.altitudes = array("d", [track.altitudes[i] for i in keep])
+	if track.coordinateText is not None:
+		longitudeText,latitudeText = track.coordinateText
+		track.coordinateText = ([longitudeText[i] for i in keep], [latitudeText[i] for i in keep])
+#========================================================================================
+# trackDistances
+#	Cumulative haversine distance in meters of each point from the first point.  The
+#	radians and cosines are computed for the whole coordinate arrays up front and the
+#	steps between points in a single pass, then summed with accumulate.
+#========================================================================================
+def trackDistances(longitudes,latitudes):
+	phis = list(map(math.radians, latitudes))
+	lambdas = list(map(math.radians, longitudes))
+	cosPhis = list(map(math.cos, phis))
+	steps = [math.asin(math.sqrt(min(1.0, math.sin((phi2 - phi1) / 2) ** 2 + cos1 * cos2 * math.sin((lambda2 - lambda1) / 2) ** 2)))
+		for phi1,phi2,cos1,cos2,lambda1,lambda2 in zip(phis, phis[1:], cosPhis, cosPhis[1:], lambdas, lambdas[1:])]
+	return(array("d", itertools.accumulate((2 * EARTH_RADIUS * step for step in steps), initial=0.0)))
+#========================================================================================
+# pointDistance
+#	Haversine distance in meters between two (latitude, longitude) points
+#========================================================================================
+def pointDistance(point1,point2):
+	phi1,phi2 = math.radians(point1[0]),math.radians(point2[0])
+	step = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(point2[1] - point1[1]) / 2) ** 2
+	return(2 * EARTH_RADIUS * math.asin(math.sqrt(min(1.0, step))))
+#========================================================================================
+# clipTrack
+#	--clip.  Cuts the track down to its runs of points inside the area, each run a track
+#	segment.  The points just outside the area at either end of a run are kept so the
+#	track reaches the edge of the area.  Returns the number of points kept.
+#========================================================================================
+def clipTrack(track,area):
+	inside = list(map(area.contains, track.latitudes, track.longitudes))
+	keep = []
+	segmentStarts = []
+	for start,end in track.segments():
+		i = start
+		while i < end:
+			if not inside[i]:
+				i += 1
+				continue
+			runStart = max(i - 1, start)
+			while i < end and inside[i]:
+				i += 1
+			segmentStarts.append(len(keep))
+			keep += range(runStart, min(i + 1, end))
+	if keep:
+		keepTrackPoints(track,keep)
+		track.segmentStarts = segmentStarts
+	return(len(track.longitudes))
+#========================================================================================
+# trackStatistics
+#	--stats.  The bounds and elevation range come from min and max over the coordinate
+#	arrays, the length from trackDistances of each segment.
+#========================================================================================
+def trackStatistics(track):
+	stats = cTrackStats()
+	stats.minLatitude,stats.maxLatitude = min(track.latitudes),max(track.latitudes)
+	stats.minLongitude,stats.maxLongitude = min(track.longitudes),max(track.longitudes)
+	stats.minElevation,stats.maxElevation = min(track.altitudes),max(track.altitudes)
+	stats.length = sum(trackDistances(track.longitudes[start:end], track.latitudes[start:end])[-1] for start,end in track.segments())
+	stats.countPoints = len(track.longitudes)
+	stats.countSegments = len(track.segmentStarts)
+	return(stats)
+#========================================================================================
+# storeTrackIndexEntry
+#	Adds a track to its layer's --stats index.  A worker process keeps the entry in
+#	deferredOutput so the entries are added in KML order by the main process.  A
+#	--combine track's file is the layer's combined file it was just added to.
+#========================================================================================
+def storeTrackIndexEntry(layerFolderName,entry):
+	if deferredOutput is not None:
+		deferredOutput.append((storeTrackIndexEntry,(layerFolderName,entry)))
+		return
+	layer = indexedLayers[layerFolderName]
+	if entry["file"] is None:
+		entry["file"] = os.path.basename(combinedFileName(layer))
+	layer.trackIndex.append(entry)
+#========================================================================================
+# trackIndexEntry
+#========================================================================================
+def trackIndexEntry(track,fileName):
+	stats = track.stats
+	return({
+		"name":		track.name,
+		"file":		None if fileName is None else os.path.basename(fileName),
+		"points":	stats.countPoints,
+		"segments":	stats.countSegments,
+		"length":	round(stats.length, 1),
+		"bounds":	stats.bounds(),
+		"minele":	stats.minElevation,
+		"maxele":	stats.maxElevation,
+	})
+#========================================================================================
+# splitTrackSegments
+#	-s distance.  Starts a new track segment at the first point of each interval of
+#	interval meters along every segment of the track.  That point also ends the previous
+#	segment so the track has no gaps.  Returns the number of segments.
+#========================================================================================
+def splitTrackSegments(track,interval):
+	keep = []
+	segmentStarts = []
+	for start,end in track.segments():
+		distances = trackDistances(track.longitudes[start:end], track.latitudes[start:end])
+		intervals = [int(distance // interval) for distance in distances]
+		boundaries = [i for i in range(1, end - start - 1) if intervals[i] != intervals[i - 1]]
+		segmentStart = 0
+		for boundary in boundaries + [end - start - 1]:
+			segmentStarts.append(len(keep))
+			keep += range(start + segmentStart, start + boundary + 1)
+			segmentStart = boundary
+	keepTrackPoints(track,keep)
+	track.segmentStarts = segmentStarts
+	return(len(segmentStarts))
+#========================================================================================
+# sliceTrack
+#	Returns the points start to end of the track as a new track with the same OSMAnd
+#	extensions.  Segments with fewer than 2 points in the slice are left out.
+#========================================================================================
+def sliceTrack(track,start,end,name):
+	coordinateText = None
+	if track.coordinateText is not None:
+		coordinateText = (track.coordinateText[0][start:end], track.coordinateText[1][start:end])
+	piece = cGPXTrack(name,track.description,track.longitudes[start:end],track.latitudes[start:end],track.altitudes[start:end],coordinateText)
+	piece.segmentStarts = [max(segmentStart,start) - start for segmentStart,segmentEnd in track.segments()
+		if min(segmentEnd,end) - max(segmentStart,start) >= 2] or [0]
+	piece.extensions = track.extensions
+	return(piece)
+#========================================================================================
+# trackPieces
+#	Returns the tracks to write for a track.  With --split-files each segment is a
+#	track of its own, with --max-points tracks are cut every N points, each piece
+#	starting with the last point of the piece before.  Pieces are named <name> 1,
+#	<name> 2, ... when there is more than one.
+#========================================================================================
+def trackPieces(track,args):
+	ranges = list(track.segments()) if args.split_files else [(0, len(track.longitudes))]
+	if args.max_points is not None:
+		step = args.max_points - 1
+		ranges = [(pieceStart, min(pieceStart + args.max_points, end))
+			for start,end in ranges for pieceStart in range(start, max(end - 1, start + 1), step)]
+	if len(ranges) == 1 and ranges[0] == (0, len(track.longitudes)):
+		return([track])
+	return([sliceTrack(track, start, end, f"{track.name} {number}") for number,(start,end) in enumerate(ranges, start=1)])
+#========================================================================================
+# simplifyTrack
+#	Douglas-Peucker line simplification.  Returns the indexes of the points to keep, the
+#	first and last points are always kept.  Points are projected onto a local flat plane
+#	in meters once, up front, into array buffers.  The ranges still to be checked are
+#	kept on a stack instead of recursing, so very long tracks can't overflow the stack.
+#========================================================================================
+def simplifyTrack(longitudes,latitudes,tolerance):
+	countPoints = len(longitudes)
+	if countPoints < 3:
+		return(list(range(countPoints)))
+	scaleX = math.radians(EARTH_RADIUS) * math.cos(math.radians(sum(latitudes) / countPoints))
+	scaleY = math.radians(EARTH_RADIUS)
+	x = array("d", [longitude * scaleX for longitude in longitudes])
+	y = array("d", [latitude * scaleY for latitude in latitudes])
+
+	keep = bytearray(countPoints)
+	keep[0] = keep[-1] = 1
+	toleranceSquared = tolerance * tolerance
+	ranges = [(0, countPoints - 1)]
+	while ranges:
+		first,last = ranges.pop()
+		if last - first < 2:
+			continue
+		x0, y0 = x[first], y[first]
+		dx, dy = x[last] - x0, y[last] - y0
+		lengthSquared = dx*dx + dy*dy
+		# squared distance of each point in the range to the segment first-last
+		maxDistance = -1.0
+		for i in range(first + 1, last):
+			px, py = x[i] - x0, y[i] - y0
+			t = (px*dx + py*dy) / lengthSquared if lengthSquared > 0 else 0.0
+			if t < 0.0:
+				t = 0.0
+			elif t > 1.0:
+				t = 1.0
+			ex, ey = px - t*dx, py - t*dy
+			distance = ex*ex + ey*ey
+			if distance > maxDistance:
+				maxDistance, farthest = distance, i
+		if maxDistance > toleranceSquared:
+			keep[farthest] = 1
+			ranges.append((first, farthest))
+			ranges.append((farthest, last))
+	return([i for i in range(countPoints) if keep[i]])
+#========================================================================================
 # processTrack
+#	With --bbox or --near the track's coordinates are parsed first, returning
+#	TRACK_OUTSIDE_AREA without any output when none of its points is in the area.
+#	The area test is done here, in the worker process with -j, so the coordinates are
+#	only parsed once.
 #========================================================================================
 def processTrack(placemark,args,layerFolderName):
+	returnCode = 0
+	wallStart,cpuStart = time.perf_counter(),time.process_time()
+	coordinates = None
+	if args.area is not None:
+		coordinates = parseCoordinates(" ".join(placemark.lines))
+		if not args.area.containsAny(coordinates[1],coordinates[0]):
+			return(TRACK_OUTSIDE_AREA)
 	print(f"      Track:    ",end="")
 
-	coordinates = placemark.find(".//{http://www.opengis.net/kml/2.2}coordinates")
-	name        = placemark.find(".//{http://www.opengis.net/kml/2.2}name")
-	description = placemark.find(".//{http://www.opengis.net/kml/2.2}description")
+	name        = placemark.name
+	description = placemark.description
 
 	if name is None:
 		print("No name found, skipping track",end="")
 	else:
-		name = name.text.strip()
 		print(name+" ", end="")
 
-		if coordinates is None:
+		if not placemark.lines:
 			print("No coordinates found, skipping track",end="")
 		else:
 			if description is None:
 				description = DEFAULT_TRACK_DESCRIPTION
-			else:
-				description = description.text.strip()
 			#print("description:>>>"+description+"<<<")
-			GPXElement = addGPXElement()
-			metadataElement   = ET.SubElement(GPXElement,"metadata")
-			ET.SubElement(metadataElement, "desc").text = description
-			trackElement = ET.SubElement(GPXElement,"trk")
-			ET.SubElement(trackElement, "name").text = name
-			coordinates = coordinates.text.strip().split()
-			trksegElement = ET.SubElement(trackElement, "trkseg")
-			# Iterate over the coordinates and create GPX trackpoints
-			for coordinate in coordinates:
-				longitude, latitude, altitude = coordinate.split(",")
-				trackpointElement = ET.SubElement(trksegElement,"trkpt", lat=latitude, lon=longitude)
-				if altitude is not None:
-					ET.SubElement(trackpointElement, "ele").text = f"{float(altitude):.1f}"
+			if coordinates is None:
+				coordinates = parseCoordinates(" ".join(placemark.lines))
+			track = cGPXTrack(name,description,*coordinates)
+			if len(placemark.lines) > 1:
+				# MultiGeometry, each line is a track segment
+				track.segmentStarts = list(itertools.accumulate((len(line.split()) for line in placemark.lines[:-1]), initial=0))
+			if args.clip:
+				countPoints = len(track.longitudes)
+				print(f"(clipped {countPoints} -> {clipTrack(track,args.area)} points) ", end="")
+			countPoints = len(track.longitudes)
+			if args.simplify is not None:
+				keep = []
+				segmentStarts = []
+				for start,end in track.segments():
+					segmentStarts.append(len(keep))
+					keep += [start + i for i in simplifyTrack(track.longitudes[start:end], track.latitudes[start:end], args.simplify)]
+				keepTrackPoints(track,keep)
+				track.segmentStarts = segmentStarts
+				print(f"(simplified {countPoints} -> {len(keep)} points, {countPoints - len(keep)} removed) ", end="")
+			if args.split == SPLIT_TYPE_DISTANCE:
+				#args.interval is in miles, convert to meters
+				countSegments = splitTrackSegments(track,float(args.interval) * 1609.34)
+				print(f"({countSegments} segments) ", end="")
 			#   <styleUrl>#line-0F9D58-1000</styleUrl>
 			#               [0]   [1]    [2]
 			#                    color width
 			#Color is standard RGB color with no transparency
 			#Line width is 1000-32000.  This maps to 1.0-24.0 for OSMAnd line width
-			style_url = placemark.findtext(".//{http://www.opengis.net/kml/2.2}styleUrl")
+			width = None
+			style_url = placemark.styleURL
 			if style_url:
 				style = style_url.split("-")
 				color = style[1]
@@ -768,101 +2378,581 @@ def processTrack(placemark,args,layerFolderName):
 			#print(" color: ",color,end="")
 			#print(" width: ",width,end="")
 
-			extensionsElement = ET.SubElement(GPXElement,"extensions")
-			ET.SubElement(extensionsElement, "osmand:color").text = color
+			extensions = track.extensions
+			extensions.append(("osmand:color", color))
 			# if a width is specified in the command line it is used for every track width,
 			# overriding any value specified in the KML file
 			if args.width is not None:
 				width = str(args.width)
-			ET.SubElement(extensionsElement, "osmand:width").text = width
-			ET.SubElement(extensionsElement, "osmand:show_arrows").text = str(args.arrows).lower()
-			ET.SubElement(extensionsElement, "osmand:show_start_finish").text = str(args.ends).lower()
-			ET.SubElement(extensionsElement, "osmand:split_type").text = args.split
+			if width is not None:
+				extensions.append(("osmand:width", width))
+			extensions.append(("osmand:show_arrows", str(args.arrows).lower()))
+			extensions.append(("osmand:show_start_finish", str(args.ends).lower()))
+			extensions.append(("osmand:split_type", args.split))
 			#??? Can't get OSMAnd to recognize these extensions. If I activate them manually in OSMAnd and then export
 			# the GPX file it appears to be the same tags in the same element. Arrows and ends work fine.
+			# Distance splits are also made as track segments above.  GMap KML has no point times, so time
+			# splits are left to these extensions.
 			if args.split == SPLIT_TYPE_TIME:
 				#split time is in seconds and args.interval is in minutes, so convert.
-				ET.SubElement(extensionsElement, "osmand:split_interval").text = str(int(float(args.interval) * 60))
+				extensions.append(("osmand:split_interval", str(int(float(args.interval) * 60))))
 			elif args.split == SPLIT_TYPE_DISTANCE:
 				#split interval is in meters and args.interval is in miles, so convert miles to meters
-				ET.SubElement(extensionsElement, "osmand:split_interval").text = f"{(float(args.interval) * 1609.34):.2f}"
-			# Write track to a GPX file.  
-			# Track file names are taken from the track name which may contain illegal finename characters.
-			# Strip out these illegal characters.  Allow all alpha numerics and characters from allowedChars
-			allowedChars = " ._-"
-			name = "".join(i for i in name if (i.isalnum() or i in allowedChars))
-			#print("  name: ",name,end="")
-			filename = os.path.join(layerFolderName, name+'.gpx')
-			#print("  Writing track to file: ",filename,end="")
-			returnCode = writeGPXFile(GPXElement,filename)
+				extensions.append(("osmand:split_interval", f"{(float(args.interval) * 1609.34):.2f}"))
+			pieces = trackPieces(track,args)
+			if len(pieces) > 1:
+				print(f"({len(pieces)} files) ", end="")
+			if args.stats:
+				for piece in pieces:
+					piece.stats = trackStatistics(piece)
+			outputSize = 0
+			if args.combine:
+				# Add the track to the layer's combined GPX file
+				try:
+					with profileStage("write"):
+						for piece in pieces:
+							f = io.StringIO()
+							cGPXWriter(f,fragment=True).writeCombinedTrack(piece)
+							storeCombinedTrack(layerFolderName,f.getvalue())
+							if args.stats:
+								storeTrackIndexEntry(layerFolderName,trackIndexEntry(piece,None))
+							outputSize += len(f.getvalue().encode("utf-8"))
+					if runProfile is not None:
+						runProfile.addTrack(name,layerFolderName,countPoints,outputSize,wallStart,cpuStart)
+				except OSError as e:
+					printError(f"  Error: An unexpected error occurred writing combined GPX file: {str(e)}")
+					returnCode = 10
+			else:
+				# Write track to a GPX file.  
+				for piece in pieces:
+					filename = trackFileName(piece.name,layerFolderName)
+					#print("  Writing track to file: ",filename,end="")
+					try:
+						with profileStage("write"):
+							with openOutputFile(filename,args.archive is not None) as f:
+								gpxWriter = cGPXWriter(f)
+								gpxWriter.writeTrack(piece)
+								gpxWriter.close()
+						outputSize += outputFileSize(f)
+						if args.stats:
+							storeTrackIndexEntry(layerFolderName,trackIndexEntry(piece,filename))
+					except OSError as e:
+						printError(f"  Error: An unexpected error occurred writing GPX file: {filename} {str(e)}")
+						returnCode = 10
+						break
+				if runProfile is not None and returnCode == 0:
+					runProfile.addTrack(name,layerFolderName,countPoints,outputSize,wallStart,cpuStart)
 	print("")
 	return(returnCode)
 #========================================================================================
-# 
+# startLayer
+#	Sets up a new layer.  In layers mode a subfolder named after the layer is created
+#	under GPX_path, otherwise all files are placed at the GPX_path level.
+#	Every layer gets a folder of its own, a layer with the same name as an earlier
+#	layer, e.g. nested Folders both named Trails, is put in "Trails (2)" and so on, so
+#	one layer's files never overwrite another's.
 #========================================================================================
-def processLayer(element,args):
-	global countTotalTracks
-	global countTotalWaypoints
+def startLayer(layerName,args):
 	global countTotalLayers
-	returnCode = 0
-	countLayerTracks = 0
-	countLayerWaypoints = 0
+	# report the previous layer's tracks before this layer's output
+	returnCode = drainPlacemarks()
+	if returnCode != 0:
+		return(returnCode,None)
 	countTotalLayers += 1
 
-	# all waypoints get put into the same GPX file
-	waypointGPX = addGPXElement()
 	if args.layers:
-		# Extract the layer name from the KML file
-		layerName = element.find('{http://www.opengis.net/kml/2.2}name').text
-		layerFolderName = os.path.join(args.GPX_path, Path(args.GPX_path).stem+"-"+layerName)
+		if layerName is None:
+			layerName = f"Layer {countTotalLayers}"
 		layerFolderName = os.path.join(args.GPX_path, layerName)
+		count = 1
+		while os.path.normcase(layerFolderName) in layerFolderNames:
+			count += 1
+			layerFolderName = os.path.join(args.GPX_path, f"{layerName} ({count})")
+		layerFolderNames.add(os.path.normcase(layerFolderName))
 		print(f"    Layer #{countTotalLayers:>2}    layer: {layerName}")
 		print(f"      Output directory: {layerFolderName}")
 		# Create a subdirectory for the layer's GPX files
 		try:
-			os.makedirs(layerFolderName, exist_ok=True)
+			if args.archive is None:
+				os.makedirs(layerFolderName, exist_ok=True)
 		except Exception as e:
-			print(f"      ERROR: An unexpected error occurred creating layer GPX file directory: {str(e)}")
-			return(10)
+			printError(f"      ERROR: An unexpected error occurred creating layer GPX file directory: {str(e)}")
+			return(10,None)
 	else:
 		# All files are placed at the GPX_path level, no subfolders
 		layerFolderName = args.GPX_path
+	layer = cLayer(layerName,layerFolderName,args)
+	if args.combine:
+		combinedLayers[layerFolderName] = layer
+	if args.stats:
+		indexedLayers[layerFolderName] = layer
+		if args.incremental:
+			layer.previousTrackIndex = loadLayerIndex(layerFolderName)
+	return(0,layer)
+#========================================================================================
+# loadLayerIndex
+#	Returns the tracks of the layer index file written by the last run by file name,
+#	the entries of the tracks -u leaves unchanged are taken from it
+#========================================================================================
+def loadLayerIndex(layerFolderName):
+	try:
+		with open(os.path.join(layerFolderName, LAYER_INDEX_FILE_NAME), "r", encoding="utf-8") as f:
+			return({entry["file"]:entry for entry in json.load(f)["tracks"]})
+	except (OSError, ValueError, KeyError, TypeError):
+		return({})
+#========================================================================================
+# processPlacemark
+#	The placemark's geometry decides whether it is a track or waypoints.  A placemark
+#	with lines is a track, any points in it are ignored.
+#
+#	Without a worker pool placemarks are converted in place.  With a pool, tracks are
+#	sent to the pool and waypoints are converted here, each with its console output
+#	captured.  The results are reported by drainPlacemarks in KML order, so the output,
+#	counts and return code are the same as a sequential run.
+#========================================================================================
+def processPlacemark(element,args,layer):
+	placemark = readPlacemark(element)
+	if args.area is not None and not placemarkInArea(placemark,args.area):
+		return(countOutsidePlacemark(layer))
+	manifestEntry = None
+	runInPool = False
+	if placemark.lines:
+		counts = (1,0)
+		if args.incremental:
+			manifestEntry = trackManifestEntry(element,placemark.name,args,layer.folderName)
+		if manifestEntry is not None and isOutputUnchanged(manifestEntry,args):
+			# GPX file is already up to date
+			function,functionArgs = reportUnchangedTrack,(placemark,)
+		else:
+			function,functionArgs = processTrack,(placemark,args,layer.folderName)
+			runInPool = True
+	elif placemark.points:
+		counts = (0,len(placemark.points))
+		function,functionArgs = processWaypoint,(placemark,layer)
+	else:
+		counts = (0,0)
+		function,functionArgs = reportSkippedPlacemark,(placemark,)
 
-	for placemark in element.findall(".//{http://www.opengis.net/kml/2.2}Placemark"):
-		if placemark.find(".//{http://www.opengis.net/kml/2.2}Point") is not None:
-			returnCode = processWaypoint(placemark,waypointGPX)
-			if returnCode != 0:
-				return(returnCode)
-			countLayerWaypoints += 1
-			countTotalWaypoints += 1
-		elif placemark.findall(".//{http://www.opengis.net/kml/2.2}LineString") is not None:
-			returnCode = processTrack(placemark,args,layerFolderName)
-			if returnCode != 0:
-				break	# error in processing track, stop further processing
-			countLayerTracks += 1
-			countTotalTracks += 1
-
-	if countLayerWaypoints > 0:
-		# Write waypoints to a GPX file
-		waypointFileName = os.path.join(layerFolderName, "WayPts.gpx")
-		print(f"      Writing waypoints to file: {waypointFileName}")
-		returnCode = writeGPXFile(waypointGPX,waypointFileName)
+	if trackPool is None:
+		returnCode = function(*functionArgs)
+		if returnCode == TRACK_OUTSIDE_AREA:
+			return(countOutsidePlacemark(layer))
+		if returnCode == 0:
+			countPlacemark(layer,counts,manifestEntry)
+		return(returnCode)
+	if runInPool:
+		future = trackPool.submit(convertTrack,placemark,args,layer.folderName)
+	else:
+		future = concurrent.futures.Future()
+		future.set_result(captureOutput(function,*functionArgs) + (None,[]))
+	pendingPlacemarks.append((layer,counts,manifestEntry,future))
+	return(drainPlacemarks(args.jobs * PENDING_TRACKS_PER_JOB))
+#========================================================================================
+# placemarkInArea
+#	--bbox and --near.  The waypoints outside the area are dropped from the placemark
+#	before it is converted.  Tracks are left to processTrack, which parses their
+#	coordinates anyway, and an unchanged -u track was in the same area last run.
+#========================================================================================
+def placemarkInArea(placemark,area):
+	if placemark.lines or not placemark.points:
+		# a track, or reported as skipped
+		return(True)
+	points = []
+	for point in placemark.points:
+		coordinates = point.strip().split(",")
+		if area.contains(float(coordinates[1]), float(coordinates[0])):
+			points.append(point)
+	placemark.points = points
+	return(len(points) > 0)
+#========================================================================================
+# countOutsidePlacemark
+#========================================================================================
+def countOutsidePlacemark(layer):
+	global countTotalOutside
+	layer.countOutside += 1
+	countTotalOutside += 1
+	return(0)
+#========================================================================================
+# countPlacemark
+#	counts is the (tracks, waypoints) converted from the placemark
+#========================================================================================
+def countPlacemark(layer,counts,manifestEntry):
+	global countTotalTracks
+	global countTotalWaypoints
+	if manifestEntry is not None:
+		newManifest[manifestEntry[0]] = manifestEntry[1]
+		if layer.trackIndex is not None:
+			# a converted track has just been added to the index, an unchanged one keeps
+			# its entry from the last run
+			fileName = os.path.basename(manifestEntry[0])
+			if not layer.trackIndex or layer.trackIndex[-1]["file"] != fileName:
+				if fileName in layer.previousTrackIndex:
+					layer.trackIndex.append(layer.previousTrackIndex[fileName])
+	countTracks,countWaypoints = counts
+	layer.countTracks += countTracks
+	countTotalTracks += countTracks
+	layer.countWaypoints += countWaypoints
+	countTotalWaypoints += countWaypoints
+#========================================================================================
+# drainPlacemarks
+#	Reports finished placemarks in KML order.  Waits until no more than maxPending are
+#	left in flight.  On the first error the remaining placemarks are cancelled.
+#========================================================================================
+def drainPlacemarks(maxPending=0):
+	while pendingPlacemarks and (len(pendingPlacemarks) > maxPending or pendingPlacemarks[0][3].done()):
+		layer,counts,manifestEntry,future = pendingPlacemarks.popleft()
+		with profileStage("wait"):
+			returnCode,output,workerProfile,workerOutput = future.result()
+		if workerProfile is not None:
+			runProfile.merge(workerProfile)
+		try:
+			with profileStage("write"):
+				for function,functionArgs in workerOutput:
+					function(*functionArgs)
+		except OSError as e:
+			print(output,end="")
+			printError(f"  Error: An unexpected error occurred writing GPX file: {str(e)}")
+			cancelPlacemarks()
+			return(10)
+		print(output,end="")
+		if returnCode == TRACK_OUTSIDE_AREA:
+			countOutsidePlacemark(layer)
+			continue
+		if returnCode != 0:
+			cancelPlacemarks()
+			return(returnCode)
+		countPlacemark(layer,counts,manifestEntry)
+	return(0)
+#========================================================================================
+# cancelPlacemarks
+#========================================================================================
+def cancelPlacemarks():
+	for layer,counts,manifestEntry,future in pendingPlacemarks:
+		future.cancel()
+	pendingPlacemarks.clear()
+#========================================================================================
+# printError
+#	Prints an error message and records it for the convert() result.  A worker process
+#	keeps the message in deferredOutput for the main process to record.
+#========================================================================================
+def printError(message):
+	print(message)
+	recordError(message.strip())
+
+def recordError(message):
+	if deferredOutput is not None:
+		deferredOutput.append((recordError,(message,)))
+	elif conversionErrors is not None:
+		conversionErrors.append(message)
+#========================================================================================
+# captureOutput
+#	Calls function and returns its return code along with everything it printed
+#========================================================================================
+def captureOutput(function,*functionArgs):
+	output = io.StringIO()
+	with contextlib.redirect_stdout(output):
+		returnCode = function(*functionArgs)
+	return(returnCode,output.getvalue())
+#========================================================================================
+# convertTrack
+#	Worker process entry point for a track.  With --profile the track's profile is
+#	returned with its output, to be merged into the main profile.  With --archive or
+#	--combine the GPX output is returned to be stored by the main process.
+#========================================================================================
+def convertTrack(placemark,args,layerFolderName):
+	global runProfile
+	global deferredOutput
+	runProfile = cRunProfile() if args.profile else None
+	deferredOutput = []
+	with profileStage("convert"):
+		returnCode,output = captureOutput(processTrack,placemark,args,layerFolderName)
+	return(returnCode,output,runProfile,deferredOutput)
+#========================================================================================
+# finishLayer
+#	Writes out the layer's waypoints and prints the layer counts
+#========================================================================================
+def finishLayer(layer,args):
+	returnCode = drainPlacemarks()
+	if returnCode != 0:
+		return(returnCode)
+	if layer.combine:
+		try:
+			with profileStage("write",layer):
+				if layer.waypointWriter is not None or layer.combinedTracks:
+					writeCombinedFile(layer,lastFile=True)
+				del combinedLayers[layer.folderName]
+				layer.waypointWriter = None
+				layer.waypointFile = None
+		except OSError as e:
+			printError(f"  Error: An unexpected error occurred writing combined GPX file: {str(e)}")
+			return(10)
+		for fileName in layer.combinedFileNames:
+			print(f"      Writing combined GPX file: {fileName}")
+	elif layer.waypointWriter is not None:
+		# Finish off the waypoint GPX file
+		try:
+			with profileStage("write",layer):
+				layer.waypointWriter.close()
+				layer.waypointFile.close()
+				if runProfile is not None:
+					runProfile.bytesWritten += outputFileSize(layer.waypointFile)
+				layer.waypointWriter = None
+				layer.waypointFile = None
+				if layer.incremental:
+					replaceWaypointFile(layer,args)
+				else:
+					print(f"      Writing waypoints to file: {layer.waypointFileName}")
+		except OSError as e:
+			printError(f"  Error: An unexpected error occurred writing GPX file: {layer.waypointFileName} {str(e)}")
+			return(10)
+	if layer.trackIndex is not None:
+		returnCode = writeLayerIndex(layer)
 		if returnCode != 0:
 			return(returnCode)
 
-	print(f"      Waypoints: {countLayerWaypoints:>3}")
-	print(f"      Tracks:    {countLayerTracks:>3}")
+	print(f"      Waypoints: {layer.countWaypoints:>3}")
+	print(f"      Tracks:    {layer.countTracks:>3}")
+	if args.area is not None:
+		print(f"      Outside area: {layer.countOutside:>3}")
 	return(0)
 #========================================================================================
-# Main
+# writeLayerIndex
+#	--stats.  Writes the summary of the layer's GPX files, its waypoints and the
+#	statistics of each of its tracks, to the layer index file.
 #========================================================================================
-def main():
+def writeLayerIndex(layer):
+	del indexedLayers[layer.folderName]
+	waypoints = None
+	if layer.waypointBounds is not None:
+		minLatitude,minLongitude,maxLatitude,maxLongitude = layer.waypointBounds
+		waypoints = {
+			"file":		os.path.basename(layer.combinedFileNames[-1] if layer.combine else layer.waypointFileName),
+			"count":	layer.countWaypoints,
+			"bounds":	{"minlat":minLatitude, "minlon":minLongitude, "maxlat":maxLatitude, "maxlon":maxLongitude},
+		}
+	index = {"layer":layer.name, "waypoints":waypoints, "tracks":layer.trackIndex}
+	fileName = os.path.join(layer.folderName, LAYER_INDEX_FILE_NAME)
+	try:
+		with profileStage("write",layer):
+			with openOutputFile(fileName,layer.archive) as f:
+				json.dump(index, f, indent=1, ensure_ascii=False)
+				f.write("\n")
+	except OSError as e:
+		printError(f"  Error: An unexpected error occurred writing layer index file: {fileName} {str(e)}")
+		return(10)
+	print(f"      Writing layer index: {fileName}")
+	return(0)
+#========================================================================================
+# replaceWaypointFile
+#	With --incremental, replaces the layer's waypoint file with the temporary file just
+#	written only if its content changed
+#========================================================================================
+def replaceWaypointFile(layer,args):
+	tempFileName = waypointOutputFileName(layer)
+	waypointHash = hashlib.sha1()
+	with open(tempFileName,"rb") as f:
+		for chunk in iter(lambda: f.read(KML_CHUNK_SIZE), b""):
+			waypointHash.update(chunk)
+	manifestEntry = (manifestKey(layer.waypointFileName,args), waypointHash.hexdigest())
+	if isOutputUnchanged(manifestEntry,args):
+		os.remove(tempFileName)
+		print(f"      Waypoints unchanged: {layer.waypointFileName}")
+	else:
+		os.replace(tempFileName,layer.waypointFileName)
+		print(f"      Writing waypoints to file: {layer.waypointFileName}")
+	newManifest[manifestEntry[0]] = manifestEntry[1]
+#========================================================================================
+# nextKMLEvent
+#	Returns (return code, event, element) of the next KML event, event is None at the
+#	end of the KML data.  Only reading the KML data is reported as a read error here,
+#	errors writing the GPX files are reported where they are written.
+#========================================================================================
+def nextKMLEvent(events):
+	try:
+		event, element = next(events)
+	except StopIteration:
+		return(0,None,None)
+	except ET.ParseError as e:
+		printError(f"  ERROR: Invalid KML data: {str(e)}")
+		return(11,None,None)
+	except OSError as e:
+		# includes network errors while the KML data is still downloading
+		printError(f"  ERROR: An unexpected error occurred reading KML data: {str(e)}")
+		return(12,None,None)
+	return(0,event,element)
+#========================================================================================
+# processKMLStream
+#	Incrementally parses the KML data from an iterator of byte chunks.  Each Placemark is
+#	converted as soon as its end tag arrives and is then cleared and detached from its
+#	parent, so memory use stays flat no matter how big the map is.  When the chunks come
+#	from the download, conversion overlaps with the network transfer.
+#
+#	In layers mode every Folder is a layer.  A placemark belongs to the innermost Folder
+#	that contains it and is converted exactly once, layers mode is the same single pass
+#	over the KML data as flat mode.  Layers are started when their name arrives, which in GMap KML
+#	always precedes the layer's placemarks.
+#========================================================================================
+def processKMLStream(KMLChunks,args):
+	returnCode = 0
+	elementStack = []	# open elements, used to find the parent of each closed element
+	layerStack = []		# open layers, None until the layer has been started
+	mapName = None
+
+	if not args.layers:
+		# All placemarks in the KML file go into one layer at the GPX_path level
+		returnCode,layer = startLayer(None,args)
+		if returnCode != 0:
+			return(returnCode)
+		layerStack.append(layer)
+
+	try:
+		events = iterKMLEvents(KMLChunks)
+		while True:
+			returnCode,event,element = nextKMLEvent(events)
+			if returnCode != 0 or event is None:
+				break
+			if cancelEvent is not None and cancelEvent.is_set():
+				print("  Conversion cancelled, GPX files written so far may be incomplete")
+				return(16)
+			if event == "start":
+				elementStack.append(element)
+				if args.layers and element.tag == KML_NAMESPACE+"Folder":
+					layerStack.append(None)
+				continue
+
+			elementStack.pop()
+			parent = elementStack[-1] if elementStack else None
+			if element.tag == KML_NAMESPACE+"name" and parent is not None:
+				if parent.tag == KML_NAMESPACE+"Document" and mapName is None:
+					mapName = (element.text or "").strip()
+					print(f"  Map: {mapName}")
+					print(f"  ID:  {args.map_id}")
+				elif args.layers and parent.tag == KML_NAMESPACE+"Folder" and layerStack[-1] is None:
+					returnCode,layerStack[-1] = startLayer((element.text or "").strip(),args)
+			elif element.tag == KML_NAMESPACE+"Placemark":
+				if layerStack:
+					if layerStack[-1] is None:
+						# Folder without a name
+						returnCode,layerStack[-1] = startLayer(None,args)
+					if returnCode == 0:
+						with profileStage("convert",layerStack[-1]):
+							returnCode = processPlacemark(element,args,layerStack[-1])
+				# Placemarks outside of any layer are ignored in layers mode
+				element.clear()
+				if parent is not None:
+					parent.remove(element)
+			elif args.layers and element.tag == KML_NAMESPACE+"Folder":
+				# a layer stays on the stack until it has finished, see below
+				if layerStack[-1] is not None:
+					returnCode = finishLayer(layerStack[-1],args)
+				if returnCode == 0:
+					layerStack.pop()
+				element.clear()
+			if returnCode != 0:
+				return(returnCode)	# error in processing, stop further processing
+
+		if returnCode == 0 and not args.layers:
+			returnCode = finishLayer(layerStack[-1],args)
+			if returnCode == 0:
+				layerStack.pop()
+	finally:
+		cancelPlacemarks()
+		# close the waypoint files of the layers left unfinished when processing stopped
+		# early and remove their -u temporary files
+		for layer in layerStack:
+			if layer is not None:
+				discardWaypointFile(layer)
+	return(returnCode)
+#========================================================================================
+# discardWaypointFile
+#========================================================================================
+def discardWaypointFile(layer):
+	if layer.waypointFile is not None:
+		layer.waypointFile.close()
+	if layer.incremental:
+		try:
+			os.remove(waypointOutputFileName(layer))
+		except FileNotFoundError:
+			pass
+		except OSError as e:
+			print(f"  WARNING: Unable to remove temporary waypoint file: {str(e)}")
+#========================================================================================
+# iterKMLEvents
+#	Feeds the byte chunks into a pull parser and yields the start/end events as soon
+#	as each chunk has been parsed.
+#========================================================================================
+def iterKMLEvents(KMLChunks):
+	parser = ET.XMLPullParser(events=("start","end"))
+	KMLChunks = iter(KMLChunks)
+	while True:
+		with profileStage("fetch"):
+			chunk = next(KMLChunks, None)
+		if chunk is None:
+			break
+		with profileStage("parse"):
+			parser.feed(chunk)
+			events = list(parser.read_events())
+		if runProfile is not None:
+			runProfile.KMLBytes += len(chunk)
+		yield from events
+	with profileStage("parse"):
+		parser.close()
+		events = list(parser.read_events())
+	yield from events
+#========================================================================================
+# openKMLFile
+#	Opens a local KML file, or stdin if the file name is -, for processKMLStream
+#========================================================================================
+def openKMLFile(args):
+	args.kmlSource = "file"
+	if args.kml_file == "-":
+		return(0,readKMLChunks(sys.stdin.buffer))
+	try:
+		KMLStream = open(args.kml_file,"rb")
+	except Exception as e:
+		printError(f"  ERROR: Unable to open KML file: {args.kml_file} {str(e)}")
+		return(12,None)
+	return(0,readKMLChunks(KMLStream))
+#========================================================================================
+# startConversion
+#	Resets the counts, layers and -u manifests of the last map before a map is converted.  Also used
+#	by GoogleMapToOSMAndGPX-bench.py to run processKMLStream on its own.
+#========================================================================================
+def startConversion(args):
 	global countTotalTracks
 	global countTotalWaypoints
 	global countTotalLayers
+	global countTotalOutside
+	global iconTable
+	global runProfile
+	global layerFolderNames
+	global outputManifest
 
-	# Parse the command line arguments
-	args = setupParseCmdLine()
+	countTotalTracks = 0
+	countTotalWaypoints = 0
+	countTotalLayers = 0
+	countTotalOutside = 0
+	layerFolderNames = set()
+	combinedLayers.clear()
+	indexedLayers.clear()
+	outputManifest = {}
+	newManifest.clear()
+	iconTable = iconDictionary
+	runProfile = cRunProfile() if args.profile else None
+	args.kmlSource = None
+	args.area = cAreaFilter(args.bbox,args.near) if args.bbox is not None or args.near is not None else None
+#========================================================================================
+# convertMap
+#	Converts one map.  fetchedKML is the result of fetchBatchMap when the map has already
+#	been downloaded in batch mode, otherwise the KML data is read here.
+#========================================================================================
+def convertMap(args,fetchedKML=None):
+	global trackPool
+	global runProfile
+	global outputArchive
+
+	wallStart,cpuStart = time.perf_counter(),time.process_time()
+	startConversion(args)
 
 	layerFolderPrefix = args.GPX_path
 
@@ -881,55 +2971,649 @@ def main():
 	print("  Track split interval:   ", args.interval)
 	print("  Track start/end icons:  ", args.ends)
 	print("  Track direction arrows: ", args.arrows)
+	print("  Icon file:              ", args.icons)
+	print("  Track worker processes: ", args.jobs)
+	if args.kml_file is None:
+		print("  KML cache:              ", "off" if args.no_cache else args.cache_dir)
+		print("  Offline:                ", args.offline)
+	print("  Incremental:            ", args.incremental)
+	print("  Archive:                ", args.archive)
+	print("  Profile:                ", args.profile)
 	print("")
-	print("  Get map KML data")
-	returnCode,KMLData = getMapKMLData(args)
-	#print(KMLData)
+	returnCode = 0
+	if args.icons is not None:
+		returnCode = loadIconFile(args.icons)
 	if returnCode == 0:
-		# Parse the KML data
-		tree = ET.ElementTree(ET.fromstring(KMLData))
-		root = tree.getroot()
-		mapName = root.find(".//{http://www.opengis.net/kml/2.2}name").text
-		print(f"  Map: {mapName}")
-		print(f"  ID:  {args.map_id}")
-
+		if fetchedKML is not None:
+			returnCode,KMLChunks,fetchOutput = fetchedKML
+			print("  Get map KML data")
+			print(fetchOutput,end="")
+		elif args.kml_file is not None:
+			print("  Read KML file:          ", args.kml_file)
+			returnCode,KMLChunks = openKMLFile(args)
+		elif args.offline:
+			print("  Get map KML data from cache")
+			returnCode,KMLChunks = getMapKMLData(args)
+		else:
+			print("  Get map KML data")
+			with profileStage("fetch"):
+				returnCode,KMLChunks = getMapKMLData(args)
+	if returnCode == 0 and args.archive is not None:
+		print(f"  Output archive:       {args.archive} ({args.archive_format})")
+		try:
+			outputArchive = cOutputArchive(args.archive,args.archive_format)
+		except Exception as e:
+			printError(f"  ERROR: An unexpected error occurred creating archive: {str(e)}")
+			returnCode = 9
+	elif returnCode == 0:
 		# Create a directory for GPX files
 		print(f"  Output directory:     {args.GPX_path}")
 		try:
 			os.makedirs(args.GPX_path, exist_ok=True)
-			layers = root.iter('{http://www.opengis.net/kml/2.2}Folder')
-			# Exporting KML data from a GMap will always have at least one layer
-			layers = root.iter('{http://www.opengis.net/kml/2.2}Folder')
-			if args.layers:
-				# If layers arg is set we create a subdirectory under the GPX_path for each non-empty layer
-				# Each of these subdirectories will contain:
-				#	o A waypoints GPX file containing all of the waypoints in the layer.
-				#	o A track GPX file for each track in the layer
-				for layer in layers:
-					returnCode = processLayer(layer,args)
-					if returnCode != 0:
-						break
-			else:
-				# # If layers arg is NOT set we create the following files
-				# #	o A waypoints GPX file containing all of the waypoints in the KML file.
-				# #	o A track GPX file for each track in the KML file
-				# # We are not handling layers separately so use the root tree
-				# # when processing waypoints and tracks.  Using root will return all
-				# # of the waypoints and tracks regardless of if they are in a layer or not.
-				# layers = root.iter('{http://www.opengis.net/kml/2.2}Folder')
-				returnCode = processLayer(root,args)
 		except Exception as e:
-			print(f"  ERROR: An unexpected error occurred creating GPX file directory: {str(e)}")
+			printError(f"  ERROR: An unexpected error occurred creating GPX file directory: {str(e)}")
 			returnCode = 9
+	if returnCode == 0:
+		# If layers arg is set we create a subdirectory under the GPX_path for each non-empty layer
+		# Each of these subdirectories will contain:
+		#	o A waypoints GPX file containing all of the waypoints in the layer.
+		#	o A track GPX file for each track in the layer
+		# If layers arg is NOT set we create the following files
+		#	o A waypoints GPX file containing all of the waypoints in the KML file.
+		#	o A track GPX file for each track in the KML file
+		if args.incremental:
+			loadManifest(args)
+		if args.jobs > 1:
+			trackPool = concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs)
+		complete = False
+		try:
+			try:
+				returnCode = processKMLStream(KMLChunks,args)
+			finally:
+				if trackPool is not None:
+					trackPool.shutdown(cancel_futures=True)
+					trackPool = None
+			if args.incremental and returnCode == 0:
+				returnCode = saveManifest(args)
+			if runProfile is not None:
+				runProfile.KMLSource = args.kmlSource
+				profileReturnCode = writeProfile(args,wallStart,cpuStart)
+				if returnCode == 0:
+					returnCode = profileReturnCode
+				runProfile = None
+			complete = returnCode == 0
+		finally:
+			if outputArchive is not None:
+				# an incomplete archive file is removed
+				try:
+					outputArchive.close(complete)
+					if complete:
+						print(f"  Writing archive:      {args.archive}")
+				except Exception as e:
+					printError(f"  ERROR: An unexpected error occurred writing archive: {args.archive} {str(e)}")
+					returnCode = 10
+				outputArchive = None
 	print("")
 	print(f"  Total waypoint count: {countTotalWaypoints:>3}")
 	print(f"  Total track count:    {countTotalTracks:>3}")
 	if args.layers:
 		print(f"  Total layer count:    {countTotalLayers:>3}")
+	if args.area is not None:
+		print(f"  Total outside area:   {countTotalOutside:>3}")
 	print(f"  Return code:            {returnCode}")
 	return(returnCode)
 #========================================================================================
+# cThreadOutput
+#	Stands in for sys.stdout in batch mode.  Output printed by a download thread is kept
+#	in that thread's own buffer so it can be shown with the map it belongs to, all other
+#	output goes straight to the real stdout.
+#========================================================================================
+class cThreadOutput:
+	def __init__ (self,stdout):
+		self.stdout = stdout
+		self.local = threading.local()
+
+	def write(self,text):
+		buffer = getattr(self.local, "buffer", None)
+		if buffer is None:
+			return(self.stdout.write(text))
+		return(buffer.write(text))
+
+	def flush(self):
+		self.stdout.flush()
+
+	def startCapture(self):
+		self.local.buffer = io.StringIO()
+
+	def stopCapture(self):
+		output = self.local.buffer.getvalue()
+		self.local.buffer = None
+		return(output)
+#========================================================================================
+# readBatchFile
+#	Returns a list of (line number, map id, args or None) for the maps in the batch file.
+#	Each line is:  GPX path,map id[,options]  the same format GoogleMapToOSMAndGPX.bat uses.
+#========================================================================================
+def readBatchFile(batchArgs):
+	defaults = dict(vars(batchArgs), batch=None, map_id=None, GPX_path=None)
+	batchMaps = []
+	with open(batchArgs.batch,"r",encoding="utf-8") as f:
+		for lineNumber, line in enumerate(f, start=1):
+			line = line.strip()
+			if not line or line.startswith("#"):
+				continue
+			fields = line.split(",",2)
+			if len(fields) < 2:
+				printError(f"  ERROR: Batch file line {lineNumber}: expected GPX path,map id[,options]")
+				batchMaps.append((lineNumber, line, None))
+				continue
+			GPXPath = fields[0].strip()
+			mapID = fields[1].strip()
+			options = shlex.split(fields[2]) if len(fields) > 2 else []
+			try:
+				args = setupParseCmdLine([mapID, GPXPath] + options, defaults)
+			except SystemExit:
+				printError(f"  ERROR: Batch file line {lineNumber}: invalid options: {fields[2].strip()}")
+				args = None
+			if args is not None and args.archive == "-":
+				printError(f"  ERROR: Batch file line {lineNumber}: --archive - is not allowed in batch mode")
+				args = None
+			batchMaps.append((lineNumber, mapID, args))
+	return(batchMaps)
+#========================================================================================
+# fetchBatchMap
+#	Download thread for batch mode.  The whole map is read into a temporary file, which
+#	also fills the KML cache, so the main thread can convert it as soon as it arrives.
+#========================================================================================
+def fetchBatchMap(args):
+	import tempfile
+	sys.stdout.startCapture()
+	KMLFile = None
+	try:
+		returnCode,KMLChunks = getMapKMLData(args)
+		if returnCode == 0:
+			KMLFile = tempfile.TemporaryFile()
+			try:
+				for chunk in KMLChunks:
+					KMLFile.write(chunk)
+				KMLFile.seek(0)
+			except OSError as e:
+				printError(f"  ERROR: An unexpected error occurred reading KML data: {str(e)}")
+				KMLFile.close()
+				KMLFile = None
+				returnCode = 12
+	finally:
+		output = sys.stdout.stopCapture()
+	return(returnCode,KMLFile,output)
+#========================================================================================
+# processBatch
+#	Downloads up to args.fetch_jobs maps at a time and converts each map in the main
+#	thread as soon as its download completes.  A summary of the return code of every
+#	map is printed at the end.
+#========================================================================================
+def processBatch(batchArgs):
+	print("")
+	print("Google map to OSMAnd GPX file conversion, batch mode.")
+	print("  Batch file:             ", batchArgs.batch)
+	print("  Concurrent downloads:   ", batchArgs.fetch_jobs)
+	try:
+		batchMaps = readBatchFile(batchArgs)
+	except OSError as e:
+		printError(f"  ERROR: Unable to read batch file: {batchArgs.batch} {str(e)}")
+		return(12)
+
+	mapReturnCodes = {}
+	getHTTPSession(batchArgs.fetch_jobs)
+	stdout = sys.stdout
+	sys.stdout = cThreadOutput(stdout)
+	try:
+		with concurrent.futures.ThreadPoolExecutor(max_workers=batchArgs.fetch_jobs) as fetchPool:
+			fetches = {}
+			for lineNumber,mapID,args in batchMaps:
+				if args is None:
+					mapReturnCodes[lineNumber] = 2
+				else:
+					fetches[fetchPool.submit(fetchBatchMap,args)] = (lineNumber,args)
+			for fetch in concurrent.futures.as_completed(fetches):
+				lineNumber,args = fetches[fetch]
+				returnCode,KMLFile,fetchOutput = fetch.result()
+				print("=" * 88)
+				KMLChunks = readKMLChunks(KMLFile) if KMLFile is not None else None
+				mapReturnCodes[lineNumber] = convertMap(args,(returnCode,KMLChunks,fetchOutput))
+	finally:
+		sys.stdout = stdout
+
+	print("=" * 88)
+	print("  Batch summary")
+	for lineNumber,mapID,args in batchMaps:
+		print(f"    Line {lineNumber:>3}  Map: {mapID:<40}  Return code: {mapReturnCodes[lineNumber]}")
+	countErrors = sum(1 for returnCode in mapReturnCodes.values() if returnCode != 0)
+	print(f"  Maps processed: {len(batchMaps):>3}  Errors: {countErrors:>3}")
+	return(15 if countErrors else 0)
+#========================================================================================
+# spoolKMLChunks
+#	Reads the KML data into a temporary file while hashing it, so a map's content can
+#	be compared before it is converted.  Returns (return code, file, hash).
+#========================================================================================
+def spoolKMLChunks(KMLChunks):
+	import tempfile
+	KMLFile = tempfile.TemporaryFile()
+	KMLHash = hashlib.sha1()
+	try:
+		for chunk in KMLChunks:
+			KMLHash.update(chunk)
+			KMLFile.write(chunk)
+		KMLFile.seek(0)
+	except OSError as e:
+		printError(f"  ERROR: An unexpected error occurred reading KML data: {str(e)}")
+		KMLFile.close()
+		return(12,None,None)
+	return(0,KMLFile,KMLHash.hexdigest())
+#========================================================================================
+# pollMap
+#	One --watch poll of a map.  The KML data is fetched with a conditional GET, spooled
+#	to a temporary file and hashed.  The map is only converted when the hash differs
+#	from lastHash, the hash of its last conversion.  A 304 answer needs no hash once
+#	the map has been converted.  A failed download is not a change, the map is left as
+#	it is until the next poll.  A failed conversion leaves no hash, so the map is
+#	converted again at the next poll even when google answers 304.
+#	Returns (return code, hash of the converted KML data or None).
+#========================================================================================
+def pollMap(args,lastHash):
+	pollTime = time.strftime("%Y-%m-%d %H:%M:%S")
+	fetchOutput = io.StringIO()
+	KMLFile = None
+	KMLHash = None
+	with contextlib.redirect_stdout(fetchOutput):
+		returnCode,KMLChunks = getMapKMLData(args)
+	if returnCode == 0 and args.kmlSource == "cache" and lastHash is not None:
+		KMLChunks.close()
+		print(f"  {pollTime}  Map: {args.map_id}  not modified")
+		return(0,lastHash)
+	if returnCode == 0:
+		with contextlib.redirect_stdout(fetchOutput):
+			returnCode,KMLFile,KMLHash = spoolKMLChunks(KMLChunks)
+	if returnCode != 0:
+		print(f"  {pollTime}  Map: {args.map_id}  download failed, trying again at the next poll")
+		print(fetchOutput.getvalue(),end="")
+		return(returnCode,lastHash)
+	if KMLHash == lastHash:
+		KMLFile.close()
+		print(f"  {pollTime}  Map: {args.map_id}  unchanged")
+		return(0,lastHash)
+	print("=" * 88)
+	print(f"  {pollTime}  Map: {args.map_id}  changed, converting")
+	returnCode = convertMap(args,(0,readKMLChunks(KMLFile),fetchOutput.getvalue()))
+	return(returnCode,KMLHash if returnCode == 0 else None)
+#========================================================================================
+# watchMaps
+#	--watch mode.  Polls the map, or every map of the batch file, every args.watch
+#	seconds until it is stopped with Ctrl+C or, from convert(), the cancel event.
+#	The polls go over the shared requests session so the connection to google stays
+#	open, and loaded user icon files are kept in userIconTables between conversions.
+#========================================================================================
+def watchMaps(watchArgs):
+	print("")
+	print("Google map to OSMAnd GPX file conversion, watch mode.")
+	print("  Poll interval:          ", watchArgs.watch, "seconds")
+	if watchArgs.batch is not None:
+		print("  Batch file:             ", watchArgs.batch)
+		try:
+			watchedMaps = [args for lineNumber,mapID,args in readBatchFile(watchArgs) if args is not None]
+		except OSError as e:
+			printError(f"  ERROR: Unable to read batch file: {watchArgs.batch} {str(e)}")
+			return(12)
+	else:
+		watchedMaps = [watchArgs]
+	print("  Maps watched:           ", len(watchedMaps))
+	getHTTPSession(max(len(watchedMaps),1))
+
+	convertedHashes = [None] * len(watchedMaps)
+	try:
+		while True:
+			pollStart = time.monotonic()
+			for index,args in enumerate(watchedMaps):
+				returnCode,convertedHashes[index] = pollMap(args,convertedHashes[index])
+				if returnCode == 16:
+					return(16)
+			delay = max(0, pollStart + watchArgs.watch - time.monotonic())
+			if cancelEvent is not None:
+				if cancelEvent.wait(delay):
+					print("  Watch cancelled")
+					return(16)
+			else:
+				time.sleep(delay)
+	except KeyboardInterrupt:
+		print("")
+		print("  Watch stopped")
+	return(0)
+#========================================================================================
+# cResultCache
+#	Least recently used cache of the maps converted by --serve, bounded by the total size
+#	of the zip data it holds.  The key is the hash of the map's KML data plus the
+#	conversion options, so a map that changed on google is converted again.
+#========================================================================================
+class cResultCache:
+	def __init__ (self,maxSize):
+		self.maxSize = maxSize
+		self.size = 0
+		self.entries = collections.OrderedDict()
+		self.lock = threading.Lock()
+
+	def get(self,key):
+		with self.lock:
+			data = self.entries.get(key)
+			if data is not None:
+				self.entries.move_to_end(key)
+			return(data)
+
+	def put(self,key,data):
+		with self.lock:
+			if key in self.entries:
+				self.size -= len(self.entries.pop(key))
+			if len(data) > self.maxSize:
+				return
+			self.entries[key] = data
+			self.size += len(data)
+			while self.size > self.maxSize:
+				oldKey,oldData = self.entries.popitem(last=False)
+				self.size -= len(oldData)
+#========================================================================================
+# serviceStatus
+#	HTTP status of a --serve request for the return code of its conversion
+#========================================================================================
+def serviceStatus(returnCode):
+	match returnCode:
+		case 0:
+			return(200)
+		case 2:
+			return(400)
+		case 403:
+			return(403)
+		case 404 | 14:
+			return(404)
+		case 12:
+			return(502)
+		case _:
+			return(500)
+#========================================================================================
+# convertForService
+#	Converts a map for a --serve request into an in-memory zip of its GPX files.
+#	Conversions run one at a time under serveLock and their output is kept in the
+#	request thread's buffer.  Returns (HTTP status, zip data or None, cache hit, output).
+#========================================================================================
+def convertForService(mapID,options,outputOptions,server):
+	sys.stdout.startCapture()
+	try:
+		with server.serveLock, contextlib.redirect_stderr(sys.stdout):
+			status,data,cacheHit = serviceConversion(mapID,options,outputOptions,server)
+	finally:
+		output = sys.stdout.stopCapture()
+	return(status,data,cacheHit,output)
+#========================================================================================
+# serviceConversion
+#	The KML data is fetched with a conditional GET and hashed, and the zip is taken from
+#	the result cache when the same KML data was already converted with the same options.
+#	The server's own options are the defaults of the request's options.  The request
+#	may only change the SERVE_REQUEST_OPTIONS, outputOptions are the service's own
+#	options for the kind of output asked for.
+#========================================================================================
+def serviceConversion(mapID,options,outputOptions,server):
+	import tempfile
+	defaults = dict(vars(server.serveArgs), serve=None, map_id=None, GPX_path=None)
+	with tempfile.TemporaryDirectory() as folder:
+		archiveName = os.path.join(folder, "map.zip")
+		try:
+			serviceArgs = setupParseCmdLine(["--archive", archiveName, "--", mapID], defaults)
+			requestArgs = setupParseCmdLine(options + ["--archive", archiveName, "--", mapID], defaults)
+			args = setupParseCmdLine(options + outputOptions + ["--archive", archiveName, "--", mapID], defaults)
+		except SystemExit:
+			return(400,None,False)
+		for name,value in vars(requestArgs).items():
+			if name not in SERVE_REQUEST_OPTIONS and value != getattr(serviceArgs,name):
+				optionName = name if name == "GPX_path" else "--" + name.replace("_","-")
+				printError(f"  ERROR: {optionName} is not allowed in a service request")
+				return(400,None,False)
+		returnCode,KMLChunks = getMapKMLData(args)
+		if returnCode == 0:
+			returnCode,KMLFile,KMLHash = spoolKMLChunks(KMLChunks)
+		if returnCode != 0:
+			return(serviceStatus(returnCode),None,False)
+		key = (KMLHash,) + tuple(sorted((name,value) for name,value in vars(args).items() if name not in ("archive", "kmlSource")))
+		data = server.resultCache.get(key)
+		if data is not None:
+			KMLFile.close()
+			return(200,data,True)
+		returnCode = convertMap(args,(0,readKMLChunks(KMLFile),""))
+		if returnCode != 0:
+			return(serviceStatus(returnCode),None,False)
+		with open(archiveName,"rb") as f:
+			data = f.read()
+	server.resultCache.put(key,data)
+	return(200,data,False)
+#========================================================================================
+# serviceHandlerClass
+#	Returns the request handler class of --serve.  http.server is only imported when
+#	the service is started.
+#========================================================================================
+def serviceHandlerClass():
+	import http.server
+	import urllib.parse
+	import zipfile
+
+	class cServiceHandler(http.server.BaseHTTPRequestHandler):
+		def do_GET(self):
+			url = urllib.parse.urlsplit(self.path)
+			path = urllib.parse.unquote(url.path)
+			if not path.startswith(SERVE_PATH_PREFIX) or len(path) == len(SERVE_PATH_PREFIX):
+				return(self.sendText(404, f"Use {SERVE_PATH_PREFIX}<map id>.zip, {SERVE_PATH_PREFIX}<map id>.gpx or {SERVE_PATH_PREFIX}<map id>/<GPX file>"))
+			try:
+				options = shlex.split(urllib.parse.parse_qs(url.query).get("options", [""])[0])
+			except ValueError as e:
+				return(self.sendText(400, f"Invalid options: {str(e)}"))
+			mapPath = path[len(SERVE_PATH_PREFIX):]
+			memberName = None
+			outputOptions = []
+			if "/" in mapPath:
+				mapID,memberName = mapPath.split("/",1)
+			elif mapPath.endswith(".zip"):
+				mapID = mapPath[:-len(".zip")]
+			elif mapPath.endswith(".gpx"):
+				# the whole map in one GPX file
+				mapID = mapPath[:-len(".gpx")]
+				outputOptions = ["--combine", "--combine-size", "0"]
+				memberName = COMBINED_FILE_NAME + ".gpx"
+			else:
+				return(self.sendText(404, f"Unknown output, use {SERVE_PATH_PREFIX}{mapPath}.zip or {SERVE_PATH_PREFIX}{mapPath}.gpx"))
+			# the map id goes on the command line of the conversion, it must not look
+			# like an option
+			if not mapID or mapID.startswith("-") or not all(i.isascii() and (i.isalnum() or i in "_-") for i in mapID):
+				return(self.sendText(400, f"Invalid map id: {mapID}"))
+
+			status,data,cacheHit,output = convertForService(mapID,options,outputOptions,self.server)
+			if status != 200:
+				errors = [line.strip() for line in output.splitlines() if "ERROR" in line or "error:" in line]
+				return(self.sendText(status, "\n".join(errors) or "Conversion failed"))
+			if memberName is None:
+				return(self.sendData(200, "application/zip", data, mapID + ".zip", cacheHit))
+			with zipfile.ZipFile(io.BytesIO(data)) as archive:
+				names = archive.namelist()
+				if memberName == "":
+					return(self.sendText(200, "\n".join(names)))
+				if memberName not in names:
+					# with -l the GPX files are in layer folders, a file name on its own is
+					# enough when only one layer has a file of that name
+					matches = [name for name in names if Path(name).name == memberName]
+					if len(matches) > 1:
+						return(self.sendText(404, f"More than one GPX file named {memberName}, give its layer folder:\n" + "\n".join(matches)))
+					if not matches:
+						return(self.sendText(404, f"GPX file not found: {memberName}\nGPX files:\n" + "\n".join(names)))
+					memberName = matches[0]
+				return(self.sendData(200, "application/gpx+xml", archive.read(memberName), Path(memberName).name, cacheHit))
+
+		def sendText(self,status,text):
+			return(self.sendData(status, "text/plain; charset=utf-8", (text + "\n").encode("utf-8"), None, False))
+
+		def sendData(self,status,contentType,data,fileName,cacheHit):
+			self.send_response(status)
+			self.send_header("Content-Type", contentType)
+			self.send_header("Content-Length", str(len(data)))
+			if fileName is not None:
+				self.send_header("Content-Disposition", "attachment; filename*=UTF-8''" + urllib.parse.quote(fileName))
+			self.end_headers()
+			self.wfile.write(data)
+			print(f"  {time.strftime('%Y-%m-%d %H:%M:%S')}  {self.path}  {status}  {len(data)} bytes" + ("  cached" if cacheHit else ""))
+
+		def log_message(self,format,*args):
+			pass	# requests are logged by sendData
+
+	return(cServiceHandler)
+#========================================================================================
+# serveMaps
+#	--serve mode.  Serves converted maps over HTTP until it is stopped with Ctrl+C or,
+#	from convert(), the cancel event.  Point --kml-url at a local stand-in for google to
+#	test the service without the internet.
+#========================================================================================
+def serveMaps(serveArgs):
+	import http.server
+	print("")
+	print("Google map to OSMAnd GPX file conversion, HTTP service.")
+	print("  Address:                ", f"http://{serveArgs.serve_host}:{serveArgs.serve}{SERVE_PATH_PREFIX}")
+	print("  Result cache:           ", serveArgs.serve_cache, "MB")
+	print("  KML URL:                ", serveArgs.kml_url)
+	try:
+		server = http.server.ThreadingHTTPServer((serveArgs.serve_host, serveArgs.serve), serviceHandlerClass())
+	except OSError as e:
+		printError(f"  ERROR: Unable to start the service: {str(e)}")
+		return(9)
+	server.daemon_threads = True
+	server.serveArgs = serveArgs
+	server.resultCache = cResultCache(serveArgs.serve_cache * 1024 * 1024)
+	server.serveLock = threading.Lock()
+	getHTTPSession()
+	stdout = sys.stdout
+	sys.stdout = cThreadOutput(stdout)
+	try:
+		if cancelEvent is not None:
+			threading.Thread(target=server.serve_forever, daemon=True).start()
+			cancelEvent.wait()
+			server.shutdown()
+			print("  Service cancelled")
+			return(16)
+		server.serve_forever()
+	except KeyboardInterrupt:
+		print("")
+		print("  Service stopped")
+	finally:
+		server.server_close()
+		sys.stdout = stdout
+	return(0)
+#========================================================================================
+# cConversionOutput
+#	Stands in for sys.stdout during a convert() call.  Keeps the output for the result
+#	and passes each complete line to lineCallback as soon as it is printed.
+#========================================================================================
+class cConversionOutput(io.StringIO):
+	def __init__ (self,lineCallback):
+		super().__init__()
+		self.lineCallback = lineCallback
+		self.partialLine = ""
+
+	def write(self,text):
+		if self.lineCallback is not None:
+			lines = (self.partialLine + text).split("\n")
+			self.partialLine = lines.pop()
+			for line in lines:
+				self.lineCallback(line + "\n")
+		return(super().write(text))
+
+	def flushLine(self):
+		if self.lineCallback is not None and self.partialLine:
+			self.lineCallback(self.partialLine)
+		self.partialLine = ""
+#========================================================================================
+# cConversionResult
+#	Result of a convert() call.  The counts are those of the last map converted.
+#	errors holds the error messages printed by the conversion, see printError, and any
+#	command line error.
+#========================================================================================
+class cConversionResult:
+	__slots__ = ("returnCode", "countWaypoints", "countTracks", "countLayers", "errors", "output")
+
+	def __init__ (self,returnCode,output,errors):
+		self.returnCode = returnCode
+		self.countWaypoints = countTotalWaypoints
+		self.countTracks = countTotalTracks
+		self.countLayers = countTotalLayers
+		self.output = output
+		self.errors = errors + [line.strip() for line in output.splitlines() if line.startswith(PROGRAM_NAME + ": error:")]
+#========================================================================================
+# convert
+#	In-process conversion API.  argv is the same list of options as the command line,
+#	e.g. convert([mapID, GPXPath, "-l", "-t", "80"]).  Everything the conversion prints
+#	is returned in the result instead of going to the console.  Conversions from
+#	several threads are run one after the other.
+#
+#	lineCallback, if given, is called with each line of output as soon as it is printed,
+#	from the converting thread.  Setting the threading.Event cancel stops the conversion
+#	at the next KML element with return code 16.
+#========================================================================================
+def convert(argv,lineCallback=None,cancel=None):
+	global countTotalWaypoints
+	global countTotalTracks
+	global countTotalLayers
+	global cancelEvent
+	global conversionErrors
+
+	with conversionLock:
+		countTotalWaypoints = countTotalTracks = countTotalLayers = 0
+		cancelEvent = cancel
+		conversionErrors = errors = []
+		output = cConversionOutput(lineCallback)
+		with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+			try:
+				args = setupParseCmdLine(list(argv))
+				if args.archive == "-":
+					printError("  ERROR: --archive - is not allowed in convert(), stdout is not the console")
+					returnCode = 2
+				elif args.serve is not None:
+					returnCode = serveMaps(args)
+				elif args.watch is not None:
+					returnCode = watchMaps(args)
+				elif args.batch is not None:
+					returnCode = processBatch(args)
+				else:
+					returnCode = convertMap(args)
+			except SystemExit as e:
+				# argparse exits after --help or a command line error
+				returnCode = e.code if isinstance(e.code, int) else 2
+			finally:
+				cancelEvent = None
+				conversionErrors = None
+		output.flushLine()
+		return(cConversionResult(returnCode,output.getvalue(),errors))
+#========================================================================================
+# Main
+#========================================================================================
+def main():
+	# Parse the command line arguments
+	args = setupParseCmdLine()
+	if args.archive == "-":
+		# stdout is reserved for the archive, see cOutputArchive
+		sys.stdout = sys.stderr
+	if args.serve is not None:
+		return(serveMaps(args))
+	if args.watch is not None:
+		return(watchMaps(args))
+	if args.batch is not None:
+		return(processBatch(args))
+	return(convertMap(args))
+#========================================================================================
 #
 #========================================================================================
 if __name__ == "__main__":
+	# needed for the worker processes of the frozen windows executable
+	if getattr(sys, "frozen", False):
+		import multiprocessing
+		multiprocessing.freeze_support()
 	sys.exit(main())
@@ -0,0 +1,295 @@
+#========================================================================================
+# test_GoogleMapToOSMAndGPX.py
+#
+# Tests of GoogleMapToOSMAndGPX.py, run with: py -m pytest tests
+#========================================================================================
+import os
+import sys
+import json
+import time
+import contextlib
+import socket
+import threading
+import http.server
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import GoogleMapToOSMAndGPX as gmap
+
+# a small GMap style KML file, two layers of waypoints and tracks
+TEST_KML = """<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+  <Document>
+    <name>Test Map</name>
+    <Folder>
+      <name>Layer One</name>
+      <Placemark>
+        <name>Point A</name>
+        <styleUrl>#icon-1899-0288D1</styleUrl>
+        <Point><coordinates>-120.8427259,38.8170119,0</coordinates></Point>
+      </Placemark>
+      <Placemark>
+        <name>Track One</name>
+        <styleUrl>#line-0F9D58-1000</styleUrl>
+        <LineString><coordinates>-121.9662,37.5793,12.4 -121.9663,37.5794,10.4 -121.9664,37.5795,0</coordinates></LineString>
+      </Placemark>
+    </Folder>
+    <Folder>
+      <name>Layer Two</name>
+      <Placemark>
+        <name>Track Two</name>
+        <styleUrl>#line-DB4436-5000-nodesc</styleUrl>
+        <LineString><coordinates>-122.0,37.0,0 -122.1,37.1,5 -122.2,37.2,7</coordinates></LineString>
+      </Placemark>
+    </Folder>
+  </Document>
+</kml>
+"""
+
+#========================================================================================
+# writeTestKML
+#========================================================================================
+def writeTestKML(folder):
+	KMLFileName = os.path.join(folder, "test.kml")
+	with open(KMLFileName, "w", encoding="utf-8") as f:
+		f.write(TEST_KML)
+	return(KMLFileName)
+#========================================================================================
+# convert() reports GPX write errors in its errors, with and without worker processes
+#========================================================================================
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_convert_reports_write_errors(tmp_path, jobs):
+	KMLFileName = writeTestKML(tmp_path)
+	GPXPath = tmp_path / "GPX"
+	# a folder where the track's GPX file goes makes writing it fail
+	os.makedirs(GPXPath / "Layer One" / "Track One.gpx")
+	result = gmap.convert(["TEST", str(GPXPath), "-l", "-k", KMLFileName, "-j", jobs])
+	assert result.returnCode == 10
+	assert len(result.errors) == 1
+	assert result.errors[0].startswith("Error: An unexpected error occurred writing GPX file")
+#========================================================================================
+# convert() reports command line errors in its errors
+#========================================================================================
+def test_convert_reports_command_line_errors(tmp_path):
+	result = gmap.convert(["TEST", str(tmp_path), "--max-points", "1"])
+	assert result.returnCode == 2
+	assert result.errors == [f"{gmap.PROGRAM_NAME}: error: argument --max-points: must be 2 or more"]
+#========================================================================================
+# runGoogle
+#	Runs a stand-in for google that returns TEST_KML for every map, or 304 when it is
+#	asked for with its ETag, and yields its KML URL, the --kml-url value
+#========================================================================================
+@contextlib.contextmanager
+def runGoogle():
+	class cGoogleHandler(http.server.BaseHTTPRequestHandler):
+		def do_GET(self):
+			if self.headers.get("If-None-Match") == '"test"':
+				self.send_response(304)
+				self.end_headers()
+				return
+			data = TEST_KML.encode("utf-8")
+			self.send_response(200)
+			self.send_header("Content-Length", str(len(data)))
+			self.send_header("ETag", '"test"')
+			self.end_headers()
+			self.wfile.write(data)
+
+		def log_message(self,*args):
+			pass
+
+	google = http.server.ThreadingHTTPServer(("127.0.0.1", 0), cGoogleHandler)
+	threading.Thread(target=google.serve_forever, daemon=True).start()
+	try:
+		yield(f"http://127.0.0.1:{google.server_address[1]}/kml?mid=")
+	finally:
+		google.shutdown()
+		google.server_close()
+#========================================================================================
+# runService
+#	Runs a --serve service on runGoogle, yields the service's base URL and stops the
+#	service.  Not a fixture, pytest swaps sys.stdout between a fixture and its test and
+#	the service prints to it.
+#========================================================================================
+@contextlib.contextmanager
+def runService():
+	with runGoogle() as KMLURL, socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		port = s.getsockname()[1]
+		s.close()
+		cancel = threading.Event()
+		service = threading.Thread(target=gmap.convert, args=(["--serve", str(port), "--no-cache", "--kml-url", KMLURL],), kwargs={"cancel": cancel})
+		service.start()
+		url = f"http://127.0.0.1:{port}"
+		for attempt in range(50):
+			try:
+				socket.create_connection(("127.0.0.1", port), timeout=1).close()
+				break
+			except OSError:
+				time.sleep(0.1)
+		try:
+			yield(url)
+		finally:
+			cancel.set()
+			service.join()
+#========================================================================================
+# getURL
+#	Returns (status, body) of a GET request
+#========================================================================================
+def getURL(url):
+	try:
+		with urllib.request.urlopen(url) as response:
+			return(response.status, response.read())
+	except urllib.error.HTTPError as e:
+		return(e.code, e.read())
+#========================================================================================
+# With -l a service request can give a GPX file by its name alone, or with its layer
+#========================================================================================
+def test_service_layer_members():
+	with runService() as serviceURL:
+		status,body = getURL(serviceURL + "/maps/MID/Track%20Two.gpx?options=-l")
+		assert status == 200 and b"<name>Track Two</name>" in body
+		status,body = getURL(serviceURL + "/maps/MID/Layer%20One/Track%20One.gpx?options=-l")
+		assert status == 200 and b"<name>Track One</name>" in body
+		status,body = getURL(serviceURL + "/maps/MID/Nothing.gpx?options=-l")
+		assert status == 404
+#========================================================================================
+# Options that reach other hosts, write files or start processes are refused
+#========================================================================================
+@pytest.mark.parametrize("options,message", [
+	("--kml-url%20http://example.com/", b"is not allowed in a service request"),
+	("--cache-dir%20/tmp", b"is not allowed in a service request"),
+	("-c%20/tmp/icons.csv", b"is not allowed in a service request"),
+	("-j%204", b"is not allowed in a service request"),
+	("--combine", b"is not allowed in a service request"),
+	("extra", b"error: unrecognized arguments"),
+])
+def test_service_refuses_options(options, message):
+	with runService() as serviceURL:
+		status,body = getURL(serviceURL + "/maps/MID.zip?options=" + options)
+	assert status == 400
+	assert message in body
+#========================================================================================
+# A map id that is not a plain map id is refused, it could pass options to the service
+#========================================================================================
+@pytest.mark.parametrize("mapID", ["--kml-file=x", "-j4", "-", "a.b", "%C3%A9"])
+def test_service_refuses_map_ids(mapID):
+	with runService() as serviceURL:
+		status,body = getURL(serviceURL + "/maps/" + mapID + ".zip")
+	assert status == 400
+	assert body.startswith(b"Invalid map id:")
+#========================================================================================
+# A second -u conversion in the same process leaves the unchanged tracks alone
+#========================================================================================
+def test_incremental_twice_in_one_process(tmp_path):
+	KMLFileName = writeTestKML(tmp_path)
+	argv = ["TEST", str(tmp_path / "GPX"), "-l", "-u", "-k", KMLFileName]
+	assert gmap.convert(argv).returnCode == 0
+	result = gmap.convert(argv)
+	assert result.returnCode == 0
+	assert "Track:    Track One (unchanged)" in result.output
+	assert "Track:    Track Two (unchanged)" in result.output
+#========================================================================================
+# Turning --stats on or off between two -u runs rewrites the tracks
+#========================================================================================
+@pytest.mark.parametrize("first,second", [([], ["--stats"]), (["--stats"], [])])
+def test_incremental_rewrites_tracks_when_stats_change(tmp_path, first, second):
+	KMLFileName = writeTestKML(tmp_path)
+	GPXPath = tmp_path / "GPX"
+	argv = ["TEST", str(GPXPath), "-l", "-u", "-k", KMLFileName]
+	assert gmap.convert(argv + first).returnCode == 0
+	result = gmap.convert(argv + second)
+	assert result.returnCode == 0
+	assert "(unchanged)" not in result.output
+	with open(GPXPath / "Layer One" / "Track One.gpx", "r", encoding="utf-8") as f:
+		hasStats = "<stats" in f.read()
+	assert hasStats == ("--stats" in second)
+	indexFileName = GPXPath / "Layer One" / gmap.LAYER_INDEX_FILE_NAME
+	if "--stats" in second:
+		with open(indexFileName, "r", encoding="utf-8") as f:
+			assert json.load(f)["tracks"]
+#========================================================================================
+# --bbox drops the same placemarks with and without worker processes
+#========================================================================================
+def test_bbox_same_with_worker_processes(tmp_path):
+	KMLFileName = writeTestKML(tmp_path)
+	outputs = []
+	for jobs in ("1", "2"):
+		GPXPath = tmp_path / ("GPX" + jobs)
+		result = gmap.convert(["TEST", str(GPXPath), "-l", "-k", KMLFileName, "-j", jobs, "--bbox=37.5,-122.0,37.6,-121.9"])
+		assert result.returnCode == 0
+		assert result.countTracks == 1 and result.countWaypoints == 0
+		assert os.listdir(GPXPath / "Layer One") == ["Track One.gpx"]
+		outputs.append([line.replace(str(GPXPath), "GPX") for line in result.output.splitlines() if "worker processes" not in line])
+	assert outputs[0] == outputs[1]
+	assert "  Total outside area:     2" in outputs[0]
+#========================================================================================
+# The KML cache keeps maps downloaded from different KML URLs apart
+#========================================================================================
+def test_cache_keyed_by_kml_url(tmp_path):
+	cacheDir = str(tmp_path / "cache")
+	with runGoogle() as KMLURL:
+		result = gmap.convert(["MID", str(tmp_path / "GPX"), "--cache-dir", cacheDir, "--kml-url", KMLURL])
+		assert result.returnCode == 0
+	result = gmap.convert(["MID", str(tmp_path / "GPX"), "--cache-dir", cacheDir, "--kml-url", KMLURL, "--offline"])
+	assert result.returnCode == 0
+	result = gmap.convert(["MID", str(tmp_path / "GPX"), "--cache-dir", cacheDir, "--kml-url", "http://127.0.0.1:9/other?mid=", "--offline"])
+	assert result.returnCode == 14
+#========================================================================================
+# Cache eviction removes the temporary files left by interrupted downloads
+#========================================================================================
+def test_cache_removes_stale_temporary_files(tmp_path):
+	cacheDir = tmp_path / "cache"
+	os.makedirs(cacheDir)
+	staleFileName = cacheDir / "MID-stale.kml.tmp"
+	staleFileName.write_bytes(b"<kml")
+	staleTime = time.time() - gmap.CACHE_TEMP_FILE_AGE - 60
+	os.utime(staleFileName, (staleTime, staleTime))
+	liveFileName = cacheDir / "MID-live.kml.tmp"
+	liveFileName.write_bytes(b"<kml")
+	with runGoogle() as KMLURL:
+		result = gmap.convert(["MID", str(tmp_path / "GPX"), "--cache-dir", str(cacheDir), "--kml-url", KMLURL])
+	assert result.returnCode == 0
+	assert not staleFileName.exists()
+	assert liveFileName.exists()
+#========================================================================================
+# A -u run that stops in the middle of a layer leaves no temporary waypoint file
+#========================================================================================
+@pytest.mark.parametrize("stop", ["error", "cancel"])
+def test_incremental_stopped_run_removes_waypoint_file(tmp_path, stop):
+	KMLFileName = writeTestKML(tmp_path)
+	GPXPath = tmp_path / "GPX"
+	cancel = threading.Event()
+	def lineCallback(line):
+		if "Point A" in line:
+			cancel.set()
+	if stop == "error":
+		# a folder where the track's GPX file goes makes writing it fail
+		os.makedirs(GPXPath / "Layer One" / "Track One.gpx")
+		result = gmap.convert(["TEST", str(GPXPath), "-l", "-u", "-k", KMLFileName])
+		assert result.returnCode == 10
+	else:
+		result = gmap.convert(["TEST", str(GPXPath), "-l", "-u", "-k", KMLFileName], lineCallback, cancel)
+		assert result.returnCode == 16
+	assert "WayPts.gpx.tmp" not in os.listdir(GPXPath / "Layer One")
+#========================================================================================
+# A --watch poll converts the map again after its last conversion failed, even when
+# google answers 304 because the failed KML data is already in the cache
+#========================================================================================
+def test_watch_retries_failed_conversion(tmp_path):
+	GPXPath = tmp_path / "GPX"
+	trackFileName = GPXPath / "Layer One" / "Track One.gpx"
+	with runGoogle() as KMLURL:
+		args = gmap.setupParseCmdLine(["MID", str(GPXPath), "-l", "--cache-dir", str(tmp_path / "cache"), "--kml-url", KMLURL])
+		# the map changed since an earlier conversion and a folder where the track's GPX
+		# file goes makes its conversion fail
+		os.makedirs(trackFileName)
+		returnCode,lastHash = gmap.pollMap(args, "0" * 40)
+		assert returnCode == 10
+		os.rmdir(trackFileName)
+		returnCode,lastHash = gmap.pollMap(args, lastHash)
+		assert returnCode == 0 and lastHash is not None
+		assert trackFileName.is_file()
+		assert gmap.pollMap(args, lastHash) == (0, lastHash)